@@ -0,0 +1,105 @@
+import threading
+from config import Config
+from metrics import registry as metrics
+
+PRIORITY_LANE = 'priority'
+STANDARD_LANE = 'standard'
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; carries the HTTP status and Retry-After hint"""
+    def __init__(self, message, status_code, retry_after, reason):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+class AdmissionTicket:
+    """Slots held by one admitted request; release exactly once when the work is done"""
+    def __init__(self, controller, user_id, lane, analysis):
+        self.controller = controller
+        self.user_id = user_id
+        self.lane = lane
+        self.analysis = analysis
+        self._released = False
+    
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+class AdmissionController:
+    """
+    Caps concurrent submissions, queued AI analyses and per-user concurrency.
+    The standard lane (member submissions) may only use the capacity left after
+    the priority reservation, so admin traffic and approvals still get through
+    while members are being shed.
+    """
+    def __init__(self, max_in_flight=None, priority_reserved=None, max_queued_analyses=None,
+                 per_user_in_flight=None, retry_after=None):
+        self.max_in_flight = max_in_flight or Config.ADMISSION_MAX_IN_FLIGHT
+        self.priority_reserved = Config.ADMISSION_PRIORITY_RESERVED if priority_reserved is None else priority_reserved
+        self.max_queued_analyses = max_queued_analyses or Config.ADMISSION_MAX_QUEUED_ANALYSES
+        self.per_user_in_flight = per_user_in_flight or Config.ADMISSION_PER_USER_IN_FLIGHT
+        self.retry_after = retry_after or Config.ADMISSION_RETRY_AFTER_SECONDS
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._analyses = 0
+        self._per_user = {}
+    
+    def admit(self, user_id, lane=STANDARD_LANE, needs_analysis=False):
+        with self._lock:
+            if lane == STANDARD_LANE:
+                if self._per_user.get(user_id, 0) >= self.per_user_in_flight:
+                    self._shed('per_user', 429, 'Too many concurrent submissions for this user')
+                if self._in_flight >= self.max_in_flight - self.priority_reserved:
+                    self._shed('in_flight', 503, 'Server is busy, please retry shortly')
+                if needs_analysis and self._analyses >= self.max_queued_analyses:
+                    self._shed('analysis_queue', 503, 'AI analysis queue is full, please retry shortly')
+            elif self._in_flight >= self.max_in_flight:
+                self._shed('in_flight', 503, 'Server is busy, please retry shortly')
+            
+            self._in_flight += 1
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            if needs_analysis:
+                self._analyses += 1
+        
+        metrics.counter(f'admission.admitted.{lane}').inc()
+        return AdmissionTicket(self, user_id, lane, needs_analysis)
+    
+    def _shed(self, reason, status_code, message):
+        metrics.counter(f'admission.shed.{reason}').inc()
+        raise AdmissionRejected(message, status_code, self.retry_after, reason)
+    
+    def _release(self, ticket):
+        with self._lock:
+            self._in_flight -= 1
+            remaining = self._per_user.get(ticket.user_id, 1) - 1
+            if remaining:
+                self._per_user[ticket.user_id] = remaining
+            else:
+                self._per_user.pop(ticket.user_id, None)
+            if ticket.analysis:
+                self._analyses -= 1
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'priority_reserved': self.priority_reserved,
+                'queued_analyses': self._analyses,
+                'max_queued_analyses': self.max_queued_analyses,
+                'active_users': len(self._per_user),
+                'per_user_in_flight': self.per_user_in_flight
+            }
+
+admission = AdmissionController()
+metrics.gauge('admission.in_flight', lambda: admission.snapshot()['in_flight'])
+metrics.gauge('admission.queued_analyses', lambda: admission.snapshot()['queued_analyses'])
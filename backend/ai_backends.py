@@ -0,0 +1,145 @@
+import json
+import random
+import re
+import threading
+import time
+from config import Config
+try:
+    import ollama
+    OLLAMA_AVAILABLE = True
+except ImportError:
+    OLLAMA_AVAILABLE = False
+    print("Warning: Ollama not available. AI analysis will be skipped.")
+
+class AnalyzerBackend:
+    """Interface for the model behind AIAnalyzer: takes a prompt, returns the reply text"""
+    name = 'base'
+    
+    def is_available(self):
+        return True
+    
+    def chat(self, prompt):
+        raise NotImplementedError
+    
+    def stream_chat(self, prompt):
+        """Yield the reply in pieces as the model produces it"""
+        yield self.chat(prompt)
+
+class OllamaBackend(AnalyzerBackend):
+    name = 'ollama'
+    
+    def __init__(self, model=None, host=None, timeout=None):
+        self.model = model or Config.AI_MODEL
+        self.host = host or Config.OLLAMA_HOST
+        self.timeout = timeout or Config.AI_TIMEOUT_SECONDS
+    
+    def is_available(self):
+        return OLLAMA_AVAILABLE
+    
+    def chat(self, prompt):
+        client = ollama.Client(host=self.host, timeout=self.timeout)
+        response = client.chat(model=self.model, messages=[
+            {'role': 'user', 'content': prompt}
+        ])
+        return response['message']['content']
+    
+    def stream_chat(self, prompt):
+        client = ollama.Client(host=self.host, timeout=self.timeout)
+        for part in client.chat(model=self.model, messages=[
+            {'role': 'user', 'content': prompt}
+        ], stream=True):
+            content = part.get('message', {}).get('content', '')
+            if content:
+                yield content
+
+class FakeBackendError(Exception):
+    pass
+
+class FakeBackend(AnalyzerBackend):
+    """
+    Deterministic stand-in for the model, for load tests without a GPU.
+    Latency is drawn from a seeded distribution, a configurable fraction of
+    calls fail, and verdicts come from (regex, risk_score) rules matched
+    against the command embedded in the prompt.
+    """
+    name = 'fake'
+    COMMAND_LINE = re.compile(r'^Command: (.*)$', re.MULTILINE)
+    
+    def __init__(self, latency_ms=None, distribution=None, jitter=None, error_rate=None,
+                 rules=None, default_risk_score=None, seed=None):
+        self.latency_ms = Config.FAKE_AI_LATENCY_MS if latency_ms is None else latency_ms
+        self.distribution = distribution or Config.FAKE_AI_LATENCY_DISTRIBUTION
+        self.jitter = Config.FAKE_AI_LATENCY_JITTER if jitter is None else jitter
+        self.error_rate = Config.FAKE_AI_ERROR_RATE if error_rate is None else error_rate
+        self.default_risk_score = Config.FAKE_AI_DEFAULT_RISK_SCORE if default_risk_score is None else default_risk_score
+        self.rules = [(re.compile(pattern), score) for pattern, score in
+                      (Config.FAKE_AI_RULES if rules is None else rules)]
+        self._rng = random.Random(Config.FAKE_AI_SEED if seed is None else seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+    
+    def sample_latency_ms(self):
+        with self._lock:
+            if self.distribution == 'fixed':
+                value = self.latency_ms
+            elif self.distribution == 'uniform':
+                spread = self.latency_ms * self.jitter
+                value = self._rng.uniform(self.latency_ms - spread, self.latency_ms + spread)
+            elif self.distribution == 'exponential':
+                value = self._rng.expovariate(1.0 / self.latency_ms) if self.latency_ms else 0
+            elif self.distribution == 'lognormal':
+                # latency_ms is the median, jitter the sigma of the underlying normal
+                value = self.latency_ms * self._rng.lognormvariate(0, self.jitter) if self.latency_ms else 0
+            else:
+                raise ValueError(f'Unknown latency distribution: {self.distribution}')
+        return max(0.0, value)
+    
+    def verdict_for(self, command_text):
+        risk_score = self.default_risk_score
+        for pattern, score in self.rules:
+            if pattern.search(command_text):
+                risk_score = score
+                break
+        dangerous = risk_score >= 6
+        return {
+            'is_dangerous': dangerous,
+            'risk_score': risk_score,
+            'analysis': f'Fake backend verdict (risk {risk_score}) for: {command_text}',
+            'requires_approval': dangerous,
+            'confidence': 90
+        }
+    
+    def chat(self, prompt):
+        return ''.join(self.stream_chat(prompt))
+    
+    def stream_chat(self, prompt, chunk_size=16):
+        """Emit the verdict in small chunks, spreading the sampled latency over them"""
+        with self._lock:
+            self.calls += 1
+            failed = self._rng.random() < self.error_rate
+        latency = self.sample_latency_ms() / 1000.0
+        match = FakeBackend.COMMAND_LINE.search(prompt)
+        command_text = match.group(1) if match else prompt
+        reply = json.dumps(self.verdict_for(command_text))
+        chunks = [reply[i:i + chunk_size] for i in range(0, len(reply), chunk_size)]
+        
+        # Roughly a third of the latency is time to first token
+        time.sleep(latency / 3)
+        if failed:
+            raise FakeBackendError('Injected fake backend failure')
+        per_chunk = (latency - latency / 3) / len(chunks)
+        for chunk in chunks:
+            yield chunk
+            if per_chunk:
+                time.sleep(per_chunk)
+
+BACKENDS = {
+    'ollama': OllamaBackend,
+    'fake': FakeBackend
+}
+
+def create_backend(name=None):
+    name = name or Config.AI_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown AI backend: {name}')
+    return BACKENDS[name]()
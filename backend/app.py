@@ -1,11 +1,26 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, make_response
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import re
 import json
+import hashlib
+import threading
 from datetime import datetime
-from models import Database, User, Rule, Command, AuditLog
+from models import Database, User, Rule, Command, AuditLog, AIAnalyzer, CHARGED_STATUSES
 from config import Config
+from metrics import registry as metrics
+from admission import admission, AdmissionRejected, PRIORITY_LANE, STANDARD_LANE
+from rate_limit import rate_limiter, RateLimitExceeded
+from pipeline import run_submission
+from idempotency import idempotency, IdempotencyConflict, fingerprint
+from executor import executor
+from output_store import output_store
+from similarity import similarity_index
+from expiry import approval_expiry
+from audit_export import FORMATS, parse_timestamp, stream_export
+from pagination import page_args, paged_response
+from rollups import DIMENSIONS, series_range
+from maintenance import run_timeseries_compaction
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -38,6 +53,58 @@ def require_admin(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def rate_limited(f):
+    def decorated_function(*args, **kwargs):
+        try:
+            rate_limiter.check(request.current_user['id'], request.current_user['role'])
+        except RateLimitExceeded as e:
+            return shed_response(e)
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+def idempotent(f):
+    # Retries carrying the same Idempotency-Key get the first response back without re-running f
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({'error': 'Idempotency-Key must be at most 255 characters'}), 400
+        
+        user_id = request.current_user['id']
+        try:
+            replay = idempotency.begin(user_id, key, fingerprint(request.get_data()))
+        except IdempotencyConflict as e:
+            return jsonify({'error': str(e)}), e.status_code
+        if replay:
+            response = jsonify(replay['body'])
+            response.status_code = replay['status_code']
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        response = None
+        try:
+            response = make_response(f(*args, **kwargs))
+        finally:
+            # Only successful responses are remembered; failures may be retried for real
+            if response is not None and 200 <= response.status_code < 300:
+                idempotency.complete(user_id, key, response.status_code, response.get_json())
+            else:
+                idempotency.abandon(user_id, key)
+        return response
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+def shed_response(rejection):
+    response = jsonify({'error': str(rejection), 'reason': rejection.reason})
+    response.status_code = rejection.status_code
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+def request_lane():
+    return PRIORITY_LANE if request.current_user['role'] == 'admin' else STANDARD_LANE
+
 # Routes
 @app.route('/')
 def index():
@@ -55,41 +122,271 @@ def verify_auth():
         }
     })
 
+# Version of the pending-approvals queue the admin room was last sent
+pending_broadcast = {'version': Command.pending_changes_version(), 'lock': threading.Lock()}
+
+def with_similar_commands(commands):
+    for command in commands:
+        command['similar_commands'] = similarity_index.neighbors(command['command_text'], limit=3,
+                                                                 min_similarity=Config.SIMILARITY_SHOW_MIN)
+    return commands
+
+def pending_delta():
+    """
+    Pending-queue changes since the previous broadcast, attached to admin events.
+    Clients whose version equals `since` patch their list in place; any other
+    client catches up with GET /api/pending-approvals?since=<its version>.
+    """
+    with pending_broadcast['lock']:
+        since = pending_broadcast['version']
+        delta = Command.get_pending_changes(since)
+        pending_broadcast['version'] = delta['version']
+    with_similar_commands(delta['upserts'])
+    return dict(delta, since=since)
+
+def emit_command_result(user, command_text, result):
+    # Emit real-time update to all connected clients
+    event = {
+        'user_name': user['name'],
+        'command': command_text,
+        'status': result['status'],
+        'timestamp': datetime.now().isoformat(),
+        'credits_used': 1 if result['status'] in CHARGED_STATUSES else 0
+    }
+    # Only submissions that join the pending queue carry a delta; the rest leave it unchanged
+    if result['status'] == 'PENDING_APPROVAL':
+        event['delta'] = pending_delta()
+    socketio.emit('command_executed', event, room='admin_room')
+    
+    # Emit credit update to user
+    socketio.emit('credit_update', {
+        'credits': result.get('credits_remaining', user['credits'])
+    }, room=f"user_{user['id']}")
+
+def emit_command_output(job, stream_name, text):
+    socketio.emit('command_output', {
+        'command_id': job.command_id,
+        'stream': stream_name,
+        'chunk': text
+    }, room=f"user_{job.user_id}")
+
+def emit_command_status(job, status, details):
+    socketio.emit('command_status', dict(details, command_id=job.command_id, status=status),
+                  room=f"user_{job.user_id}")
+
+def emit_approvals_expired(commands):
+    socketio.emit('approvals_expired', {
+        'command_ids': [command['id'] for command in commands],
+        'timestamp': datetime.now().isoformat(),
+        'delta': pending_delta()
+    }, room='admin_room')
+    for command in commands:
+        socketio.emit('command_expired', {
+            'command_id': command['id'],
+            'command': command['command_text']
+        }, room=f"user_{command['user_id']}")
+
+executor.output_listeners.append(emit_command_output)
+executor.status_listeners.append(emit_command_status)
+approval_expiry.listeners.append(emit_approvals_expired)
+
+def stream_command_analysis(command_id, user, command_text, ticket):
+    """Background task: stream model output to the submitter, then apply the verdict"""
+    room = f"user_{user['id']}"
+    
+    def forward_token(chunk):
+        socketio.emit('ai_analysis_chunk', {'command_id': command_id, 'chunk': chunk}, room=room)
+    
+    try:
+        result = Command.complete_analysis(command_id, on_token=forward_token)
+    except Exception as e:
+        print(f"Streamed analysis error for command {command_id}: {e}")
+        socketio.emit('ai_analysis_complete', {'command_id': command_id, 'error': 'AI analysis failed'}, room=room)
+        return
+    finally:
+        ticket.release()
+    
+    socketio.emit('ai_analysis_complete', dict(result, command_id=command_id), room=room)
+    if 'error' not in result:
+        emit_command_result(user, command_text, result)
+
 @app.route('/api/commands', methods=['POST'])
 @require_auth
+@idempotent
+@rate_limited
 def submit_command():
     data = request.get_json()
-    if not data or 'command' not in data:
+    if not data or not isinstance(data.get('command'), str) or not data['command'].strip():
         return jsonify({'error': 'Command text required'}), 400
     
     try:
-        result = Command.submit(request.current_user['id'], data['command'])
-        
-        # Emit real-time update to all connected clients
-        socketio.emit('command_executed', {
-            'user_name': request.current_user['name'],
-            'command': data['command'],
-            'status': result['status'],
-            'timestamp': datetime.now().isoformat(),
-            'credits_used': 1 if result['status'] == 'EXECUTED' else 0
-        }, room='admin_room')
+        ticket = admission.admit(request.current_user['id'], request_lane(),
+                                 needs_analysis=AIAnalyzer.needs_model(data['command']))
+    except AdmissionRejected as e:
+        return shed_response(e)
+    
+    user = dict(request.current_user)
+    try:
+        ctx = run_submission(user['id'], data['command'], stream_analysis=bool(data.get('stream')),
+                             notify=lambda result: emit_command_result(user, data['command'], result))
+        result = ctx.result
         
-        # Emit credit update to user
-        socketio.emit('credit_update', {
-            'credits': result.get('credits_remaining', request.current_user['credits'])
-        }, room=f"user_{request.current_user['id']}")
+        if result['status'] == 'PENDING':
+            # Model verdict arrives over SocketIO; the ticket is held until it does
+            socketio.start_background_task(stream_command_analysis, result['id'],
+                                           user, data['command'], ticket)
+            response = jsonify(result)
+            response.status_code = 202
+        else:
+            ticket.release()
+            response = jsonify(result)
         
-        return jsonify(result)
+        response.headers['Server-Timing'] = ctx.server_timing()
+        return response
     except ValueError as e:
+        ticket.release()
         return jsonify({'error': str(e)}), 400
     except Exception as e:
+        ticket.release()
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/api/commands/batch', methods=['POST'])
+@require_auth
+def submit_command_batch():
+    # Results stream back as NDJSON, one line per command as it is decided, summary last
+    data = request.get_json()
+    commands = data.get('commands') if data else None
+    if not isinstance(commands, list) or not commands or not all(isinstance(c, str) for c in commands):
+        return jsonify({'error': 'A non-empty list of command strings is required'}), 400
+    user = dict(request.current_user)
+    # Each command costs one rate-limit token, so a batch larger than the role's burst could never be let through
+    max_commands = min(Config.BATCH_MAX_COMMANDS, rate_limiter.max_cost(user['role']) or Config.BATCH_MAX_COMMANDS)
+    if len(commands) > max_commands:
+        return jsonify({'error': f'At most {max_commands} commands per batch'}), 400
+    
+    try:
+        rate_limiter.check(user['id'], user['role'], cost=len(commands))
+        ticket = admission.admit(user['id'], request_lane(),
+                                 needs_analysis=any(AIAnalyzer.needs_model(c) for c in commands))
+    except (RateLimitExceeded, AdmissionRejected) as e:
+        return shed_response(e)
+    
+    try:
+        results = Command.submit_batch(user['id'], commands)
+    except ValueError as e:
+        ticket.release()
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        try:
+            for result in results:
+                if result.get('summary') and result['committed']:
+                    event = {
+                        'user_name': user['name'],
+                        'counts': result['counts'],
+                        'timestamp': datetime.now().isoformat(),
+                        'credits_used': result['credits_used']
+                    }
+                    if result['counts'].get('PENDING_APPROVAL'):
+                        event['delta'] = pending_delta()
+                    socketio.emit('command_batch_executed', event, room='admin_room')
+                    socketio.emit('credit_update', {'credits': result['credits_remaining']}, room=f"user_{user['id']}")
+                yield json.dumps(result) + '\n'
+        finally:
+            ticket.release()
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/api/commands', methods=['GET'])
 @require_auth
 def get_commands():
-    commands = Command.get_user_commands(request.current_user['id'])
-    return jsonify(commands)
+    # Keyset pagination: ?limit=&cursor=, next cursor in X-Next-Cursor / Link
+    try:
+        limit, before = page_args(request.args, 50)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    commands = Command.get_user_commands(request.current_user['id'], limit, before)
+    return paged_response(jsonify(commands), commands, limit, ('created_at', 'id'))
+
+def search_filters(args, *fields):
+    """Shared ?start=&end=&<fields> parsing for the search endpoints"""
+    filters = {field: args.get(field) for field in fields}
+    filters['start'] = parse_timestamp(args['start']) if 'start' in args else None
+    filters['end'] = parse_timestamp(args['end']) if 'end' in args else None
+    if args.get('user_id') is not None:
+        filters['user_id'] = int(args['user_id'])
+    return filters
+
+@app.route('/api/search/commands', methods=['GET'])
+@require_auth
+def search_commands():
+    # ?q=<words, "phrases", prefix*>&status=&start=&end=&limit=; admins may also filter by user_id
+    user = request.current_user
+    try:
+        limit, _ = page_args(request.args, 50)
+        filters = search_filters(request.args, 'status', *(('user_id',) if user['role'] == 'admin' else ()))
+        if user['role'] != 'admin':
+            filters['user_id'] = user['id']
+        return jsonify(Command.search(request.args.get('q', ''), limit=limit, **filters))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/commands/search-regex', methods=['POST'])
+@require_auth
+@require_admin
+def search_commands_regex():
+    # "Which past commands would this pattern hit?" - NDJSON matches, newest first, summary last
+    data = request.get_json()
+    pattern = data.get('pattern') if data else None
+    if not isinstance(pattern, str):
+        return jsonify({'error': 'Regex pattern required'}), 400
+    validation = Rule.validate_regex_pattern(pattern)
+    if not validation['valid']:
+        return jsonify(validation), 400
+    
+    options = {key: data.get(key) for key in ('user_id', 'status', 'before_id', 'limit', 'time_budget_ms')}
+    for key in ('user_id', 'before_id', 'limit', 'time_budget_ms'):
+        if options[key] is not None and (not isinstance(options[key], int) or options[key] < 1):
+            return jsonify({'error': f'{key} must be a positive integer'}), 400
+    if options['limit'] is not None:
+        options['limit'] = min(options['limit'], Config.REGEX_SEARCH_MAX_RESULTS)
+    if options['time_budget_ms'] is not None:
+        options['time_budget_ms'] = min(options['time_budget_ms'], Config.REGEX_SEARCH_TIME_BUDGET_MS)
+    
+    def generate():
+        for result in Command.search_regex(pattern, **options):
+            yield json.dumps(result) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/commands/<int:command_id>/output', methods=['GET'])
+@require_auth
+def get_command_output(command_id):
+    command = Command.get_by_id(command_id)
+    if not command or (command['user_id'] != request.current_user['id'] and request.current_user['role'] != 'admin'):
+        return jsonify({'error': 'Command not found'}), 404
+    
+    stream = request.args.get('stream', 'stdout')
+    if stream not in ('stdout', 'stderr'):
+        return jsonify({'error': 'stream must be stdout or stderr'}), 400
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = max(1, int(request.args['limit'])) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    
+    return jsonify(dict(output_store.read(command_id, stream, offset, limit), status=command['status']))
+
+@app.route('/api/commands/<int:command_id>/similar', methods=['GET'])
+@require_auth
+@require_admin
+def get_similar_commands(command_id):
+    command = Command.get_by_id(command_id)
+    if not command:
+        return jsonify({'error': 'Command not found'}), 404
+    limit = min(request.args.get('limit', 5, type=int), 50)
+    return jsonify(similarity_index.neighbors(command['command_text'], limit=limit,
+                                              min_similarity=Config.SIMILARITY_SHOW_MIN))
 
 @app.route('/api/users', methods=['POST'])
 @require_auth
@@ -155,6 +452,14 @@ def check_rule_conflicts():
     conflict_result = Rule.detect_rule_conflicts(data['pattern'], data['action'])
     return jsonify(conflict_result)
 
+@app.route('/api/rules/suggestions', methods=['GET'])
+@require_auth
+@require_admin
+def get_rule_suggestions():
+    min_count = request.args.get('min_count', type=int)
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    return jsonify(Rule.suggest(min_count, limit))
+
 @app.route('/api/rules', methods=['POST'])
 @require_auth
 @require_admin
@@ -200,15 +505,71 @@ def create_rule():
 @require_auth
 @require_admin
 def get_audit_logs():
-    logs = AuditLog.get_logs()
-    return jsonify(logs)
+    # Keyset pagination: ?limit=&cursor=, next cursor in X-Next-Cursor / Link
+    try:
+        limit, before = page_args(request.args, 100)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    logs = AuditLog.get_logs(limit, before)
+    return paged_response(jsonify(logs), logs, limit, ('timestamp', 'id'))
+
+@app.route('/api/search/audit-logs', methods=['GET'])
+@require_auth
+@require_admin
+def search_audit_logs():
+    # ?q=<words, "phrases", prefix*>&user_id=&action=&start=&end=&limit=
+    try:
+        limit, _ = page_args(request.args, 100)
+        filters = search_filters(request.args, 'user_id', 'action')
+        return jsonify(AuditLog.search(request.args.get('q', ''), limit=limit, **filters))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/audit-logs/export', methods=['GET'])
+@require_auth
+@require_admin
+def export_audit_logs():
+    # ?format=ndjson|csv&start=&end= (ISO 8601, end exclusive)&user_id=&action=&gzip=1
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(FORMATS)}"}), 400
+    try:
+        filters = {
+            'start': parse_timestamp(request.args['start']) if 'start' in request.args else None,
+            'end': parse_timestamp(request.args['end']) if 'end' in request.args else None,
+            'user_id': int(request.args['user_id']) if 'user_id' in request.args else None,
+            'action': request.args.get('action')
+        }
+    except ValueError:
+        return jsonify({'error': 'start/end must be ISO 8601 timestamps and user_id an integer'}), 400
+    compress = request.args.get('gzip') in ('1', 'true')
+    
+    applied = {key: value for key, value in filters.items() if value is not None}
+    AuditLog.log(request.current_user['id'], 'AUDIT_LOG_EXPORTED',
+                 f"Audit log exported as {fmt}{' (gzip)' if compress else ''}, filters {applied}")
+    
+    mimetype, extension = FORMATS[fmt]
+    filename = f'audit-logs.{extension}'
+    if compress:
+        mimetype, filename = 'application/gzip', filename + '.gz'
+    response = Response(stream_export(AuditLog.iter_logs(**filters), fmt, compress), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 @app.route('/api/pending-approvals', methods=['GET'])
 @require_auth
 @require_admin
 def get_pending_approvals():
-    commands = Command.get_pending_approvals()
-    return jsonify(commands)
+    # ?since=<version> returns only the changes after that version (see Command.get_pending_changes)
+    if 'since' in request.args:
+        try:
+            since = int(request.args['since'])
+        except ValueError:
+            return jsonify({'error': 'since must be an integer version'}), 400
+        delta = Command.get_pending_changes(since)
+        with_similar_commands(delta['upserts'])
+        return jsonify(delta)
+    return jsonify(with_similar_commands(Command.get_pending_approvals()))
 
 @app.route('/api/commands/<int:command_id>/approve', methods=['POST'])
 @require_auth
@@ -222,7 +583,8 @@ def approve_command(command_id):
     reason = data.get('reason', '')
     
     try:
-        result = Command.approve_command(command_id, request.current_user['id'], approved, reason)
+        with admission.admit(request.current_user['id'], PRIORITY_LANE):
+            result = Command.approve_command(command_id, request.current_user['id'], approved, reason)
         
         if 'error' in result:
             return jsonify(result), 400
@@ -234,60 +596,117 @@ def approve_command(command_id):
             'admin_name': request.current_user['name'],
             'approved': approved,
             'reason': reason,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'delta': pending_delta()
         }, room='admin_room')
         
         return jsonify(result)
+    except AdmissionRejected as e:
+        return shed_response(e)
     except Exception as e:
         return jsonify({'error': 'Failed to process approval'}), 500
 
-@app.route('/api/analytics', methods=['GET'])
+@app.route('/api/pending-approvals/bulk', methods=['POST'])
 @require_auth
 @require_admin
-def get_analytics():
-    conn = Database().get_connection()
-    cursor = conn.cursor()
-    
-    # Get command statistics
-    cursor.execute('''
-        SELECT 
-            COUNT(*) as total_commands,
-            SUM(CASE WHEN status = 'EXECUTED' THEN 1 ELSE 0 END) as executed_commands,
-            SUM(CASE WHEN status = 'REJECTED' THEN 1 ELSE 0 END) as rejected_commands,
-            SUM(credits_deducted) as total_credits_used
-        FROM commands
-        WHERE DATE(created_at) = DATE('now')
-    ''')
-    daily_stats = cursor.fetchone()
+def bulk_approve_commands():
+    # Selection: explicit command_ids and/or filters (user_id, fingerprint, min_risk, max_risk)
+    data = request.get_json()
+    if not data or not isinstance(data.get('approved'), bool):
+        return jsonify({'error': 'Approval decision required'}), 400
     
-    # Get top commands
-    cursor.execute('''
-        SELECT command_text, COUNT(*) as count, status
-        FROM commands 
-        WHERE DATE(created_at) = DATE('now')
-        GROUP BY command_text, status
-        ORDER BY count DESC
-        LIMIT 10
-    ''')
-    top_commands = cursor.fetchall()
+    command_ids = data.get('command_ids')
+    if command_ids is not None:
+        if not isinstance(command_ids, list) or not all(isinstance(c, int) for c in command_ids):
+            return jsonify({'error': 'command_ids must be a list of integers'}), 400
+        if len(command_ids) > Config.BULK_APPROVAL_MAX_COMMANDS:
+            return jsonify({'error': f'At most {Config.BULK_APPROVAL_MAX_COMMANDS} commands per request'}), 400
+    filters = {key: data.get(key) for key in ('user_id', 'fingerprint', 'min_risk', 'max_risk')}
+    for key, kind in (('user_id', int), ('fingerprint', str), ('min_risk', int), ('max_risk', int)):
+        value = filters[key]
+        if value is not None and (not isinstance(value, kind) or isinstance(value, bool)):
+            return jsonify({'error': f"{key} must be {'an integer' if kind is int else 'a string'}"}), 400
+    if command_ids is None and all(value is None for value in filters.values()):
+        return jsonify({'error': 'Select commands by command_ids or at least one filter'}), 400
     
-    # Get user activity
-    cursor.execute('''
-        SELECT u.name, COUNT(c.id) as command_count
-        FROM users u
-        LEFT JOIN commands c ON u.id = c.user_id AND DATE(c.created_at) = DATE('now')
-        GROUP BY u.id, u.name
-        ORDER BY command_count DESC
-    ''')
-    user_activity = cursor.fetchall()
+    approved = data['approved']
+    reason = data.get('reason', '')
     
-    conn.close()
+    try:
+        with admission.admit(request.current_user['id'], PRIORITY_LANE):
+            result = Command.bulk_approve(request.current_user['id'], approved, reason,
+                                          command_ids=command_ids, **filters)
+        
+        # One aggregated event instead of one approval_update per command
+        socketio.emit('approval_bulk_update', {
+            'counts': result['counts'],
+            'total': result['total'],
+            'admin_name': request.current_user['name'],
+            'approved': approved,
+            'reason': reason,
+            'timestamp': datetime.now().isoformat(),
+            'delta': pending_delta()
+        }, room='admin_room')
+        for user_id, credits in result['credits_remaining'].items():
+            socketio.emit('credit_update', {'credits': credits}, room=f"user_{user_id}")
+        
+        return jsonify(result)
+    except AdmissionRejected as e:
+        return shed_response(e)
+    except Exception as e:
+        return jsonify({'error': 'Failed to process approvals'}), 500
+
+@app.route('/api/analytics', methods=['GET'])
+@require_auth
+@require_admin
+def get_analytics():
+    return jsonify(Command.get_analytics())
+
+@app.route('/api/analytics/timeseries', methods=['GET'])
+@require_auth
+@require_admin
+def get_analytics_timeseries():
+    # ?from=&to=&bucket=minute|hour|day&group_by=status,user,rule,fingerprint
+    try:
+        bucket = request.args.get('bucket', 'hour')
+        group_by = [dimension for dimension in request.args.get('group_by', '').split(',') if dimension]
+        unknown = [dimension for dimension in group_by if dimension not in DIMENSIONS]
+        if unknown or len(set(group_by)) != len(group_by):
+            raise ValueError(f"group_by takes distinct dimensions from: {', '.join(DIMENSIONS)}")
+        start = parse_timestamp(request.args['from']) if 'from' in request.args else None
+        end = parse_timestamp(request.args['to']) if 'to' in request.args else None
+        start, end, resolution = series_range(start, end, bucket)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
-        'daily_stats': dict(daily_stats) if daily_stats else {},
-        'top_commands': [dict(cmd) for cmd in top_commands],
-        'user_activity': [dict(user) for user in user_activity]
-    })
+    # The version only changes with writes to the days the range covers, so a poll
+    # that finds it unchanged - any poll of settled history - skips the query
+    query = json.dumps([Command.analytics_version(start, end), start, end, bucket, group_by])
+    etag = hashlib.sha256(query.encode()).hexdigest()[:32]
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        series = Command.get_timeseries(start, end, bucket, resolution, group_by)
+        response = jsonify({'from': start, 'to': end, 'bucket': bucket, 'resolution': resolution,
+                            'group_by': group_by, **series})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/api/ai/health', methods=['GET'])
+@require_auth
+@require_admin
+def get_ai_health():
+    health = AIAnalyzer.health()
+    health['admission'] = admission.snapshot()
+    health['executor'] = executor.snapshot()
+    return jsonify(health)
+
+@app.route('/api/metrics', methods=['GET'])
+@require_auth
+@require_admin
+def get_metrics():
+    return jsonify(metrics.snapshot())
 
 # WebSocket events
 @socketio.on('connect')
@@ -317,4 +736,8 @@ def handle_join_user_room(data):
             emit('joined_user_room', {'status': 'success'})
 
 if __name__ == '__main__':
+    Command.recover_executions()
+    socketio.start_background_task(output_store.run_sweeper)
+    socketio.start_background_task(approval_expiry.run)
+    socketio.start_background_task(run_timeseries_compaction)
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+
+FIELDS = ('id', 'timestamp', 'user_id', 'user_name', 'action', 'details')
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+# Rows encoded per chunk handed to the response (and to the compressor)
+ROWS_PER_CHUNK = 500
+
+def parse_timestamp(value):
+    """
+    ISO 8601 date or datetime -> the 'YYYY-MM-DD HH:MM:SS' UTC form SQLite's
+    CURRENT_TIMESTAMP writes, so it compares correctly against stored rows.
+    Naive values are taken as UTC. Raises ValueError on anything else.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def encode(rows, fmt):
+    """Yield the rows as text chunks in `fmt` (ndjson or csv, with a header row)"""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(FIELDS)
+    pending = 0
+    for row in rows:
+        if writer:
+            writer.writerow([row[field] for field in FIELDS])
+        else:
+            buffer.write(json.dumps({field: row[field] for field in FIELDS}) + '\n')
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_export(rows, fmt, compress=False):
+    """Yield the encoded export as bytes, gzip-compressed on the fly if asked"""
+    if not compress:
+        for chunk in encode(rows, fmt):
+            yield chunk.encode('utf-8')
+        return
+    # wbits=31: gzip container, so the output is a valid .gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in encode(rows, fmt):
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,86 @@
+import threading
+import time
+
+class CircuitBreaker:
+    """
+    Classic closed/open/half-open breaker.
+    Opens after `failure_threshold` consecutive failures (slow calls count as
+    failures), short-circuits callers for `reset_timeout` seconds, then lets a
+    single probe through to decide whether to close again.
+    """
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+    
+    def __init__(self, failure_threshold=5, slow_call_seconds=None, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self.times_opened = 0
+        self.short_circuited = 0
+    
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+    
+    def _current_state(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+    
+    def allow_request(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+    
+    def record_success(self, elapsed_seconds=0.0):
+        if self.slow_call_seconds is not None and elapsed_seconds > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            self._consecutive_failures = 0
+            self._state = self.CLOSED
+            self._opened_at = None
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+    
+    def snapshot(self):
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = round(max(0.0, self.reset_timeout - (self._clock() - self._opened_at)), 3)
+            return {
+                'state': state,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'slow_call_seconds': self.slow_call_seconds,
+                'reset_timeout': self.reset_timeout,
+                'retry_in_seconds': retry_in,
+                'times_opened': self.times_opened,
+                'short_circuited': self.short_circuited
+            }
@@ -7,4 +7,148 @@ class Config:
     
     # Command validation
     MAX_COMMAND_LENGTH = 1000
-    ALLOWED_COMMAND_CHARS = r'^[a-zA-Z0-9\s\-_./\\:@#$%^&*()+=\[\]{}|;,<>?~`"\']+$'
\ No newline at end of file
+    ALLOWED_COMMAND_CHARS = r'^[a-zA-Z0-9\s\-_./\\:@#$%^&*()+=\[\]{}|;,<>?~`"\']+$'
+    
+    # Local fast-path risk classifier (only the uncertain band goes to the LLM)
+    FAST_PATH_ENABLED = True
+    FAST_PATH_SAFE_MAX_SCORE = 1
+    FAST_PATH_DANGEROUS_MIN_SCORE = 7
+    
+    # AI analyzer backend: 'ollama', or 'fake' for offline load testing
+    AI_BACKEND = os.environ.get('AI_BACKEND', 'ollama')
+    AI_MODEL = os.environ.get('AI_MODEL', 'qwen2.5')
+    OLLAMA_HOST = os.environ.get('OLLAMA_HOST')
+    
+    # Fake backend behaviour (latency in ms; distribution: fixed, uniform, exponential, lognormal)
+    FAKE_AI_LATENCY_MS = float(os.environ.get('FAKE_AI_LATENCY_MS', 800))
+    FAKE_AI_LATENCY_DISTRIBUTION = os.environ.get('FAKE_AI_LATENCY_DISTRIBUTION', 'lognormal')
+    FAKE_AI_LATENCY_JITTER = 0.5
+    FAKE_AI_ERROR_RATE = float(os.environ.get('FAKE_AI_ERROR_RATE', 0.0))
+    FAKE_AI_SEED = 1234
+    FAKE_AI_DEFAULT_RISK_SCORE = 2
+    FAKE_AI_RULES = [
+        (r'\b(rm|dd|mkfs|shred|shutdown|reboot|chmod|chown|kill|iptables|useradd|userdel)\b', 8),
+        (r'\|\s*(sh|bash|python)\b', 9),
+        (r'\b(curl|wget|ssh|scp|nc)\b', 6)
+    ]
+    
+    # AI analyzer deadlines and circuit breaker
+    AI_TIMEOUT_SECONDS = 20
+    AI_MAX_CONCURRENT_CALLS = 4
+    AI_BREAKER_FAILURE_THRESHOLD = 5
+    AI_BREAKER_SLOW_CALL_SECONDS = 15
+    AI_BREAKER_RESET_SECONDS = 30
+    
+    # Admission control on command submission (priority lane = admins and approvals)
+    ADMISSION_MAX_IN_FLIGHT = 64
+    ADMISSION_PRIORITY_RESERVED = 8
+    ADMISSION_MAX_QUEUED_ANALYSES = 32
+    ADMISSION_PER_USER_IN_FLIGHT = 4
+    ADMISSION_RETRY_AFTER_SECONDS = 2
+    
+    # Per-user token buckets: `rate` tokens/second refill, up to `burst` tokens
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMITS = {
+        'admin': {'rate': 20, 'burst': 100},
+        'member': {'rate': 2, 'burst': 20}
+    }
+    # 'memory' (per process) or 'sqlite' (shared across worker processes)
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_DB_PATH = 'rate_limits.db'
+    
+    # Batch submission (POST /api/commands/batch)
+    BATCH_MAX_COMMANDS = 500
+    BATCH_ANALYSIS_WORKERS = 8
+    
+    # Command submission stages, run in order (see pipeline.STAGES / register_stage)
+    COMMAND_PIPELINE_STAGES = ['validate', 'fingerprint', 'authorize_credits', 'match_rules', 'analyze', 'persist', 'execute', 'notify']
+    
+    # Idempotency-Key handling on POST /api/commands
+    IDEMPOTENCY_CACHE_SIZE = 1024
+    IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+    # How long a duplicate waits for the original; must outlast AI_TIMEOUT_SECONDS
+    IDEMPOTENCY_WAIT_SECONDS = 30
+    
+    # Command execution: 'mock' returns a placeholder result, 'subprocess' really runs commands
+    EXECUTION_MODE = os.environ.get('EXECUTION_MODE', 'mock')
+    EXECUTION_WORKERS = 4
+    EXECUTION_PER_USER_CONCURRENCY = 2
+    EXECUTION_TIMEOUT_SECONDS = 30
+    EXECUTION_CPU_SECONDS = 10
+    EXECUTION_MEMORY_BYTES = 512 * 1024 * 1024
+    EXECUTION_MAX_OUTPUT_BYTES = 1024 * 1024
+    EXECUTION_CHUNK_BYTES = 4096
+    EXECUTION_SHELL = '/bin/sh'
+    
+    # Stored execution output (compressed chunks, separate from the commands table)
+    OUTPUT_CHUNK_BYTES = 64 * 1024
+    OUTPUT_MAX_STORED_BYTES = 512 * 1024
+    OUTPUT_READ_LIMIT_BYTES = 256 * 1024
+    OUTPUT_COMPRESSION_LEVEL = 6
+    OUTPUT_RETENTION_SECONDS = 7 * 24 * 60 * 60
+    OUTPUT_SWEEP_INTERVAL_SECONDS = 60 * 60
+    
+    # Execution queue scheduling: weighted fair share per class, aging against starvation
+    SCHEDULER_CLASS_WEIGHTS = {'approved': 8, 'admin': 4, 'standard': 2, 'low': 1}
+    SCHEDULER_LOW_PRIORITY_RISK_SCORE = 5
+    # Waiting SCHEDULER_AGING_SECONDS earns one unit of virtual time (the cost of one 'low' job)
+    SCHEDULER_AGING_SECONDS = 120
+    
+    # Shell parser: parsed ASTs cached per distinct command text
+    SHELL_PARSE_CACHE_SIZE = 4096
+    
+    # Command fingerprints: model verdicts reused across commands with the same template
+    AI_VERDICT_CACHE_ENABLED = True
+    AI_VERDICT_CACHE_SIZE = 2048
+    AI_VERDICT_CACHE_TTL_SECONDS = 60 * 60
+    FINGERPRINT_BACKFILL_CHUNK_SIZE = 500
+    
+    # Rule suggestions from command history
+    RULE_SUGGESTION_MIN_COUNT = 5
+    RULE_SUGGESTION_MIN_AGREEMENT = 0.9
+    RULE_SUGGESTION_MAX_ACCEPT_RISK = 2
+    
+    # Near-duplicate verdict reuse (MinHash signatures, LSH buckets); see similarity.py
+    SIMILARITY_ENABLED = True
+    SIMILARITY_NUM_PERM = 128
+    SIMILARITY_BANDS = 32
+    SIMILARITY_THRESHOLD = 0.8
+    # Neighbours at least this similar are listed to admins reviewing a command
+    SIMILARITY_SHOW_MIN = 0.5
+    SIMILARITY_MAX_ENTRIES = 50000
+    SIMILARITY_SEED = 1
+    # Off: only verdicts that require approval are reused; harmless look-alikes still go to the model
+    SIMILARITY_REUSE_SAFE_VERDICTS = False
+    
+    # Bulk approval: most pending commands one admin decision may touch
+    BULK_APPROVAL_MAX_COMMANDS = 1000
+    
+    # Pending-approvals delta sync: change-log entries kept for clients catching up
+    PENDING_CHANGES_RETENTION = 10000
+    
+    # Approval expiry: commands pending approval longer than this become EXPIRED (0 disables)
+    APPROVAL_TTL_SECONDS = 24 * 60 * 60
+    APPROVAL_EXPIRY_TICK_SECONDS = 1
+    # Timer wheel geometry: slots ** levels ticks before a deadline has to be re-parked
+    APPROVAL_EXPIRY_WHEEL_SLOTS = 256
+    APPROVAL_EXPIRY_WHEEL_LEVELS = 3
+    
+    # Audit log export: rows read per keyset batch while streaming
+    AUDIT_EXPORT_BATCH_SIZE = 1000
+    
+    # Keyset pagination: largest page a client may ask for
+    PAGE_MAX_LIMIT = 500
+    
+    # Regex search over command history (POST /api/commands/search-regex)
+    REGEXP_CACHE_SIZE = 256
+    REGEX_SEARCH_WINDOW = 5000
+    REGEX_SEARCH_MAX_RESULTS = 1000
+    REGEX_SEARCH_TIME_BUDGET_MS = 2000
+    
+    # Analytics timeseries (GET /api/analytics/timeseries): buckets shown when no range is given,
+    # and the most one request may span
+    TIMESERIES_DEFAULT_BUCKETS = 48
+    TIMESERIES_MAX_BUCKETS = 7 * 24 * 60
+    # Minute buckets older than this are compacted away; the hour and day series keep their totals
+    TIMESERIES_MINUTE_RETENTION_MINUTES = TIMESERIES_MAX_BUCKETS
+    TIMESERIES_COMPACTION_INTERVAL_SECONDS = 60 * 60
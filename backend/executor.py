@@ -0,0 +1,231 @@
+import codecs
+import os
+import selectors
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from config import Config
+from metrics import registry as metrics
+from scheduler import FairScheduler, STANDARD_CLASS
+
+# resource is POSIX-only; without it commands run with wall-time and output limits only
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+class ExecutionJob:
+    def __init__(self, command_id, user_id, command_text, priority_class=STANDARD_CLASS):
+        self.command_id = command_id
+        self.user_id = user_id
+        self.command_text = command_text
+        self.priority_class = priority_class
+        self.enqueued_at = time.monotonic()
+        self.virtual_tag = 0.0
+
+class CommandExecutor:
+    """
+    Runs accepted commands on a bounded pool of worker threads, each driving
+    one sandboxed subprocess: its own session and scratch directory, a minimal
+    environment, CPU/memory rlimits, a wall-clock deadline and an output cap.
+    Queued jobs are ordered by a FairScheduler (priority class, per-user fair
+    share, aging); at most `per_user` commands of the same user run at once and
+    the rest wait while other users' jobs go ahead.
+    
+    Listeners are plain callables:
+      output_listeners: fn(job, stream_name, text) for every stdout/stderr chunk
+      status_listeners: fn(job, status, details) for RUNNING and the final
+                        EXECUTED / FAILED / TIMED_OUT
+    """
+    def __init__(self, workers=None, per_user=None, timeout_seconds=None, cpu_seconds=None,
+                 memory_bytes=None, max_output_bytes=None, chunk_bytes=None, shell=None):
+        self.workers = workers or Config.EXECUTION_WORKERS
+        self.per_user = per_user or Config.EXECUTION_PER_USER_CONCURRENCY
+        self.timeout_seconds = timeout_seconds or Config.EXECUTION_TIMEOUT_SECONDS
+        self.cpu_seconds = cpu_seconds or Config.EXECUTION_CPU_SECONDS
+        self.memory_bytes = memory_bytes or Config.EXECUTION_MEMORY_BYTES
+        self.max_output_bytes = max_output_bytes or Config.EXECUTION_MAX_OUTPUT_BYTES
+        self.chunk_bytes = chunk_bytes or Config.EXECUTION_CHUNK_BYTES
+        self.shell = shell or Config.EXECUTION_SHELL
+        self.output_listeners = []
+        self.status_listeners = []
+        self._scheduler = FairScheduler()
+        self._running = {}
+        self._threads = []
+        self._cond = threading.Condition()
+    
+    @staticmethod
+    def enabled():
+        """False in 'mock' mode, where execution stays a synchronous placeholder string"""
+        return Config.EXECUTION_MODE == 'subprocess'
+    
+    @staticmethod
+    def accepted_status():
+        """Status written for a command that has been cleared to run"""
+        return 'QUEUED' if CommandExecutor.enabled() else 'EXECUTED'
+    
+    @staticmethod
+    def mock_result(command_text):
+        return f"Mock execution of: {command_text}"
+    
+    def submit(self, command_id, user_id, command_text, priority_class=STANDARD_CLASS):
+        job = ExecutionJob(command_id, user_id, command_text, priority_class)
+        with self._cond:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'executor-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._scheduler.push(job)
+            self._cond.notify_all()
+        metrics.counter('executor.submitted').inc()
+        return job
+    
+    def snapshot(self):
+        with self._cond:
+            return dict(self._scheduler.snapshot(),
+                        workers=self.workers,
+                        running=sum(self._running.values()),
+                        per_user_limit=self.per_user)
+    
+    def _next_job(self):
+        """Next scheduled job whose user is under the per-user cap (caller holds the lock)"""
+        return self._scheduler.pop(lambda job: self._running.get(job.user_id, 0) < self.per_user)
+    
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running[job.user_id] = self._running.get(job.user_id, 0) + 1
+            try:
+                self._execute(job)
+            except Exception as e:
+                print(f"Execution error for command {job.command_id}: {e}")
+                self._notify_status(job, 'FAILED', {'exit_code': None, 'error': 'Executor error'})
+            finally:
+                with self._cond:
+                    self._running[job.user_id] -= 1
+                    if not self._running[job.user_id]:
+                        del self._running[job.user_id]
+                    self._cond.notify_all()
+    
+    def _limit_resources(self):
+        # Runs in the child between fork and exec
+        if RESOURCE_AVAILABLE:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 1))
+            resource.setrlimit(resource.RLIMIT_AS, (self.memory_bytes, self.memory_bytes))
+            resource.setrlimit(resource.RLIMIT_FSIZE, (self.max_output_bytes, self.max_output_bytes))
+            resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    
+    def _execute(self, job):
+        self._notify_status(job, 'RUNNING', {})
+        workdir = tempfile.mkdtemp(prefix=f'command-{job.command_id}-')
+        start = time.monotonic()
+        deadline = start + self.timeout_seconds
+        try:
+            process = subprocess.Popen(
+                [self.shell, '-c', job.command_text],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=workdir,
+                env={'PATH': os.environ.get('PATH', '/usr/bin:/bin'), 'HOME': workdir, 'LANG': 'C.UTF-8'},
+                start_new_session=True,
+                preexec_fn=self._limit_resources
+            )
+            outcome = self._pump_output(job, process, deadline)
+            if outcome:
+                self._kill(process)
+            try:
+                exit_code = process.wait(timeout=max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                self._kill(process)
+                exit_code = process.wait()
+                outcome = outcome or 'timeout'
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        
+        duration_ms = (time.monotonic() - start) * 1000
+        metrics.histogram('executor.run_ms').observe(duration_ms)
+        details = {'exit_code': exit_code, 'duration_ms': round(duration_ms, 1)}
+        if outcome == 'timeout':
+            status = 'TIMED_OUT'
+            details['error'] = f'Wall-clock limit of {self.timeout_seconds}s exceeded'
+        elif outcome == 'output':
+            status = 'FAILED'
+            details['error'] = f'Output limit of {self.max_output_bytes} bytes exceeded'
+        elif exit_code == 0:
+            status = 'EXECUTED'
+        else:
+            status = 'FAILED'
+            if exit_code == -signal.SIGXCPU:
+                details['error'] = f'CPU time limit of {self.cpu_seconds}s exceeded'
+            elif exit_code < 0:
+                details['error'] = f'Terminated by signal {-exit_code}'
+        metrics.counter(f'executor.{status.lower()}').inc()
+        self._notify_status(job, status, details)
+    
+    def _pump_output(self, job, process, deadline):
+        """Forward stdout/stderr in chunks until both close; returns 'timeout', 'output' or None"""
+        selector = selectors.DefaultSelector()
+        decoders = {}
+        for name, pipe in (('stdout', process.stdout), ('stderr', process.stderr)):
+            selector.register(pipe, selectors.EVENT_READ, name)
+            decoders[name] = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        total = 0
+        try:
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return 'timeout'
+                for key, _ in selector.select(timeout=remaining):
+                    data = os.read(key.fileobj.fileno(), self.chunk_bytes)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+                        text = decoders[key.data].decode(b'', final=True)
+                        if text:
+                            self._notify_output(job, key.data, text)
+                        continue
+                    total += len(data)
+                    if total > self.max_output_bytes:
+                        return 'output'
+                    text = decoders[key.data].decode(data)
+                    if text:
+                        self._notify_output(job, key.data, text)
+            return None
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+    
+    @staticmethod
+    def _kill(process):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    
+    def _notify_output(self, job, stream_name, text):
+        for listener in self.output_listeners:
+            try:
+                listener(job, stream_name, text)
+            except Exception as e:
+                print(f"Output listener error: {e}")
+    
+    def _notify_status(self, job, status, details):
+        for listener in self.status_listeners:
+            try:
+                listener(job, status, details)
+            except Exception as e:
+                print(f"Status listener error: {e}")
+
+executor = CommandExecutor()
+metrics.gauge('executor.queued', lambda: executor.snapshot()['queued'])
+metrics.gauge('executor.running', lambda: executor.snapshot()['running'])
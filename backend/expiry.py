@@ -0,0 +1,220 @@
+import threading
+import time
+from config import Config
+from metrics import registry as metrics
+from models import Database
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel. Level 0 has one slot per tick; each level above
+    covers `slots` times the span of the one below and its slots are cascaded
+    down as time reaches them. Scheduling and cancelling are dict operations
+    (O(1)), and advancing the clock only touches timers that are due or being
+    cascaded - never the whole set. Deadlines past the top level's span are
+    parked in its furthest slot and re-placed when it is cascaded.
+    """
+    def __init__(self, tick_seconds=1.0, slots=256, levels=3, now=None):
+        self.tick_seconds = tick_seconds
+        self.slots = slots
+        self.levels = levels
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        # key -> (level, slot) of the dict currently holding it
+        self._where = {}
+        self._current = int((time.time() if now is None else now) / tick_seconds)
+    
+    def __len__(self):
+        return len(self._where)
+    
+    def __contains__(self, key):
+        return key in self._where
+    
+    def schedule(self, key, deadline):
+        """(Re)schedule `key` to fire at `deadline` (epoch seconds)"""
+        self.cancel(key)
+        # A deadline already past fires on the next tick
+        self._place(key, max(-int(-deadline // self.tick_seconds), self._current + 1))
+    
+    def cancel(self, key):
+        where = self._where.pop(key, None)
+        if where is not None:
+            level, slot = where
+            del self._wheels[level][slot][key]
+        return where is not None
+    
+    def advance(self, now):
+        """Move the clock to `now` and return the keys that fell due, in deadline order"""
+        target = int(now / self.tick_seconds)
+        due = []
+        while self._current < target:
+            self._current += 1
+            # Higher levels first: they may drop timers into the lower slots cascaded on this tick
+            for level in range(self.levels - 1, 0, -1):
+                span = self.slots ** level
+                if self._current % span == 0:
+                    bucket = self._take(level, (self._current // span) % self.slots)
+                    for key, due_tick in bucket.items():
+                        if due_tick <= self._current:
+                            due.append(key)
+                        else:
+                            self._place(key, due_tick)
+            due.extend(self._take(0, self._current % self.slots))
+        return due
+    
+    def _place(self, key, due_tick):
+        delta = due_tick - self._current
+        level = 0
+        while level < self.levels - 1 and delta >= self.slots ** (level + 1):
+            level += 1
+        if delta >= self.slots ** (level + 1):
+            # Beyond the top level's span: park in the last slot this level reaches
+            slot = (self._current // self.slots ** level + self.slots) % self.slots
+        else:
+            slot = (due_tick // self.slots ** level) % self.slots
+        self._wheels[level][slot][key] = due_tick
+        self._where[key] = (level, slot)
+    
+    def _take(self, level, slot):
+        bucket = self._wheels[level][slot]
+        self._wheels[level][slot] = {}
+        for key in bucket:
+            del self._where[key]
+        return bucket
+
+class ApprovalExpiry:
+    """
+    Expires commands left in PENDING_APPROVAL longer than APPROVAL_TTL_SECONDS.
+    Outstanding approvals live in a TimerWheel keyed by command id. The table
+    is read once at startup; after that the pending_changes log (see
+    Database.init_db) is followed from the last sequence seen, so commands
+    entering the queue are scheduled and commands leaving it are cancelled in
+    O(changes) per tick. Expiry is a conditional update, so a command approved
+    or rejected at the last moment is left alone.
+    """
+    def __init__(self, ttl_seconds=None, tick_seconds=None, clock=time.time):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.APPROVAL_TTL_SECONDS
+        self.tick_seconds = tick_seconds or Config.APPROVAL_EXPIRY_TICK_SECONDS
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._wheel = None
+        self._last_seq = None
+        # Called with the list of expired commands (dicts: id, user_id, command_text)
+        self.listeners = []
+    
+    def load(self):
+        """Schedule every command currently pending (one read at startup)"""
+        database = Database()
+        conn = database.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN')
+            cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM pending_changes')
+            last_seq = cursor.fetchone()[0]
+            cursor.execute('''
+                SELECT id, CAST(strftime('%s', COALESCE(created_at, 'now')) AS INTEGER) AS created
+                FROM commands WHERE status = 'PENDING_APPROVAL'
+            ''')
+            rows = cursor.fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+        
+        wheel = TimerWheel(self.tick_seconds, Config.APPROVAL_EXPIRY_WHEEL_SLOTS,
+                           Config.APPROVAL_EXPIRY_WHEEL_LEVELS, now=self._clock())
+        for row in rows:
+            wheel.schedule(row['id'], row['created'] + self.ttl_seconds)
+        with self._lock:
+            self._wheel = wheel
+            self._last_seq = last_seq
+    
+    def sync(self):
+        """Apply queue changes logged since the last call"""
+        if self._wheel is None:
+            self.load()
+            return
+        conn = Database().get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN')
+            cursor.execute('SELECT MIN(seq) FROM pending_changes')
+            oldest = cursor.fetchone()[0]
+            cursor.execute('''
+                SELECT p.seq, c.id, c.status, CAST(strftime('%s', COALESCE(c.created_at, 'now')) AS INTEGER) AS created
+                FROM pending_changes p JOIN commands c ON c.id = p.command_id
+                WHERE p.seq > ? ORDER BY p.seq
+            ''', (self._last_seq,))
+            rows = cursor.fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+        
+        if oldest is not None and self._last_seq < oldest - 1:
+            # The log was pruned past us; start over from the table
+            self.load()
+            return
+        with self._lock:
+            for row in rows:
+                if row['status'] == 'PENDING_APPROVAL':
+                    if row['id'] not in self._wheel:
+                        self._wheel.schedule(row['id'], row['created'] + self.ttl_seconds)
+                else:
+                    self._wheel.cancel(row['id'])
+                self._last_seq = row['seq']
+    
+    def tick(self):
+        """Sync, then expire whatever has fallen due. Returns the expired commands."""
+        self.sync()
+        with self._lock:
+            due = self._wheel.advance(self._clock())
+        if not due:
+            return []
+        
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        expired = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for command_id in due:
+                cursor.execute('''
+                    UPDATE commands SET status = 'EXPIRED', finished_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'PENDING_APPROVAL'
+                ''', (command_id,))
+                if cursor.rowcount == 0:
+                    continue
+                cursor.execute('SELECT id, user_id, command_text FROM commands WHERE id = ?', (command_id,))
+                command = dict(cursor.fetchone())
+                cursor.execute(
+                    'INSERT INTO audit_logs (user_id, action, details) VALUES (?, ?, ?)',
+                    (command['user_id'], 'COMMAND_EXPIRED',
+                     f"Command {command_id} expired after waiting {self.ttl_seconds}s for approval: {command['command_text']}")
+                )
+                expired.append(command)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        if expired:
+            metrics.counter('approvals.expired').inc(len(expired))
+            for listener in self.listeners:
+                listener(expired)
+        return expired
+    
+    def outstanding(self):
+        with self._lock:
+            return len(self._wheel) if self._wheel is not None else 0
+    
+    def run(self):
+        """Background loop (started by the app); a TTL of 0 disables expiry"""
+        if not self.ttl_seconds:
+            return
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Approval expiry error: {e}")
+            time.sleep(self.tick_seconds)
+
+approval_expiry = ApprovalExpiry()
+metrics.gauge('approvals.outstanding', approval_expiry.outstanding)
@@ -0,0 +1,161 @@
+import hashlib
+import re
+from collections import namedtuple
+from functools import lru_cache
+from config import Config
+from models import RiskClassifier
+from shell_parser import parse_command, ASSIGNMENT
+
+# Commands whose first positional argument selects what they do (git push vs git log)
+SUBCOMMAND_BINARIES = frozenset([
+    'git', 'docker', 'kubectl', 'systemctl', 'service', 'apt', 'apt-get', 'yum', 'dnf',
+    'pip', 'pip3', 'npm', 'yarn', 'cargo', 'go', 'brew', 'ip', 'helm', 'terraform'
+])
+# The next word is the program that actually runs (sudo rm, nohup make)
+WRAPPERS = RiskClassifier.PRIVILEGE_ESCALATION | RiskClassifier.EXEC_WRAPPERS | frozenset(['env', 'command'])
+# Numeric and symbolic arguments of these (modes, signals, pids, ids) are kept literally:
+# chmod 644 and chmod 777, or kill -9 4242 and kill -9 1, must not share a verdict
+LITERAL_ARGUMENT_BINARIES = frozenset([
+    'chmod', 'chown', 'chgrp', 'umask', 'setfacl', 'kill', 'pkill', 'killall', 'renice', 'ulimit', 'iptables', 'ufw'
+])
+# Arguments of these run code, so equal templates say nothing about equal behaviour
+INTERPRETERS = RiskClassifier.SHELLS | frozenset(['eval', 'exec', 'xargs', 'awk', 'sed', 'find', 'watch'])
+
+URL = re.compile(r'[a-z][a-z0-9+.-]*://\S+')
+SHAPES = (
+    ('<num>', re.compile(r'\d+')),
+    ('<ip>', re.compile(r'\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?')),
+    ('<file>', re.compile(r'[\w-]+(?:\.[\w-]+)*\.[A-Za-z0-9]{1,8}')),
+    ('<word>', re.compile(r'[\w@:+=,.-]+')),
+)
+# Shapes whose exact value can change what a command does to the system
+# (any path may be ../../etc/shadow or ~/.ssh/id_rsa, any URL may serve a different payload)
+UNSAFE_SHAPES = ('<root>', '<syspath>', '<text>', '<subst>', '<path>', '<url>')
+# Only these may appear in a template an AUTO_ACCEPT rule is suggested for
+ACCEPTABLE_SHAPES = frozenset(['<num>', '<file>', '<word>'])
+PLACEHOLDER = re.compile(r'<[a-z]+>')
+
+# Regex fragments for suggested rule patterns; anything else must stay free of shell metacharacters
+SHAPE_PATTERNS = {
+    '<num>': r'\d+',
+    '<file>': r'[\w-]+(?:\.[\w-]+)*\.[A-Za-z0-9]{1,8}',
+    '<word>': r'(?![-.])[\w@:+=,.-]+',
+}
+DEFAULT_SHAPE_PATTERN = r'[^\s|;&<>()$`\'"]+'
+
+Fingerprint = namedtuple('Fingerprint', ['template', 'digest', 'cacheable'])
+
+def argument_shape(word):
+    """Placeholder describing an argument without its value"""
+    if word.startswith(('$(', '<(', '>(', '`')):
+        return '<subst>'
+    if word in RiskClassifier.ROOT_PATHS:
+        return '<root>'
+    if word.startswith(RiskClassifier.SENSITIVE_PATH_PREFIXES):
+        return '<syspath>'
+    if URL.fullmatch(word):
+        return '<url>'
+    if '/' in word or word.startswith('~'):
+        return '<path>'
+    for shape, pattern in SHAPES:
+        if pattern.fullmatch(word):
+            return shape
+    return '<text>'
+
+def segment_template(segment):
+    """
+    Template words for one simple command (program, flags, argument shapes)
+    and the programs it runs, looking through wrappers like sudo and nohup.
+    """
+    words = []
+    programs = []
+    positional = 0
+    program = None
+    for word in segment.argv:
+        if (program is None or program in WRAPPERS) and not word.startswith('-'):
+            if ASSIGNMENT.match(word):
+                name, value = word.split('=', 1)
+                words.append(f'{name}={argument_shape(value)}')
+                continue
+            if program is None or not word.isdigit():
+                program = word.rsplit('/', 1)[-1]
+                programs.append(program)
+                words.append(program)
+                positional = 0
+                continue
+        if word.startswith('-') and len(word) > 1:
+            flag, separator, value = word.partition('=')
+            words.append(f'{flag}={argument_shape(value)}' if separator else flag)
+            continue
+        if positional == 0 and program in SUBCOMMAND_BINARIES and re.fullmatch(r'[a-z][a-z0-9-]*', word):
+            words.append(word)
+        elif program in LITERAL_ARGUMENT_BINARIES and argument_shape(word) in ('<num>', '<word>'):
+            words.append(word)
+        else:
+            words.append(argument_shape(word))
+        positional += 1
+    for operator, target in segment.redirects:
+        words.append(f'{operator}{argument_shape(target)}')
+    return words, programs
+
+@lru_cache(maxsize=Config.SHELL_PARSE_CACHE_SIZE)
+def fingerprint_command(command_text):
+    """
+    Template (program, flags, argument shapes) and stable digest of a command.
+    `cat a.txt` and `cat b.txt` share the template `cat <file>`. `cacheable` is
+    False when the template hides something that matters for a verdict:
+    substitutions, free text, paths, URLs or an interpreter's arguments.
+    """
+    parsed = parse_command(command_text)
+    parts = []
+    cacheable = parsed.complete
+    for pipeline in parsed.pipelines:
+        if pipeline.operator:
+            parts.append(pipeline.operator)
+        segments = []
+        for segment in pipeline.segments:
+            words, programs = segment_template(segment)
+            if INTERPRETERS.intersection(programs):
+                cacheable = False
+            segments.append(' '.join(words))
+        parts.append(' | '.join(segments))
+    for nested in parsed.substitutions:
+        parts.append(f'$({fingerprint_command(nested.text).template})')
+        cacheable = False
+    
+    template = ' '.join(parts)
+    if any(shape in template for shape in UNSAFE_SHAPES):
+        cacheable = False
+    digest = hashlib.sha1(template.encode('utf-8')).hexdigest()[:16]
+    return Fingerprint(template, digest, cacheable)
+
+def suggested_pattern(command_text):
+    """
+    Anchored regex matching commands with the same template as a
+    single-segment command, or None for compound commands.
+    """
+    parsed = parse_command(command_text)
+    segments = parsed.segments
+    if len(segments) != 1 or parsed.substitutions or segments[0].redirects or not parsed.complete:
+        return None
+    segment = segments[0]
+    words, _ = segment_template(segment)
+    if not segment.argv or ASSIGNMENT.match(segment.argv[0]):
+        return None
+    
+    pattern = ['^', re.escape(segment.argv[0])]
+    for word in words[1:]:
+        if word.startswith('<'):
+            fragment = SHAPE_PATTERNS.get(word, DEFAULT_SHAPE_PATTERN)
+        elif '=<' in word:
+            flag, shape = word.split('=', 1)
+            fragment = re.escape(flag) + '=' + SHAPE_PATTERNS.get(shape, DEFAULT_SHAPE_PATTERN)
+        else:
+            fragment = re.escape(word)
+        pattern.append(r'\s+' + fragment)
+    pattern.append(r'\s*$')
+    return ''.join(pattern)
+
+def acceptable_template(fingerprint):
+    """True when an accept rule for this template cannot reach paths or inline code"""
+    return fingerprint.cacheable and ACCEPTABLE_SHAPES.issuperset(PLACEHOLDER.findall(fingerprint.template))
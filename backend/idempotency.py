@@ -0,0 +1,182 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from metrics import registry as metrics
+from models import Database
+
+class IdempotencyConflict(Exception):
+    """Key reused for a different request (422) or still running elsewhere (409)"""
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+def fingerprint(body):
+    return hashlib.sha256(body).hexdigest()
+
+class IdempotencyStore:
+    """
+    Remembers the response to each (user_id, Idempotency-Key) so retries are
+    answered without re-running the request. Finished responses live in the
+    idempotency_keys table with a bounded LRU in front of it. A row with no
+    response marks a request in flight: duplicates in this process wait on an
+    event, duplicates in other processes poll the row.
+    """
+    POLL_SECONDS = 0.05
+    
+    def __init__(self, cache_size=None, ttl_seconds=None, wait_seconds=None, clock=time.time):
+        self.cache_size = cache_size or Config.IDEMPOTENCY_CACHE_SIZE
+        self.ttl_seconds = ttl_seconds or Config.IDEMPOTENCY_TTL_SECONDS
+        self.wait_seconds = wait_seconds or Config.IDEMPOTENCY_WAIT_SECONDS
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._last_purge = 0.0
+    
+    def begin(self, user_id, key, request_fingerprint):
+        """
+        Returns a stored {'status_code', 'body'} to replay, or None when the
+        caller now owns the key and must call complete() or abandon().
+        """
+        cache_key = (Database().db_path, user_id, key)
+        deadline = self._clock() + self.wait_seconds
+        while True:
+            with self._lock:
+                stored = self._cached(cache_key)
+                owner = self._in_flight.get(cache_key) if stored is None else None
+            if stored:
+                return self._replay(stored, request_fingerprint)
+            if owner:
+                metrics.counter('idempotency.waited').inc()
+                if not owner['event'].wait(max(0.0, deadline - self._clock())):
+                    raise IdempotencyConflict('A request with this Idempotency-Key is still in progress', 409)
+                continue
+            
+            claimed, stored = self._claim(user_id, key, request_fingerprint)
+            if claimed:
+                with self._lock:
+                    self._in_flight[cache_key] = {
+                        'event': threading.Event(),
+                        'fingerprint': request_fingerprint,
+                        'created_at': self._clock()
+                    }
+                return None
+            if stored:
+                with self._lock:
+                    self._remember(cache_key, stored)
+                return self._replay(stored, request_fingerprint)
+            
+            # Claimed by another process and not finished yet
+            if self._clock() >= deadline:
+                raise IdempotencyConflict('A request with this Idempotency-Key is still in progress', 409)
+            time.sleep(self.POLL_SECONDS)
+    
+    def complete(self, user_id, key, status_code, body):
+        database = Database()
+        conn = database.get_connection()
+        conn.execute(
+            'UPDATE idempotency_keys SET status_code = ?, response = ? WHERE user_id = ? AND idempotency_key = ?',
+            (status_code, json.dumps(body), user_id, key)
+        )
+        conn.commit()
+        conn.close()
+        self._finish((database.db_path, user_id, key), {'status_code': status_code, 'body': body})
+    
+    def abandon(self, user_id, key):
+        """Forget a claimed key (the request failed) so a retry runs it again"""
+        database = Database()
+        conn = database.get_connection()
+        conn.execute('DELETE FROM idempotency_keys WHERE user_id = ? AND idempotency_key = ?', (user_id, key))
+        conn.commit()
+        conn.close()
+        self._finish((database.db_path, user_id, key), None)
+    
+    def _finish(self, cache_key, stored):
+        with self._lock:
+            owner = self._in_flight.pop(cache_key, None)
+            if owner is None:
+                return
+            if stored:
+                self._remember(cache_key, dict(stored, fingerprint=owner['fingerprint'],
+                                               created_at=owner['created_at']))
+            owner['event'].set()
+    
+    def _cached(self, cache_key):
+        stored = self._cache.get(cache_key)
+        if stored is None:
+            return None
+        if self._clock() - stored['created_at'] > self.ttl_seconds:
+            del self._cache[cache_key]
+            return None
+        self._cache.move_to_end(cache_key)
+        return stored
+    
+    def _remember(self, cache_key, stored):
+        self._cache[cache_key] = stored
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    def _replay(self, stored, request_fingerprint):
+        if stored['fingerprint'] != request_fingerprint:
+            raise IdempotencyConflict('Idempotency-Key was already used for a different request', 422)
+        metrics.counter('idempotency.replayed').inc()
+        return {'status_code': stored['status_code'], 'body': stored['body']}
+    
+    def _claim(self, user_id, key, request_fingerprint):
+        """Insert the in-flight marker row; returns (claimed, finished_response_or_None)"""
+        now = self._clock()
+        conn = Database().get_connection()
+        try:
+            self._purge_expired(conn, now)
+            try:
+                conn.execute(
+                    'INSERT INTO idempotency_keys (user_id, idempotency_key, fingerprint, created_at) VALUES (?, ?, ?, ?)',
+                    (user_id, key, request_fingerprint, now)
+                )
+                conn.commit()
+                return True, None
+            except sqlite3.IntegrityError:
+                conn.rollback()
+            
+            row = conn.execute(
+                'SELECT * FROM idempotency_keys WHERE user_id = ? AND idempotency_key = ?', (user_id, key)
+            ).fetchone()
+            if row is None:
+                return False, None
+            age = now - row['created_at']
+            if row['response'] is not None and age <= self.ttl_seconds:
+                return False, {
+                    'status_code': row['status_code'],
+                    'body': json.loads(row['response']),
+                    'fingerprint': row['fingerprint'],
+                    'created_at': row['created_at']
+                }
+            if row['response'] is None and age <= self.wait_seconds:
+                return False, None
+            
+            # The owner died without completing, or the response outlived the TTL
+            # and the purge has not removed it yet; take the key over
+            cursor = conn.execute(
+                '''UPDATE idempotency_keys SET fingerprint = ?, status_code = NULL, response = NULL, created_at = ?
+                   WHERE user_id = ? AND idempotency_key = ? AND created_at = ?''',
+                (request_fingerprint, now, user_id, key, row['created_at'])
+            )
+            conn.commit()
+            return cursor.rowcount == 1, None
+        finally:
+            conn.close()
+    
+    def _purge_expired(self, conn, now):
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        conn.execute('DELETE FROM idempotency_keys WHERE created_at < ? AND response IS NOT NULL',
+                     (now - self.ttl_seconds,))
+        conn.commit()
+
+idempotency = IdempotencyStore()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Maintenance jobs for an existing Command Gateway database.
+
+Usage:
+    python maintenance.py backfill-fingerprints [--chunk-size 500]
+    python maintenance.py rebuild-rollups [--since YYYY-MM-DD]
+    python maintenance.py compact-timeseries
+"""
+
+import argparse
+import time
+from config import Config
+from models import Database
+from fingerprint import fingerprint_command
+from rollups import rebuild_rollups, prune_minute_series
+
+def backfill_fingerprints(chunk_size=None, on_progress=None):
+    """
+    Fill command_template/fingerprint on rows stored before fingerprinting.
+    Walks the table in id order one chunk per transaction, so it can run
+    against a live database and simply be started again if interrupted.
+    Returns the number of rows updated.
+    """
+    chunk_size = chunk_size or Config.FINGERPRINT_BACKFILL_CHUNK_SIZE
+    database = Database()
+    last_id = 0
+    updated = 0
+    while True:
+        conn = database.get_connection()
+        try:
+            rows = conn.execute(
+                'SELECT id, command_text FROM commands WHERE id > ? AND fingerprint IS NULL ORDER BY id LIMIT ?',
+                (last_id, chunk_size)
+            ).fetchall()
+            values = []
+            for row in rows:
+                fingerprint = fingerprint_command(row['command_text'])
+                values.append((fingerprint.template, fingerprint.digest, row['id']))
+            conn.executemany(
+                'UPDATE commands SET command_template = ?, fingerprint = ? WHERE id = ? AND fingerprint IS NULL',
+                values
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        
+        if not rows:
+            return updated
+        last_id = rows[-1]['id']
+        updated += len(rows)
+        if on_progress:
+            on_progress(updated, last_id)
+
+def rebuild_analytics_rollups(since=None):
+    """
+    Recompute the analytics rollups from the commands table (all days,
+    or days on or after `since`). Writers are held off for the one
+    transaction, so the triggers carry on from consistent totals. Also the
+    backfill after rows were written with the triggers missing. Returns the
+    number of commands rolled up.
+    """
+    conn = Database().get_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        total = rebuild_rollups(conn.cursor(), since)
+        conn.commit()
+        return total
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def compact_timeseries(now=None):
+    """Drop minute buckets past their retention; returns the number of rows removed"""
+    conn = Database().get_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        removed = prune_minute_series(conn.cursor(), now)
+        conn.commit()
+        return removed
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def run_timeseries_compaction(interval_seconds=None):
+    """Background loop for compact_timeseries (started by the app)"""
+    interval_seconds = interval_seconds or Config.TIMESERIES_COMPACTION_INTERVAL_SECONDS
+    while True:
+        try:
+            compact_timeseries()
+        except Exception as e:
+            print(f"Timeseries compaction error: {e}")
+        time.sleep(interval_seconds)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Command Gateway maintenance jobs')
+    subcommands = parser.add_subparsers(dest='job', required=True)
+    backfill = subcommands.add_parser('backfill-fingerprints', help='Fingerprint commands stored before fingerprinting')
+    backfill.add_argument('--chunk-size', type=int, default=Config.FINGERPRINT_BACKFILL_CHUNK_SIZE)
+    rebuild = subcommands.add_parser('rebuild-rollups', help='Recompute the analytics rollups')
+    rebuild.add_argument('--since', help='Only rebuild days on or after this UTC date (YYYY-MM-DD)')
+    subcommands.add_parser('compact-timeseries', help='Drop minute buckets older than their retention')
+    args = parser.parse_args()
+    
+    if args.job == 'backfill-fingerprints':
+        total = backfill_fingerprints(
+            args.chunk_size,
+            on_progress=lambda updated, last_id: print(f"  {updated} rows fingerprinted (up to id {last_id})")
+        )
+        print(f"✓ Backfilled {total} commands")
+    elif args.job == 'rebuild-rollups':
+        total = rebuild_analytics_rollups(args.since)
+        print(f"✓ Rolled up {total} commands")
+    elif args.job == 'compact-timeseries':
+        print(f"✓ Removed {compact_timeseries()} minute buckets")
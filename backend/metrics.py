@@ -0,0 +1,141 @@
+import threading
+import time
+
+# Default latency buckets in milliseconds
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+class Counter:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+    
+    @property
+    def value(self):
+        return self._value
+
+class Histogram:
+    """Fixed-bucket latency histogram with approximate percentiles"""
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+    
+    def time(self):
+        """Context manager observing the elapsed wall time in milliseconds"""
+        return _Timer(self)
+    
+    def percentile(self, fraction):
+        """Upper bound of the bucket containing the given fraction of observations"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            maximum = self._max
+        if not total:
+            return 0.0
+        target = fraction * total
+        running = 0
+        for i, count in enumerate(counts):
+            running += count
+            if running >= target:
+                return float(self.buckets[i]) if i < len(self.buckets) else maximum
+        return maximum
+    
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            total_sum = self._sum
+            maximum = self._max
+        buckets = {str(bound): count for bound, count in zip(self.buckets, counts)}
+        buckets['+Inf'] = counts[-1]
+        return {
+            'count': total,
+            'sum': round(total_sum, 3),
+            'avg': round(total_sum / total, 3) if total else 0.0,
+            'max': round(maximum, 3),
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'buckets': buckets
+        }
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.elapsed_ms = 0.0
+    
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed_ms = (time.perf_counter() - self._start) * 1000
+        self.histogram.observe(self.elapsed_ms)
+        return False
+
+class MetricsRegistry:
+    """Process-wide registry of named counters, histograms and gauges"""
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+    
+    def counter(self, name):
+        with self._lock:
+            if name not in self._counters:
+                self._counters[name] = Counter()
+            return self._counters[name]
+    
+    def histogram(self, name, buckets=DEFAULT_BUCKETS_MS):
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(buckets)
+            return self._histograms[name]
+    
+    def gauge(self, name, callback):
+        """Register a callable evaluated whenever a snapshot is taken"""
+        with self._lock:
+            self._gauges[name] = callback
+    
+    def snapshot(self, prefix=''):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+            gauges = dict(self._gauges)
+        
+        gauge_values = {}
+        for name, callback in gauges.items():
+            if not name.startswith(prefix):
+                continue
+            try:
+                gauge_values[name] = callback()
+            except Exception as e:
+                gauge_values[name] = f'error: {e}'
+        
+        return {
+            'counters': {name: c.value for name, c in counters.items() if name.startswith(prefix)},
+            'histograms': {name: h.snapshot() for name, h in histograms.items() if name.startswith(prefix)},
+            'gauges': gauge_values
+        }
+
+registry = MetricsRegistry()
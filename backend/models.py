@@ -1,24 +1,63 @@
+import os
 import sqlite3
 import secrets
 import re
 import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 from datetime import datetime
 from config import Config
-try:
-    import ollama
-    OLLAMA_AVAILABLE = True
-except ImportError:
-    OLLAMA_AVAILABLE = False
-    print("Warning: Ollama not available. AI analysis will be skipped.")
+from ai_backends import create_backend
+from circuit_breaker import CircuitBreaker
+from metrics import registry as metrics
+from executor import executor, CommandExecutor
+from scheduler import priority_class, APPROVED_CLASS, STANDARD_CLASS
+from shell_parser import parse_command
+from search import create_search_indexes, fts_query, HIGHLIGHT_START, HIGHLIGHT_END
+from regex_literals import required_literals
+from rollups import create_rollups, RESOLUTIONS, DIMENSIONS, bucket_expression, bucket_bound
+
+# Every value the commands.status CHECK constraint accepts
+COMMAND_STATUSES = ('ACCEPTED', 'REJECTED', 'EXECUTED', 'PENDING', 'PENDING_APPROVAL',
+                    'QUEUED', 'RUNNING', 'FAILED', 'TIMED_OUT', 'EXPIRED')
+# Statuses of a command whose credit has been charged: EXECUTED or QUEUED when
+# accepted, then RUNNING and a final outcome once the executor picks it up
+CHARGED_STATUSES = ('EXECUTED', 'QUEUED', 'RUNNING', 'FAILED', 'TIMED_OUT')
+# Columns added after the table shipped; older tables get them via ALTER TABLE
+COMMAND_ADDED_COLUMNS = (('command_template', 'TEXT'), ('fingerprint', 'TEXT'))
+
+@lru_cache(maxsize=Config.REGEXP_CACHE_SIZE)
+def compiled_regex(pattern):
+    return re.compile(pattern)
+
+def regexp(pattern, value):
+    """SQLite REGEXP: `value REGEXP pattern` calls regexp(pattern, value)"""
+    return value is not None and compiled_regex(pattern).search(value) is not None
 
 class Database:
-    def __init__(self, db_path=Config.DATABASE_PATH):
-        self.db_path = db_path
-        self.init_db()
+    # Paths whose schema and migrations this process has already applied
+    _initialized_paths = set()
+    _init_lock = threading.Lock()
+    
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Config.DATABASE_PATH
+        # Hot paths build a Database() per call; the DDL only runs again once the file is gone
+        if not self.initialized():
+            with Database._init_lock:
+                if not self.initialized():
+                    self.init_db()
+                    Database._initialized_paths.add(self.db_path)
+    
+    def initialized(self):
+        return self.db_path in Database._initialized_paths and os.path.exists(self.db_path)
     
     def get_connection(self):
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
+        conn.create_function('REGEXP', 2, regexp, deterministic=True)
         return conn
     
     def init_db(self):
@@ -51,23 +90,38 @@ class Database:
         ''')
         
         # Commands table
+        cursor.execute(self.commands_table_sql('commands'))
+        self.migrate_commands_table(cursor)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_fingerprint ON commands (fingerprint)')
+        # Keyset pagination of a user's history; the rowid (id) is implicitly the last index column
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_user_created ON commands (user_id, created_at)')
+        
+        # Change log behind the pending-approvals delta API. Triggers record every
+        # command entering, changing in or leaving the queue, whatever code path
+        # wrote it; they are (re)created here because a table rebuild drops them.
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS commands (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                command_text TEXT NOT NULL,
-                status TEXT NOT NULL CHECK (status IN ('ACCEPTED', 'REJECTED', 'EXECUTED', 'PENDING', 'PENDING_APPROVAL')),
-                matched_rule_id INTEGER,
-                credits_deducted INTEGER DEFAULT 0,
-                ai_analysis TEXT,
-                ai_risk_score INTEGER DEFAULT 0,
-                approval_count INTEGER DEFAULT 0,
-                required_approvals INTEGER DEFAULT 2,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (matched_rule_id) REFERENCES rules (id)
+            CREATE TABLE IF NOT EXISTS pending_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                command_id INTEGER NOT NULL
             )
         ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_pending_changes_insert AFTER INSERT ON commands
+            WHEN NEW.status = 'PENDING_APPROVAL'
+            BEGIN
+                INSERT INTO pending_changes (command_id) VALUES (NEW.id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_pending_changes_update AFTER UPDATE OF status, approval_count ON commands
+            WHEN OLD.status = 'PENDING_APPROVAL' OR NEW.status = 'PENDING_APPROVAL'
+            BEGIN
+                INSERT INTO pending_changes (command_id) VALUES (NEW.id);
+            END
+        ''')
+        
+        # Daily per-status, per-user and per-fingerprint totals behind /api/analytics (see rollups.py)
+        create_rollups(cursor)
         
         # Audit logs table
         cursor.execute('''
@@ -80,6 +134,62 @@ class Database:
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
         ''')
+        # Export time ranges and keyset pagination on (timestamp, id)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs (timestamp)')
+        
+        # Full-text search over command text, AI analysis and audit details (see search.py)
+        create_search_indexes(cursor)
+        
+        # Responses remembered per Idempotency-Key (response is NULL while in flight)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                user_id INTEGER NOT NULL,
+                idempotency_key TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                status_code INTEGER,
+                response TEXT,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (user_id, idempotency_key),
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        
+        # Execution output, kept out of the commands table (see output_store.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS command_outputs (
+                command_id INTEGER PRIMARY KEY,
+                stdout_bytes INTEGER NOT NULL DEFAULT 0,
+                stderr_bytes INTEGER NOT NULL DEFAULT 0,
+                total_bytes INTEGER NOT NULL DEFAULT 0,
+                truncated INTEGER NOT NULL DEFAULT 0,
+                complete INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                FOREIGN KEY (command_id) REFERENCES commands (id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS command_output_chunks (
+                command_id INTEGER NOT NULL,
+                stream TEXT NOT NULL CHECK (stream IN ('stdout', 'stderr')),
+                byte_offset INTEGER NOT NULL,
+                raw_size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (command_id, stream, byte_offset),
+                FOREIGN KEY (command_id) REFERENCES commands (id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_command_outputs_updated_at ON command_outputs (updated_at)')
+        
+        # MinHash signatures of model-analyzed commands (see similarity.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS similarity_signatures (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                command_text TEXT NOT NULL UNIQUE,
+                signature BLOB NOT NULL,
+                verdict TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
         
         # Command approvals table
         cursor.execute('''
@@ -94,9 +204,69 @@ class Database:
                 FOREIGN KEY (admin_id) REFERENCES users (id)
             )
         ''')
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_command_approvals_admin'")
+        if not cursor.fetchone():
+            # Databases from before the constraint may hold repeat votes; keep each admin's first
+            cursor.execute('''
+                DELETE FROM command_approvals WHERE id NOT IN (
+                    SELECT MIN(id) FROM command_approvals GROUP BY command_id, admin_id
+                )
+            ''')
+            cursor.execute('CREATE UNIQUE INDEX idx_command_approvals_admin ON command_approvals (command_id, admin_id)')
         
         conn.commit()
         conn.close()
+    
+    @staticmethod
+    def commands_table_sql(table_name):
+        statuses = ', '.join(f"'{status}'" for status in COMMAND_STATUSES)
+        return f'''
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                command_text TEXT NOT NULL,
+                status TEXT NOT NULL CHECK (status IN ({statuses})),
+                matched_rule_id INTEGER,
+                credits_deducted INTEGER DEFAULT 0,
+                ai_analysis TEXT,
+                ai_risk_score INTEGER DEFAULT 0,
+                approval_count INTEGER DEFAULT 0,
+                required_approvals INTEGER DEFAULT 2,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                exit_code INTEGER,
+                finished_at TIMESTAMP,
+                command_template TEXT,
+                fingerprint TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id),
+                FOREIGN KEY (matched_rule_id) REFERENCES rules (id)
+            )
+        '''
+    
+    def migrate_commands_table(self, cursor):
+        """
+        Bring an existing commands table up to date. SQLite cannot alter a CHECK
+        constraint, so a table missing any of COMMAND_STATUSES is rebuilt
+        (create, copy, drop, rename) - the order SQLite documents for keeping
+        foreign keys in other tables pointing at `commands`. Missing plain
+        columns are simply added.
+        """
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'commands'")
+        table_sql = cursor.fetchone()[0]
+        cursor.execute('PRAGMA table_info(commands)')
+        old_columns = [column['name'] for column in cursor.fetchall()]
+        if all(f"'{status}'" in table_sql for status in COMMAND_STATUSES):
+            for name, column_type in COMMAND_ADDED_COLUMNS:
+                if name not in old_columns:
+                    cursor.execute(f'ALTER TABLE commands ADD COLUMN {name} {column_type}')
+            return
+        
+        cursor.execute('DROP TABLE IF EXISTS commands_migrated')
+        cursor.execute(self.commands_table_sql('commands_migrated'))
+        cursor.execute('PRAGMA table_info(commands_migrated)')
+        columns = ', '.join(column['name'] for column in cursor.fetchall() if column['name'] in old_columns)
+        cursor.execute(f'INSERT INTO commands_migrated ({columns}) SELECT {columns} FROM commands')
+        cursor.execute('DROP TABLE commands')
+        cursor.execute('ALTER TABLE commands_migrated RENAME TO commands')
 
 class User:
     @staticmethod
@@ -160,6 +330,10 @@ class User:
         return True
 
 class Rule:
+    # Compiled patterns per database, keyed on a cheap signature of the rules table
+    _compiled = {}
+    _compiled_lock = threading.Lock()
+    
     @staticmethod
     def create(pattern, action, created_by):
         # Validate regex pattern with detailed error messages
@@ -589,27 +763,428 @@ class Rule:
         return [dict(rule) for rule in rules]
     
     @staticmethod
-    def match_command(command_text):
-        rules = Rule.get_all_ordered()
-        for rule in rules:
-            if re.search(rule['pattern'], command_text):
+    def get_compiled_rules():
+        """
+        Ordered (rule, compiled pattern, literal prefix) triples. Rules are only
+        appended, so the row count and highest id identify a version of the
+        table; the cached list is reused until either changes.
+        """
+        database = Database()
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*), MAX(id) FROM rules')
+        signature = tuple(cursor.fetchone())
+        
+        with Rule._compiled_lock:
+            cached = Rule._compiled.get(database.db_path)
+        if cached and cached[0] == signature:
+            conn.close()
+            return cached[1]
+        
+        cursor.execute('SELECT * FROM rules ORDER BY order_index ASC')
+        compiled = [(dict(rule), re.compile(rule['pattern']), Rule.anchored_prefix(rule['pattern']))
+                    for rule in cursor.fetchall()]
+        conn.close()
+        with Rule._compiled_lock:
+            Rule._compiled[database.db_path] = (signature, compiled)
+        return compiled
+    
+    @staticmethod
+    def anchored_prefix(pattern):
+        """
+        Literal text a ^-anchored pattern requires at the start of the command
+        (e.g. 'ls' for ^ls(\\s|$)), or None. Used to skip the regex for
+        segments whose argv[0] cannot match.
+        """
+        if not pattern.startswith('^'):
+            return None
+        # A top-level alternation means the anchor only covers one branch
+        depth, in_class, escaped = 0, False, False
+        for char in pattern:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif in_class:
+                in_class = char != ']'
+            elif char == '[':
+                in_class = True
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+            elif char == '|' and depth == 0:
+                return None
+        
+        prefix = []
+        for char in pattern[1:]:
+            if char in '.^$*+?{}[]\\()|':
+                if char in '*?{' and prefix:
+                    # The last literal is optional
+                    prefix.pop()
+                break
+            prefix.append(char)
+        return ''.join(prefix) or None
+    
+    @staticmethod
+    def first_match(text, compiled_rules):
+        for rule, regex, prefix in compiled_rules:
+            if prefix is not None and not text.startswith(prefix):
+                continue
+            if regex.search(text):
                 return rule
         return None
+    
+    @staticmethod
+    def match_command(command_text, compiled_rules=None):
+        """
+        First rule matching the command line. Compound commands are then
+        checked pipeline by pipeline and segment by segment (including
+        substitutions): an AUTO_REJECT match on any of them wins, and an
+        AUTO_ACCEPT only stands if every one of them is accepted too, so
+        `ls; rm -rf /` cannot slip through an anchored ^ls accept rule. A
+        partly accepted command returns None and goes to analysis.
+        """
+        if compiled_rules is None:
+            compiled_rules = Rule.get_compiled_rules()
+        rule = Rule.first_match(command_text, compiled_rules)
+        if rule is not None and rule['action'] == 'AUTO_REJECT':
+            return rule
+        all_accepted = True
+        for unit in parse_command(command_text).units[1:]:
+            segment_rule = Rule.first_match(unit, compiled_rules)
+            if segment_rule is not None and segment_rule['action'] == 'AUTO_REJECT':
+                return segment_rule
+            all_accepted = all_accepted and segment_rule is not None
+        return rule if all_accepted else None
+    
+    @staticmethod
+    def suggest(min_count=None, limit=20):
+        """
+        Rule candidates mined from command history: templates seen at least
+        min_count times with no rule matching them, whose outcomes agree
+        (nearly always rejected, or always let through at low risk).
+        Returns: list of {'pattern', 'action', 'template', 'example',
+                  'occurrences', 'agreement'} for an admin to review.
+        """
+        from fingerprint import fingerprint_command, suggested_pattern, acceptable_template
+        min_count = min_count or Config.RULE_SUGGESTION_MIN_COUNT
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT fingerprint, MIN(command_template) AS template, MIN(command_text) AS example,
+                   COUNT(*) AS occurrences,
+                   SUM(CASE WHEN status = 'REJECTED' THEN 1 ELSE 0 END) AS rejected,
+                   SUM(CASE WHEN status IN ('EXECUTED', 'QUEUED', 'RUNNING', 'FAILED', 'TIMED_OUT')
+                       THEN 1 ELSE 0 END) AS accepted,
+                   MAX(ai_risk_score) AS max_risk_score
+            FROM commands
+            WHERE fingerprint IS NOT NULL AND matched_rule_id IS NULL
+            GROUP BY fingerprint
+            HAVING COUNT(*) >= ?
+            ORDER BY occurrences DESC
+        ''', (min_count,))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        compiled_rules = Rule.get_compiled_rules()
+        suggestions = []
+        for row in rows:
+            rejected_share = row['rejected'] / row['occurrences']
+            accepted_share = row['accepted'] / row['occurrences']
+            if rejected_share >= Config.RULE_SUGGESTION_MIN_AGREEMENT:
+                action, agreement = 'AUTO_REJECT', rejected_share
+            elif (accepted_share >= Config.RULE_SUGGESTION_MIN_AGREEMENT
+                  and (row['max_risk_score'] or 0) <= Config.RULE_SUGGESTION_MAX_ACCEPT_RISK
+                  and acceptable_template(fingerprint_command(row['example']))):
+                action, agreement = 'AUTO_ACCEPT', accepted_share
+            else:
+                continue
+            
+            pattern = suggested_pattern(row['example'])
+            if pattern is None or Rule.match_command(row['example'], compiled_rules) is not None:
+                continue
+            suggestions.append({
+                'pattern': pattern,
+                'action': action,
+                'template': row['template'],
+                'example': row['example'],
+                'occurrences': row['occurrences'],
+                'agreement': round(agreement, 3)
+            })
+            if len(suggestions) >= limit:
+                break
+        return suggestions
 
-class AIAnalyzer:
+class RiskClassifier:
+    """Deterministic local risk scorer used as a fast path in front of the LLM"""
+    
+    SEGMENT_BREAKS = frozenset(['|', '||', '&&', ';', '&', '$(', '`', '(', ')'])
+    REDIRECTIONS = frozenset(['>', '>>', '<'])
+    PRIVILEGE_ESCALATION = frozenset(['sudo', 'su', 'doas', 'pkexec'])
+    SHELLS = frozenset(['sh', 'bash', 'zsh', 'dash', 'ksh', 'fish', 'python', 'python3', 'perl', 'ruby', 'node'])
+    # Arguments after which the next word is run as a command
+    EXEC_WRAPPERS = frozenset(['xargs', 'nohup', 'nice', 'time', 'timeout', 'watch', 'env', 'command', 'builtin',
+                               '-exec', '-execdir', '-ok'])
+    # Binaries whose arguments can be code or destructive subcommands; never SAFE on the fast path
+    CODE_BINARIES = SHELLS | frozenset(['awk', 'gawk', 'mawk', 'nawk', 'sed', 'find', 'git', 'tar', 'vi', 'vim',
+                                        'xargs', 'eval', 'exec', 'source'])
+    
+    SAFE_BINARIES = frozenset([
+        'ls', 'pwd', 'echo', 'cat', 'grep', 'egrep', 'fgrep', 'ps', 'whoami', 'date',
+        'head', 'tail', 'wc', 'sort', 'uniq', 'cut', 'tr', 'df', 'du', 'uname', 'hostname',
+        'id', 'uptime', 'which', 'whereis', 'file', 'stat', 'less', 'more', 'tree', 'diff',
+        'printf', 'true', 'false', 'cal', 'free', 'history', 'groups', 'basename', 'dirname',
+        'realpath', 'md5sum', 'sha256sum', 'env', 'printenv', 'top', 'w', 'who', 'last'
+    ])
+    
+    BINARY_WEIGHTS = {
+        'rm': 3, 'rmdir': 1, 'mv': 1, 'cp': 1, 'chmod': 3, 'chown': 3, 'chgrp': 2, 'ln': 1,
+        'dd': 7, 'mkfs': 9, 'fdisk': 8, 'parted': 8, 'wipefs': 9, 'shred': 7, 'format': 8,
+        'shutdown': 8, 'reboot': 8, 'halt': 8, 'poweroff': 8, 'init': 6,
+        'kill': 3, 'killall': 4, 'pkill': 4, 'systemctl': 4, 'service': 3,
+        'mount': 5, 'umount': 4, 'iptables': 6, 'ufw': 5, 'crontab': 4,
+        'useradd': 5, 'userdel': 6, 'usermod': 5, 'passwd': 5, 'visudo': 7,
+        'curl': 2, 'wget': 2, 'nc': 5, 'ncat': 5, 'netcat': 5, 'socat': 5, 'telnet': 4,
+        'ssh': 2, 'scp': 3, 'rsync': 2, 'ftp': 3, 'nmap': 5,
+        'eval': 5, 'exec': 4, 'xargs': 2, 'nohup': 2, 'sh': 4, 'bash': 4, 'zsh': 4,
+        'python': 2, 'python3': 2, 'perl': 2, 'ruby': 2, 'node': 2,
+        'apt': 3, 'apt-get': 3, 'yum': 3, 'dnf': 3, 'pip': 2, 'npm': 2,
+        'git': 1, 'docker': 3, 'tar': 1, 'zip': 1, 'unzip': 1, 'sed': 1, 'awk': 1, 'touch': 0,
+        'mkdir': 0, 'vi': 1, 'vim': 1, 'nano': 1, 'find': 0, 'command': 0, 'builtin': 0
+    }
+    
+    FLAG_WEIGHTS = {
+        '-rf': 3, '-fr': 3, '-Rf': 3, '-fR': 3, '--no-preserve-root': 6,
+        '-r': 1, '-R': 1, '--recursive': 1, '-f': 1, '--force': 1, '-9': 2,
+        '777': 3, '-777': 3, 'a+rwx': 3, '+s': 4, 'u+s': 4
+    }
+    
+    SENSITIVE_PATH_PREFIXES = ('/etc', '/boot', '/dev/sd', '/dev/nvme', '/dev/hd', '/bin', '/sbin',
+                               '/usr', '/lib', '/var/lib', '/root', '~/.ssh', '/sys', '/proc')
+    ROOT_PATHS = frozenset(['/', '/*', '~', '~/', '*', '.', '..'])
+    
     @staticmethod
-    def analyze_command(command_text):
-        """Analyze command using Ollama Qwen model for security risks"""
-        if not OLLAMA_AVAILABLE:
-            return {
-                'is_dangerous': False,
-                'risk_score': 0,
-                'analysis': 'AI analysis unavailable - Ollama not installed',
-                'confidence': 0
-            }
+    def tokenize(command_text):
+        """Shell-aware tokens (quotes stripped, operators kept) from the cached parse"""
+        return list(parse_command(command_text).tokens)
+    
+    @staticmethod
+    def classify(command_text):
+        """
+        Score a command from the weighted tables without calling the model
+        Returns: {'verdict': 'SAFE'|'DANGEROUS'|'UNCERTAIN', 'risk_score': int,
+                  'confidence': int, 'reasons': list}
+        """
+        binary_weights = RiskClassifier.BINARY_WEIGHTS
+        flag_weights = RiskClassifier.FLAG_WEIGHTS
+        safe_binaries = RiskClassifier.SAFE_BINARIES
+        segment_breaks = RiskClassifier.SEGMENT_BREAKS
+        
+        score = 0
+        reasons = []
+        unknown_binaries = False
+        runs_code = False
+        binary = None
+        expect_binary = True
+        previous = None
+        
+        for token in RiskClassifier.tokenize(command_text):
+            if token in segment_breaks:
+                if token == '$(' or token == '`':
+                    score += 1
+                    reasons.append('command substitution')
+                elif token == '&':
+                    score += 1
+                expect_binary = True
+                binary = None
+                previous = token
+                continue
+            
+            if token in RiskClassifier.REDIRECTIONS:
+                previous = token
+                continue
+            
+            if previous in RiskClassifier.REDIRECTIONS and previous != '<':
+                # Output redirection target
+                if token.startswith(RiskClassifier.SENSITIVE_PATH_PREFIXES):
+                    score += 4
+                    reasons.append(f'redirection into {token}')
+                else:
+                    score += 1
+                previous = token
+                continue
+            
+            if expect_binary:
+                if ('=' in token and not token.startswith('=')) or token.startswith('-'):
+                    # Leading VAR=value assignment or wrapper option (sudo -u, xargs -0)
+                    previous = token
+                    continue
+                name = token.rsplit('/', 1)[-1]
+                if name in RiskClassifier.PRIVILEGE_ESCALATION:
+                    score += 3
+                    reasons.append(f'privilege escalation via {name}')
+                    previous = token
+                    continue
+                if previous == '|' and name in RiskClassifier.SHELLS:
+                    score += 6
+                    reasons.append(f'pipe to {name}')
+                binary = name.split('.', 1)[0] if name.startswith('mkfs') else name
+                if binary in safe_binaries:
+                    pass
+                elif binary in binary_weights:
+                    weight = binary_weights[binary]
+                    if weight:
+                        score += weight
+                        reasons.append(f'{binary} (+{weight})')
+                else:
+                    unknown_binaries = True
+                if binary in RiskClassifier.CODE_BINARIES:
+                    runs_code = True
+                expect_binary = binary in RiskClassifier.EXEC_WRAPPERS
+                previous = token
+                continue
+            
+            # Arguments of the current segment; only flags like find -exec wrap a command here
+            if (token.startswith('-') and token in RiskClassifier.EXEC_WRAPPERS) or token == '-delete':
+                score += 2
+                reasons.append(f'{binary} {token} (+2)')
+                expect_binary = token != '-delete'
+                previous = token
+                continue
+            weight = flag_weights.get(token)
+            if weight and binary not in safe_binaries:
+                score += weight
+                reasons.append(f'{binary} {token} (+{weight})')
+            elif binary not in safe_binaries or binary in ('cat', 'less', 'more', 'head', 'tail'):
+                if token in RiskClassifier.ROOT_PATHS and binary in ('rm', 'chmod', 'chown', 'shred'):
+                    score += 5
+                    reasons.append(f'{binary} targets {token}')
+                elif token.startswith(RiskClassifier.SENSITIVE_PATH_PREFIXES) or 'of=/dev/' in token:
+                    score += 2
+                    reasons.append(f'sensitive path {token}')
+            previous = token
+        
+        score = min(10, score)
+        
+        if score >= Config.FAST_PATH_DANGEROUS_MIN_SCORE:
+            verdict = 'DANGEROUS'
+            confidence = min(99, 70 + (score - Config.FAST_PATH_DANGEROUS_MIN_SCORE) * 10)
+        elif score <= Config.FAST_PATH_SAFE_MAX_SCORE and not unknown_binaries and not runs_code:
+            verdict = 'SAFE'
+            confidence = 95 if score == 0 else 85
+        else:
+            verdict = 'UNCERTAIN'
+            confidence = 40 if unknown_binaries or runs_code else 50
         
-        try:
-            prompt = f"""
+        return {
+            'verdict': verdict,
+            'risk_score': score,
+            'confidence': confidence,
+            'reasons': reasons
+        }
+    
+    @staticmethod
+    def agreement_report(db_path=None, limit=None):
+        """
+        Compare local verdicts against model scores stored in commands.ai_risk_score
+        Only rows analyzed by the model (not by this classifier) are considered.
+        """
+        conn = Database(db_path).get_connection() if db_path else Database().get_connection()
+        cursor = conn.cursor()
+        query = '''
+            SELECT command_text, ai_risk_score FROM commands
+            WHERE ai_analysis IS NOT NULL AND ai_analysis NOT LIKE 'Local classifier:%'
+            ORDER BY id DESC
+        '''
+        if limit:
+            query += ' LIMIT %d' % int(limit)
+        cursor.execute(query)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        report = {
+            'compared': 0,
+            'fast_path': 0,
+            'agreed': 0,
+            'unsafe_misses': 0,
+            'false_alarms': 0,
+            'mean_abs_error': 0.0,
+            'confusion': {
+                'SAFE': {'model_safe': 0, 'model_dangerous': 0},
+                'DANGEROUS': {'model_safe': 0, 'model_dangerous': 0},
+                'UNCERTAIN': {'model_safe': 0, 'model_dangerous': 0}
+            }
+        }
+        total_error = 0
+        for row in rows:
+            result = RiskClassifier.classify(row['command_text'])
+            model_score = row['ai_risk_score'] or 0
+            model_dangerous = model_score >= 6
+            report['compared'] += 1
+            total_error += abs(result['risk_score'] - model_score)
+            report['confusion'][result['verdict']]['model_dangerous' if model_dangerous else 'model_safe'] += 1
+            
+            if result['verdict'] == 'UNCERTAIN':
+                continue
+            report['fast_path'] += 1
+            if (result['verdict'] == 'DANGEROUS') == model_dangerous:
+                report['agreed'] += 1
+            elif model_dangerous:
+                report['unsafe_misses'] += 1
+            else:
+                report['false_alarms'] += 1
+        
+        if report['compared']:
+            report['mean_abs_error'] = round(total_error / report['compared'], 2)
+            report['coverage'] = round(report['fast_path'] / report['compared'], 4)
+        else:
+            report['coverage'] = 0.0
+        report['agreement_rate'] = round(report['agreed'] / report['fast_path'], 4) if report['fast_path'] else 0.0
+        return report
+
+class AIAnalyzer:
+    # Model calls run on a bounded pool so a hung request can be abandoned at its deadline
+    _executor = ThreadPoolExecutor(max_workers=Config.AI_MAX_CONCURRENT_CALLS, thread_name_prefix='ai-analyzer')
+    breaker = CircuitBreaker(
+        failure_threshold=Config.AI_BREAKER_FAILURE_THRESHOLD,
+        slow_call_seconds=Config.AI_BREAKER_SLOW_CALL_SECONDS,
+        reset_timeout=Config.AI_BREAKER_RESET_SECONDS
+    )
+    latency = metrics.histogram('ai.model.latency_ms')
+    _backend = None
+    _backend_setting = None
+    _backend_lock = threading.Lock()
+    # Model verdicts by (fingerprint digest, local risk score) -> (stored_at, verdict)
+    _verdicts = OrderedDict()
+    _verdicts_lock = threading.Lock()
+    # Extension points (see similarity.py):
+    #   verdict_providers: fn(command_text) -> reusable verdict or None, asked before the model
+    #   verdict_listeners: fn(command_text, verdict) for every verdict the model gives
+    verdict_providers = []
+    verdict_listeners = []
+    
+    @staticmethod
+    def get_backend():
+        """Backend selected by Config.AI_BACKEND, created on first use"""
+        with AIAnalyzer._backend_lock:
+            if AIAnalyzer._backend is None or AIAnalyzer._backend_setting != Config.AI_BACKEND:
+                AIAnalyzer._backend = create_backend(Config.AI_BACKEND)
+                AIAnalyzer._backend_setting = Config.AI_BACKEND
+                AIAnalyzer.forget_verdicts()
+            return AIAnalyzer._backend
+    
+    @staticmethod
+    def set_backend(backend):
+        """Install a specific backend instance (load tests, experiments)"""
+        with AIAnalyzer._backend_lock:
+            AIAnalyzer._backend = backend
+            AIAnalyzer._backend_setting = Config.AI_BACKEND
+            AIAnalyzer.forget_verdicts()
+    
+    @staticmethod
+    def build_prompt(command_text):
+        return f"""
 Analyze this Linux/Unix command for security risks and potential dangers:
 
 Command: {command_text}
@@ -632,291 +1207,1100 @@ Respond in JSON format:
 Consider dangerous: file deletion, system modification, network attacks, privilege escalation, data exfiltration.
 Consider safe: file listing, reading files, basic system info, simple calculations.
 """
-
-            response = ollama.chat(model='qwen2.5', messages=[
-                {'role': 'user', 'content': prompt}
-            ])
+    
+    @staticmethod
+    def fail_safe(reason):
+        """Verdict used whenever the model cannot give a trustworthy answer"""
+        return {
+            'is_dangerous': True,  # Fail safe - assume dangerous if analysis fails
+            'risk_score': 8,
+            'analysis': f'{reason}. Defaulting to requiring approval for safety.',
+            'requires_approval': True,
+            'confidence': 0
+        }
+    
+    @staticmethod
+    def parse_response(content):
+        """
+        Turn the model's reply into a verdict dict. Raises ValueError for JSON
+        that is not a verdict object (wrong type, or a field of the wrong type).
+        """
+        try:
+            result = json.loads(content)
+        except json.JSONDecodeError:
+            # Fallback parsing if JSON is malformed
+            lowered = content.lower()
+            is_dangerous = any(word in lowered for word in ['dangerous', 'harmful', 'risky', 'approval'])
+            risk_score = 5 if is_dangerous else 2
             
-            # Parse JSON response
+            return {
+                'is_dangerous': is_dangerous,
+                'risk_score': risk_score,
+                'analysis': content,
+                'requires_approval': is_dangerous,
+                'confidence': 70
+            }
+        
+        if not isinstance(result, dict):
+            raise ValueError(f'Model reply is a JSON {type(result).__name__}, not a verdict object')
+        for field, kind in (('is_dangerous', bool), ('requires_approval', bool), ('analysis', str),
+                            ('risk_score', (int, float)), ('confidence', (int, float))):
+            value = result.get(field)
+            # bool is an int, so flags are refused as scores explicitly
+            if value is not None and (not isinstance(value, kind) or (kind is not bool and isinstance(value, bool))):
+                raise ValueError(f'Model reply has a malformed {field}: {value!r}')
+        return {
+            'is_dangerous': result.get('is_dangerous', False),
+            'risk_score': min(10, max(0, result.get('risk_score', 0))),
+            'analysis': result.get('analysis', 'No analysis provided'),
+            'requires_approval': result.get('requires_approval', False),
+            'confidence': min(100, max(0, result.get('confidence', 50)))
+        }
+    
+    @staticmethod
+    def verdict_key(command_text, fingerprint):
+        """
+        Verdict cache key: the template digest plus the local classifier's risk
+        score, so commands sharing a template but scored differently (a mode,
+        a signal, a target) never share a verdict. None when not cacheable.
+        """
+        if not Config.AI_VERDICT_CACHE_ENABLED or fingerprint is None or not fingerprint.cacheable:
+            return None
+        return fingerprint.digest, RiskClassifier.classify(command_text)['risk_score']
+    
+    @staticmethod
+    def cached_verdict(command_text, fingerprint):
+        """Model verdict remembered for a command with the same template and local risk, or None"""
+        key = AIAnalyzer.verdict_key(command_text, fingerprint)
+        if key is None:
+            return None
+        with AIAnalyzer._verdicts_lock:
+            entry = AIAnalyzer._verdicts.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > Config.AI_VERDICT_CACHE_TTL_SECONDS:
+                del AIAnalyzer._verdicts[key]
+                return None
+            AIAnalyzer._verdicts.move_to_end(key)
+            return dict(entry[1], source='cache')
+    
+    @staticmethod
+    def remember_verdict(command_text, fingerprint, verdict):
+        key = AIAnalyzer.verdict_key(command_text, fingerprint)
+        if key is None:
+            return
+        with AIAnalyzer._verdicts_lock:
+            AIAnalyzer._verdicts[key] = (time.time(), verdict)
+            AIAnalyzer._verdicts.move_to_end(key)
+            while len(AIAnalyzer._verdicts) > Config.AI_VERDICT_CACHE_SIZE:
+                AIAnalyzer._verdicts.popitem(last=False)
+    
+    @staticmethod
+    def forget_verdicts():
+        """Drop cached verdicts (another model may judge differently)"""
+        with AIAnalyzer._verdicts_lock:
+            AIAnalyzer._verdicts.clear()
+    
+    @staticmethod
+    def needs_model(command_text, fingerprint=None):
+        """True when neither the local fast path nor the verdict cache can decide"""
+        if Config.FAST_PATH_ENABLED and RiskClassifier.classify(command_text)['verdict'] != 'UNCERTAIN':
+            return False
+        if AIAnalyzer.reusable_verdict(command_text, fingerprint) is not None:
+            return False
+        return AIAnalyzer.get_backend().is_available()
+    
+    @staticmethod
+    def reusable_verdict(command_text, fingerprint=None):
+        """Earlier model verdict for the same template or, failing that, from a provider"""
+        cached = AIAnalyzer.cached_verdict(command_text, fingerprint)
+        if cached is not None:
+            return cached
+        for provider in AIAnalyzer.verdict_providers:
             try:
-                result = json.loads(response['message']['content'])
-                return {
-                    'is_dangerous': result.get('is_dangerous', False),
-                    'risk_score': min(10, max(0, result.get('risk_score', 0))),
-                    'analysis': result.get('analysis', 'No analysis provided'),
-                    'requires_approval': result.get('requires_approval', False),
-                    'confidence': min(100, max(0, result.get('confidence', 50)))
-                }
-            except json.JSONDecodeError:
-                # Fallback parsing if JSON is malformed
-                content = response['message']['content'].lower()
-                is_dangerous = any(word in content for word in ['dangerous', 'harmful', 'risky', 'approval'])
-                risk_score = 5 if is_dangerous else 2
-                
+                verdict = provider(command_text)
+            except Exception as e:
+                print(f"Verdict provider error: {e}")
+                continue
+            if verdict is not None:
+                return verdict
+        return None
+    
+    @staticmethod
+    def _stream(backend, prompt, on_token, cancelled):
+        """Collect a streamed reply, forwarding each piece until the caller gives up"""
+        start = time.perf_counter()
+        parts = []
+        for chunk in backend.stream_chat(prompt):
+            if cancelled.is_set():
+                break
+            if not parts:
+                metrics.histogram('ai.model.ttft_ms').observe((time.perf_counter() - start) * 1000)
+            parts.append(chunk)
+            on_token(chunk)
+        return ''.join(parts)
+    
+    @staticmethod
+    def analyze_command(command_text, on_token=None, fingerprint=None):
+        """
+        Analyze command for security risks using the configured model backend.
+        With on_token, the model reply is streamed and each piece passed to it.
+        A verdict given earlier for the same command template (by fingerprint)
+        or for a near-duplicate command is reused instead of calling the model.
+        """
+        if Config.FAST_PATH_ENABLED:
+            local = RiskClassifier.classify(command_text)
+            metrics.counter(f"ai.fast_path.{local['verdict'].lower()}").inc()
+            if local['verdict'] != 'UNCERTAIN':
+                is_dangerous = local['verdict'] == 'DANGEROUS'
+                details = ', '.join(local['reasons']) or 'only well-known read-only commands'
                 return {
                     'is_dangerous': is_dangerous,
-                    'risk_score': risk_score,
-                    'analysis': response['message']['content'],
+                    'risk_score': local['risk_score'],
+                    'analysis': f"Local classifier: {local['verdict'].lower()} ({details})",
                     'requires_approval': is_dangerous,
-                    'confidence': 70
+                    'confidence': local['confidence'],
+                    'source': 'local'
                 }
-                
+        
+        reused = AIAnalyzer.reusable_verdict(command_text, fingerprint)
+        if reused is not None:
+            metrics.counter(f"ai.reused.{reused['source']}").inc()
+            return reused
+        
+        backend = AIAnalyzer.get_backend()
+        if not backend.is_available():
+            return AIAnalyzer.fail_safe('AI analysis unavailable - backend not installed')
+        
+        if not AIAnalyzer.breaker.allow_request():
+            metrics.counter('ai.model.short_circuited').inc()
+            return AIAnalyzer.fail_safe('AI analysis skipped - model circuit breaker is open')
+        
+        metrics.counter('ai.model.calls').inc()
+        start = time.perf_counter()
+        prompt = AIAnalyzer.build_prompt(command_text)
+        cancelled = threading.Event()
+        if on_token:
+            future = AIAnalyzer._executor.submit(AIAnalyzer._stream, backend, prompt, on_token, cancelled)
+        else:
+            future = AIAnalyzer._executor.submit(backend.chat, prompt)
+        try:
+            content = future.result(timeout=Config.AI_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            future.cancel()
+            cancelled.set()
+            metrics.counter('ai.model.timeouts').inc()
+            AIAnalyzer.breaker.record_failure()
+            print(f"AI Analysis timed out after {Config.AI_TIMEOUT_SECONDS}s")
+            return AIAnalyzer.fail_safe(f'AI analysis timed out after {Config.AI_TIMEOUT_SECONDS}s')
         except Exception as e:
+            metrics.counter('ai.model.errors').inc()
+            AIAnalyzer.breaker.record_failure()
             print(f"AI Analysis error: {e}")
-            return {
-                'is_dangerous': True,  # Fail safe - assume dangerous if analysis fails
-                'risk_score': 8,
-                'analysis': f'AI analysis failed: {str(e)}. Defaulting to requiring approval for safety.',
-                'requires_approval': True,
-                'confidence': 0
-            }
+            return AIAnalyzer.fail_safe(f'AI analysis failed: {str(e)}')
+        
+        elapsed = time.perf_counter() - start
+        AIAnalyzer.latency.observe(elapsed * 1000)
+        try:
+            verdict = AIAnalyzer.parse_response(content)
+        except ValueError as e:
+            metrics.counter('ai.model.errors').inc()
+            AIAnalyzer.breaker.record_failure()
+            print(f"AI Analysis error: {e}")
+            return AIAnalyzer.fail_safe(f'AI analysis failed: {str(e)}')
+        AIAnalyzer.breaker.record_success(elapsed)
+        AIAnalyzer.remember_verdict(command_text, fingerprint, verdict)
+        for listener in AIAnalyzer.verdict_listeners:
+            try:
+                listener(command_text, verdict)
+            except Exception as e:
+                print(f"Verdict listener error: {e}")
+        return verdict
+    
+    @staticmethod
+    def health():
+        """Model health for the admin dashboard"""
+        snapshot = metrics.snapshot('ai.')
+        return {
+            'backend': AIAnalyzer.get_backend().name,
+            'breaker': AIAnalyzer.breaker.snapshot(),
+            'timeout_seconds': Config.AI_TIMEOUT_SECONDS,
+            'latency_ms': AIAnalyzer.latency.snapshot(),
+            'counters': snapshot['counters']
+        }
 
 class Command:
     @staticmethod
-    def submit(user_id, command_text):
-        # Validate command
+    def validate(command_text):
         if len(command_text) > Config.MAX_COMMAND_LENGTH:
             raise ValueError("Command too long")
         
         if not re.match(Config.ALLOWED_COMMAND_CHARS, command_text):
             raise ValueError("Command contains invalid characters")
+    
+    @staticmethod
+    def start_execution(command_id, user_id, command_text, scheduling_class=STANDARD_CLASS):
+        """
+        Run a command whose row is already stored with accepted_status().
+        Mock mode answers inline; otherwise the command is queued and its final
+        status is written back by record_execution_status().
+        """
+        if not CommandExecutor.enabled():
+            return {'status': 'EXECUTED', 'execution_result': CommandExecutor.mock_result(command_text)}
+        executor.submit(command_id, user_id, command_text, scheduling_class)
+        return {'status': 'QUEUED', 'message': 'Command queued for execution'}
+    
+    @staticmethod
+    def record_execution_status(job, status, details):
+        """Executor status listener: persist RUNNING and the final outcome"""
+        conn = Database().get_connection()
+        if status == 'RUNNING':
+            conn.execute('UPDATE commands SET status = ? WHERE id = ?', (status, job.command_id))
+        else:
+            conn.execute('UPDATE commands SET status = ?, exit_code = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?',
+                         (status, details.get('exit_code'), job.command_id))
+        conn.commit()
+        conn.close()
         
-        # Check user credits
+        if status != 'RUNNING':
+            summary = f"exit code {details.get('exit_code')}"
+            if details.get('error'):
+                summary += f", {details['error']}"
+            AuditLog.log(job.user_id, f'COMMAND_{status}', f'Command {job.command_id} finished ({summary}): {job.command_text}')
+    
+    @staticmethod
+    def recover_executions():
+        """
+        Reconcile stored commands with the execution queue, which lives in
+        memory and is empty after a restart: QUEUED commands (already charged)
+        are submitted again and RUNNING ones, whose process died with the old
+        server, are marked FAILED. Call once at startup, before any job runs.
+        """
+        if not CommandExecutor.enabled():
+            return {'requeued': 0, 'failed': 0}
         conn = Database().get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT credits FROM users WHERE id = ?', (user_id,))
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT id, user_id, command_text FROM commands WHERE status = ?', ('RUNNING',))
+            stale = cursor.fetchall()
+            cursor.execute('UPDATE commands SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE status = ?',
+                           ('FAILED', 'RUNNING'))
+            for command in stale:
+                AuditLog.log(command['user_id'], 'COMMAND_FAILED',
+                             f'Command {command["id"]} finished (exit code None, interrupted by restart): {command["command_text"]}',
+                             cursor=cursor)
+            cursor.execute('''
+                SELECT c.id, c.user_id, c.command_text, c.ai_risk_score, c.approval_count, u.role
+                FROM commands c JOIN users u ON u.id = c.user_id
+                WHERE c.status = ?
+                ORDER BY c.id
+            ''', ('QUEUED',))
+            queued = cursor.fetchall()
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+        
+        for command in queued:
+            scheduling_class = (APPROVED_CLASS if command['approval_count']
+                                else priority_class(command['role'], command['ai_risk_score']))
+            executor.submit(command['id'], command['user_id'], command['command_text'], scheduling_class)
+        return {'requeued': len(queued), 'failed': len(stale)}
+    
+    @staticmethod
+    def submit(user_id, command_text, stream_analysis=False):
+        """
+        Validate, rule-check, analyze and execute a command through the staged
+        pipeline (see pipeline.py and Config.COMMAND_PIPELINE_STAGES).
+        With stream_analysis, commands that need the model are stored as PENDING
+        and returned immediately; complete_analysis() finishes them.
+        """
+        from pipeline import run_submission
+        return run_submission(user_id, command_text, stream_analysis).result
+    
+    @staticmethod
+    def complete_analysis(command_id, on_token=None):
+        """Run the (streamed) model analysis for a PENDING command and apply the verdict"""
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM commands WHERE id = ? AND status = ?', (command_id, 'PENDING'))
+        command = cursor.fetchone()
+        conn.close()
+        if not command:
+            return {'error': 'Command not found or not pending analysis'}
+        
+        from fingerprint import fingerprint_command
+        user_id = command['user_id']
+        command_text = command['command_text']
+        ai_analysis = AIAnalyzer.analyze_command(command_text, on_token=on_token,
+                                                 fingerprint=fingerprint_command(command_text))
+        
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        try:
+            # IMMEDIATE: the balance is charged and the command moved on under one write lock
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT role FROM users WHERE id = ?', (user_id,))
+            role = cursor.fetchone()['role']
+            
+            if ai_analysis['requires_approval'] and ai_analysis['risk_score'] >= 6:
+                status = 'PENDING_APPROVAL'
+                cursor.execute(
+                    '''UPDATE commands SET status = ?, ai_analysis = ?, ai_risk_score = ?, required_approvals = ?
+                       WHERE id = ? AND status = ?''',
+                    (status, ai_analysis['analysis'], ai_analysis['risk_score'], 2, command_id, 'PENDING')
+                )
+            else:
+                cursor.execute('UPDATE users SET credits = credits - 1 WHERE id = ? AND credits > 0', (user_id,))
+                if cursor.rowcount:
+                    status = CommandExecutor.accepted_status()
+                    cursor.execute(
+                        '''UPDATE commands SET status = ?, credits_deducted = ?, ai_analysis = ?, ai_risk_score = ?
+                           WHERE id = ? AND status = ?''',
+                        (status, 1, ai_analysis['analysis'], ai_analysis['risk_score'], command_id, 'PENDING')
+                    )
+                else:
+                    # Credits ran out while the analysis was streaming
+                    status = 'REJECTED'
+                    cursor.execute(
+                        'UPDATE commands SET status = ?, ai_analysis = ?, ai_risk_score = ? WHERE id = ? AND status = ?',
+                        (status, ai_analysis['analysis'], ai_analysis['risk_score'], command_id, 'PENDING')
+                    )
+            if not cursor.rowcount:
+                # Settled elsewhere while the model was answering; undo any charge
+                conn.rollback()
+                return {'error': 'Command not found or not pending analysis'}
+            cursor.execute('SELECT credits FROM users WHERE id = ?', (user_id,))
+            credits_remaining = cursor.fetchone()['credits']
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        if status == 'PENDING_APPROVAL':
+            AuditLog.log(user_id, 'COMMAND_PENDING_APPROVAL',
+                       f'Command requires approval (AI risk score: {ai_analysis["risk_score"]}): {command_text}')
+            return {
+                'id': command_id,
+                'status': 'PENDING_APPROVAL',
+                'ai_analysis': ai_analysis,
+                'message': 'Command flagged by AI security analysis. Awaiting admin approval.',
+                'credits_remaining': credits_remaining
+            }
+        
+        if status == 'REJECTED':
+            AuditLog.log(user_id, 'COMMAND_REJECTED', f'Command rejected (insufficient credits): {command_text}')
+            return {
+                'id': command_id,
+                'status': 'REJECTED',
+                'ai_analysis': ai_analysis,
+                'message': 'Insufficient credits',
+                'credits_remaining': credits_remaining
+            }
+        
+        execution = Command.start_execution(command_id, user_id, command_text,
+                                            priority_class(role, ai_analysis['risk_score']))
+        AuditLog.log(user_id, f"COMMAND_{execution['status']}",
+                   f'Command {execution["status"].lower()} (AI approved, risk score: {ai_analysis["risk_score"]}): {command_text}')
+        
+        return dict(execution, id=command_id, ai_analysis=ai_analysis, credits_remaining=credits_remaining)
+    
+    @staticmethod
+    def submit_batch(user_id, command_texts):
+        """
+        Submit many commands with one credit check, one rules scan, concurrent
+        analysis and a single write transaction.
+        Returns a generator yielding one result per command (with its input
+        `index`) as soon as it is decided, then a summary. Per-command results
+        are provisional until the summary reports committed=True; command ids
+        are assigned by that commit.
+        """
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT credits, role FROM users WHERE id = ?', (user_id,))
         user = cursor.fetchone()
+        conn.close()
         
         if not user or user['credits'] <= 0:
-            conn.close()
             raise ValueError("Insufficient credits")
         
-        # Match against rules
-        matched_rule = Rule.match_command(command_text)
+        from fingerprint import fingerprint_command
+        compiled_rules = Rule.get_compiled_rules()
         
-        if matched_rule and matched_rule['action'] == 'AUTO_REJECT':
-            # Reject command
-            cursor.execute(
-                'INSERT INTO commands (user_id, command_text, status, matched_rule_id) VALUES (?, ?, ?, ?)',
-                (user_id, command_text, 'REJECTED', matched_rule['id'])
-            )
-            command_id = cursor.lastrowid
-            conn.commit()
+        def generate():
+            results = [None] * len(command_texts)
+            credits_left = user['credits']
+            to_analyze = []
             
-            AuditLog.log(user_id, 'COMMAND_REJECTED', f'Command rejected by rule {matched_rule["id"]}: {command_text}')
+            for index, command_text in enumerate(command_texts):
+                try:
+                    Command.validate(command_text)
+                except ValueError as e:
+                    results[index] = {'index': index, 'command': command_text, 'status': 'INVALID', 'error': str(e)}
+                    yield results[index]
+                    continue
+                
+                fingerprint = fingerprint_command(command_text)
+                matched_rule = Rule.match_command(command_text, compiled_rules)
+                if matched_rule and matched_rule['action'] == 'AUTO_REJECT':
+                    results[index] = {'index': index, 'command': command_text, 'status': 'REJECTED',
+                                      'matched_rule': matched_rule, 'command_template': fingerprint.template,
+                                      'fingerprint': fingerprint.digest}
+                    yield results[index]
+                else:
+                    to_analyze.append((index, command_text, matched_rule, fingerprint))
             
-            conn.close()
-            return {'id': command_id, 'status': 'REJECTED', 'matched_rule': matched_rule}
+            pool = ThreadPoolExecutor(max_workers=Config.BATCH_ANALYSIS_WORKERS,
+                                      thread_name_prefix='batch-analysis')
+            try:
+                futures = {}
+                for entry in to_analyze:
+                    futures[pool.submit(AIAnalyzer.analyze_command, entry[1], fingerprint=entry[3])] = entry
+                for future in as_completed(futures):
+                    index, command_text, matched_rule, fingerprint = futures[future]
+                    try:
+                        ai_analysis = future.result()
+                    except Exception as e:
+                        ai_analysis = AIAnalyzer.fail_safe(f'AI analysis failed: {str(e)}')
+                    
+                    result = {'index': index, 'command': command_text, 'matched_rule': matched_rule,
+                              'ai_analysis': ai_analysis, 'command_template': fingerprint.template,
+                              'fingerprint': fingerprint.digest}
+                    if ai_analysis['requires_approval'] and ai_analysis['risk_score'] >= 6:
+                        result['status'] = 'PENDING_APPROVAL'
+                    elif credits_left > 0:
+                        credits_left -= 1
+                        result['status'] = CommandExecutor.accepted_status()
+                        if result['status'] == 'EXECUTED':
+                            result['execution_result'] = CommandExecutor.mock_result(command_text)
+                    else:
+                        result['status'] = 'REJECTED'
+                        result['error'] = 'Insufficient credits'
+                    results[index] = result
+                    yield result
+            finally:
+                # Stop queued analyses if the client goes away mid-stream
+                pool.shutdown(wait=False, cancel_futures=True)
+            
+            yield Command._commit_batch(user_id, user['role'], results)
         
-        # Auto-accept or no matching rule - perform AI analysis
-        ai_analysis = AIAnalyzer.analyze_command(command_text)
+        return generate()
+    
+    @staticmethod
+    def _commit_batch(user_id, role, results):
+        """Write every decided batch result (and its audit trail) in one transaction"""
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        charged = sum(count for status, count in counts.items() if status in CHARGED_STATUSES)
+        summary = {
+            'summary': True,
+            'committed': False,
+            'total': len(results),
+            'counts': counts,
+            'credits_used': charged,
+            'command_ids': [None] * len(results)
+        }
         
+        conn = Database().get_connection()
+        cursor = conn.cursor()
         try:
-            # Start transaction
-            cursor.execute('BEGIN TRANSACTION')
+            cursor.execute('BEGIN IMMEDIATE')
+            if charged:
+                cursor.execute('UPDATE users SET credits = credits - ? WHERE id = ? AND credits >= ?',
+                               (charged, user_id, charged))
+                if cursor.rowcount == 0:
+                    raise ValueError("Credits changed while the batch was running; nothing was saved")
             
-            if ai_analysis['requires_approval'] and ai_analysis['risk_score'] >= 6:
-                # Command needs admin approval
+            for result in results:
+                if result['status'] == 'INVALID':
+                    continue
+                matched_rule = result.get('matched_rule')
+                ai_analysis = result.get('ai_analysis') or {}
                 cursor.execute(
-                    '''INSERT INTO commands (user_id, command_text, status, matched_rule_id, 
-                       ai_analysis, ai_risk_score, required_approvals) 
-                       VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                    (user_id, command_text, 'PENDING_APPROVAL', 
+                    '''INSERT INTO commands (user_id, command_text, status, matched_rule_id,
+                       credits_deducted, ai_analysis, ai_risk_score, command_template, fingerprint)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    (user_id, result['command'], result['status'],
                      matched_rule['id'] if matched_rule else None,
-                     ai_analysis['analysis'], ai_analysis['risk_score'], 2)
+                     1 if result['status'] in CHARGED_STATUSES else 0,
+                     ai_analysis.get('analysis'), ai_analysis.get('risk_score', 0),
+                     result['command_template'], result['fingerprint'])
                 )
-                command_id = cursor.lastrowid
-                conn.commit()
-                
-                AuditLog.log(user_id, 'COMMAND_PENDING_APPROVAL', 
-                           f'Command requires approval (AI risk score: {ai_analysis["risk_score"]}): {command_text}')
-                
-                conn.close()
-                return {
-                    'id': command_id,
-                    'status': 'PENDING_APPROVAL',
-                    'matched_rule': matched_rule,
-                    'ai_analysis': ai_analysis,
-                    'message': 'Command flagged by AI security analysis. Awaiting admin approval.',
-                    'credits_remaining': user['credits']  # No credits deducted yet
-                }
-            else:
-                # Command is safe - execute immediately
-                new_credits = user['credits'] - 1
-                cursor.execute('UPDATE users SET credits = ? WHERE id = ?', (new_credits, user_id))
-                
+                summary['command_ids'][result['index']] = cursor.lastrowid
                 cursor.execute(
-                    '''INSERT INTO commands (user_id, command_text, status, matched_rule_id, 
-                       credits_deducted, ai_analysis, ai_risk_score) 
-                       VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                    (user_id, command_text, 'EXECUTED', 
-                     matched_rule['id'] if matched_rule else None, 1,
-                     ai_analysis['analysis'], ai_analysis['risk_score'])
+                    'INSERT INTO audit_logs (user_id, action, details) VALUES (?, ?, ?)',
+                    (user_id, f"COMMAND_{result['status']}", f"Batch command {result['status'].lower()}: {result['command']}")
                 )
-                command_id = cursor.lastrowid
-                
-                # Simulate command execution (mock)
-                execution_result = f"Mock execution of: {command_text}"
-                
-                conn.commit()
-                
-                AuditLog.log(user_id, 'COMMAND_EXECUTED', 
-                           f'Command executed (AI approved, risk score: {ai_analysis["risk_score"]}): {command_text}')
-                
-                conn.close()
-                return {
-                    'id': command_id, 
-                    'status': 'EXECUTED', 
-                    'matched_rule': matched_rule,
-                    'ai_analysis': ai_analysis,
-                    'execution_result': execution_result,
-                    'credits_remaining': new_credits
-                }
             
+            cursor.execute(
+                'INSERT INTO audit_logs (user_id, action, details) VALUES (?, ?, ?)',
+                (user_id, 'COMMAND_BATCH_SUBMITTED', f'Batch of {len(results)} commands: {counts}')
+            )
+            cursor.execute('SELECT credits FROM users WHERE id = ?', (user_id,))
+            summary['credits_remaining'] = cursor.fetchone()['credits']
+            conn.commit()
+            summary['committed'] = True
+            
+            for result in results:
+                if result['status'] == 'QUEUED':
+                    executor.submit(summary['command_ids'][result['index']], user_id, result['command'],
+                                    priority_class(role, result['ai_analysis']['risk_score']))
+        except ValueError as e:
+            conn.rollback()
+            summary['command_ids'] = [None] * len(results)
+            summary['error'] = str(e)
         except Exception as e:
             conn.rollback()
+            print(f"Batch commit error: {e}")
+            summary['command_ids'] = [None] * len(results)
+            summary['error'] = 'Batch could not be saved'
+        finally:
             conn.close()
-            raise e
+        return summary
     
     @staticmethod
-    def get_user_commands(user_id, limit=50):
+    def get_by_id(command_id):
         conn = Database().get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
+        cursor.execute('SELECT * FROM commands WHERE id = ?', (command_id,))
+        command = cursor.fetchone()
+        conn.close()
+        return dict(command) if command else None
+    
+    @staticmethod
+    def get_user_commands(user_id, limit=50, before=None):
+        """Newest first; `before` is the (created_at, id) of the last row already seen"""
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        seek = 'AND (c.created_at, c.id) < (?, ?)' if before else ''
+        cursor.execute(f'''
             SELECT c.*, r.pattern as rule_pattern, r.action as rule_action 
             FROM commands c 
             LEFT JOIN rules r ON c.matched_rule_id = r.id 
-            WHERE c.user_id = ? 
-            ORDER BY c.created_at DESC 
+            WHERE c.user_id = ? {seek}
+            ORDER BY c.created_at DESC, c.id DESC 
             LIMIT ?
-        ''', (user_id, limit))
+        ''', (user_id, *(before or ()), limit))
         commands = cursor.fetchall()
         conn.close()
         return [dict(cmd) for cmd in commands]
     
+    @staticmethod
+    def search(query, user_id=None, status=None, start=None, end=None, limit=50):
+        """
+        Full-text search over command text and AI analysis, best match first
+        (bm25, command text weighted double). `query` uses the search box
+        syntax of search.fts_query; start/end bound created_at, end exclusive.
+        """
+        conditions = ['commands_fts MATCH ?']
+        params = [fts_query(query)]
+        for clause, value in (('c.user_id = ?', user_id), ('c.status = ?', status),
+                              ('c.created_at >= ?', start), ('c.created_at < ?', end)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        params.append(limit)
+        
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT c.*, u.name as user_name,
+                   snippet(commands_fts, 0, ?, ?, '…', 16) as command_snippet,
+                   snippet(commands_fts, 1, ?, ?, '…', 16) as analysis_snippet
+            FROM commands_fts
+            JOIN commands c ON c.id = commands_fts.rowid
+            LEFT JOIN users u ON c.user_id = u.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY bm25(commands_fts, 2.0, 1.0)
+            LIMIT ?
+        ''', [HIGHLIGHT_START, HIGHLIGHT_END] * 2 + params)
+        commands = cursor.fetchall()
+        conn.close()
+        return [dict(cmd) for cmd in commands]
+    
+    @staticmethod
+    def search_regex(pattern, user_id=None, status=None, before_id=None, limit=None, time_budget_ms=None):
+        """
+        Yield the stored commands `pattern` matches (Python re semantics, as
+        rules use), newest first, then a summary. The table is walked in id
+        windows of REGEX_SEARCH_WINDOW rows; within a window, instr() on the
+        pattern's required literals discards most rows inside SQLite and only
+        the survivors reach the regex. The search stops at `limit` matches or
+        when the time budget runs out - checked by the regex function itself,
+        so one slow window is cut short mid-scan; the summary then carries
+        resume_before_id to continue from.
+        """
+        limit = limit or Config.REGEX_SEARCH_MAX_RESULTS
+        budget = (time_budget_ms or Config.REGEX_SEARCH_TIME_BUDGET_MS) / 1000
+        literals = required_literals(pattern)
+        conditions = ['c.id >= ?', 'c.id < ?']
+        conditions += ['instr(c.command_text, ?) > 0' for _ in literals]
+        conditions.append('search_regexp(c.id, c.command_text)')
+        filters = []
+        for clause, value in (('c.user_id = ?', user_id), ('c.status = ?', status)):
+            if value is not None:
+                conditions.append(clause)
+                filters.append(value)
+        query = f'''
+            SELECT c.id, c.user_id, u.name as user_name, c.command_text, c.status, c.created_at
+            FROM commands c
+            LEFT JOIN users u ON c.user_id = u.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY c.id DESC
+        '''
+        
+        database = Database()
+        conn = database.get_connection()
+        try:
+            upper = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM commands').fetchone()[0]
+        finally:
+            conn.close()
+        if before_id is not None:
+            upper = min(upper, before_id)
+        
+        deadline = time.monotonic() + budget
+        regex = compiled_regex(pattern)
+        # Lowest id whose regex has run; rows are scanned newest first
+        scan = {'checked': None, 'expired': False}
+        
+        def search_regexp(command_id, value):
+            # Past the deadline the rest of the window is passed over without running the
+            # regex; checking after each row means every call makes progress
+            if scan['expired']:
+                return False
+            matched_row = value is not None and regex.search(value) is not None
+            scan['checked'] = command_id
+            scan['expired'] = time.monotonic() >= deadline
+            return matched_row
+        
+        matched = 0
+        resume_before_id = None
+        while upper > 1:
+            lower = max(1, upper - Config.REGEX_SEARCH_WINDOW)
+            conn = database.get_connection()
+            conn.create_function('search_regexp', 2, search_regexp)
+            try:
+                rows = conn.execute(query, [lower, upper] + literals + filters).fetchall()
+            finally:
+                conn.close()
+            for row in rows:
+                yield dict(row)
+                matched += 1
+                if matched >= limit:
+                    resume_before_id = row['id']
+                    break
+            if resume_before_id is not None:
+                break
+            if scan['expired'] and scan['checked'] is not None and scan['checked'] > lower:
+                # Cut off inside the window: everything above the last checked row is done
+                resume_before_id = scan['checked']
+                break
+            upper = lower
+            if upper > 1 and time.monotonic() >= deadline:
+                resume_before_id = upper
+                break
+        
+        metrics.counter('regex_search.runs').inc()
+        yield {
+            'summary': True,
+            'matched': matched,
+            'complete': resume_before_id is None,
+            'resume_before_id': resume_before_id,
+            'literals': literals
+        }
+    
     @staticmethod
     def get_pending_approvals():
         """Get all commands pending admin approval"""
         conn = Database().get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        commands = Command._pending_rows(conn.cursor())
+        conn.close()
+        return commands
+    
+    @staticmethod
+    def _pending_rows(cursor, command_ids=None):
+        query = '''
             SELECT c.*, u.name as user_name, r.pattern as rule_pattern, r.action as rule_action
             FROM commands c 
             LEFT JOIN users u ON c.user_id = u.id
             LEFT JOIN rules r ON c.matched_rule_id = r.id 
             WHERE c.status = 'PENDING_APPROVAL'
-            ORDER BY c.created_at ASC
-        ''')
-        commands = cursor.fetchall()
+        '''
+        params = []
+        if command_ids is not None:
+            query += f" AND c.id IN ({', '.join('?' for _ in command_ids)})"
+            params = list(command_ids)
+        cursor.execute(query + ' ORDER BY c.created_at ASC', params)
+        return [dict(cmd) for cmd in cursor.fetchall()]
+    
+    @staticmethod
+    def pending_changes_version():
+        """Current version of the pending-approvals queue (last change sequence number)"""
+        conn = Database().get_connection()
+        version = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM pending_changes').fetchone()[0]
         conn.close()
-        return [dict(cmd) for cmd in commands]
+        return version
     
     @staticmethod
-    def approve_command(command_id, admin_id, approved, reason=None):
-        """Admin approves or rejects a pending command"""
+    def get_pending_changes(since=None):
+        """
+        Changes to the pending-approvals queue after version `since`: commands
+        that are pending now and changed (upserts) and ids that left the queue
+        (removed), so a client can patch its list in place. A missing, unknown
+        or already pruned version gets the whole queue with reset=True.
+        """
         conn = Database().get_connection()
         cursor = conn.cursor()
-        
         try:
-            cursor.execute('BEGIN TRANSACTION')
+            # One read transaction, so the version matches the rows returned
+            cursor.execute('BEGIN')
+            cursor.execute('SELECT COALESCE(MAX(seq), 0) AS version, MIN(seq) AS oldest FROM pending_changes')
+            row = cursor.fetchone()
+            version, oldest = row['version'], row['oldest']
+            reset = since is None or since <= 0 or since > version or (oldest is not None and since < oldest - 1)
+            if reset:
+                upserts = Command._pending_rows(cursor)
+                removed = []
+            else:
+                cursor.execute('SELECT DISTINCT command_id FROM pending_changes WHERE seq > ? AND seq <= ?',
+                               (since, version))
+                changed = [row['command_id'] for row in cursor.fetchall()]
+                upserts = Command._pending_rows(cursor, changed) if changed else []
+                pending_ids = {command['id'] for command in upserts}
+                removed = sorted(command_id for command_id in changed if command_id not in pending_ids)
+            conn.commit()
             
-            # Get command details
-            cursor.execute('SELECT * FROM commands WHERE id = ? AND status = ?', 
-                         (command_id, 'PENDING_APPROVAL'))
+            if oldest is not None and version - oldest >= 2 * Config.PENDING_CHANGES_RETENTION:
+                conn.execute('DELETE FROM pending_changes WHERE seq <= ?',
+                             (version - Config.PENDING_CHANGES_RETENTION,))
+                conn.commit()
+        finally:
+            conn.close()
+        
+        return {
+            'version': version,
+            'reset': reset,
+            'upserts': upserts,
+            'removed': removed
+        }
+    
+    @staticmethod
+    def _apply_vote(cursor, command, admin_id, approved, reason):
+        """
+        One admin's vote on one PENDING_APPROVAL command, inside the caller's
+        BEGIN IMMEDIATE transaction: the vote (unique per admin), the rejection
+        or incremental count, and - at quorum - the conditional transition and
+        credit charge, with their audit rows. Returns the outcome; `start` is
+        set when the command was cleared and should be run after commit.
+        """
+        outcome = {'command_id': command['id']}
+        cursor.execute('''
+            INSERT OR IGNORE INTO command_approvals (command_id, admin_id, approved, reason)
+            VALUES (?, ?, ?, ?)
+        ''', (command['id'], admin_id, approved, reason))
+        if cursor.rowcount == 0:
+            return dict(outcome, status='SKIPPED', error='Admin has already voted on this command')
+        
+        if not approved:
+            cursor.execute('UPDATE commands SET status = ? WHERE id = ? AND status = ?',
+                           ('REJECTED', command['id'], 'PENDING_APPROVAL'))
+            AuditLog.log(admin_id, 'COMMAND_REJECTED_BY_ADMIN',
+                         f'Admin rejected command {command["id"]}: {reason or "No reason provided"}', cursor=cursor)
+            return dict(outcome, status='REJECTED')
+        
+        cursor.execute('''
+            UPDATE commands SET approval_count = approval_count + 1
+            WHERE id = ? AND status = 'PENDING_APPROVAL'
+        ''', (command['id'],))
+        cursor.execute('SELECT approval_count, required_approvals FROM commands WHERE id = ?', (command['id'],))
+        counts = cursor.fetchone()
+        approval_count = counts['approval_count']
+        required_approvals = counts['required_approvals']
+        if approval_count < required_approvals:
+            AuditLog.log(admin_id, 'COMMAND_PARTIALLY_APPROVED',
+                         f'Command {command["id"]} approved by admin ({approval_count}/{required_approvals} approvals)',
+                         cursor=cursor)
+            return dict(outcome, status='PENDING_APPROVAL', approval_count=approval_count,
+                        approvals_needed=required_approvals - approval_count)
+        
+        # Sufficient approvals - only the vote that moves the command off PENDING_APPROVAL executes it
+        status = CommandExecutor.accepted_status()
+        cursor.execute('''
+            UPDATE commands SET status = ?, credits_deducted = 1
+            WHERE id = ? AND status = 'PENDING_APPROVAL' AND approval_count >= required_approvals
+        ''', (status, command['id']))
+        if cursor.rowcount == 0:
+            return dict(outcome, status='SKIPPED', error='Command not found or not pending approval')
+        
+        cursor.execute('UPDATE users SET credits = credits - 1 WHERE id = ? AND credits > 0', (command['user_id'],))
+        if cursor.rowcount == 0:
+            cursor.execute('UPDATE commands SET status = ?, credits_deducted = 0 WHERE id = ?',
+                           ('REJECTED', command['id']))
+            return dict(outcome, status='REJECTED', error='User has insufficient credits')
+        
+        verb = 'executed' if status == 'EXECUTED' else 'queued'
+        AuditLog.log(admin_id, f'COMMAND_APPROVED_{status}',
+                     f'Command {command["id"]} approved and {verb} after {approval_count} approvals', cursor=cursor)
+        return dict(outcome, status=status, approval_count=approval_count, start=True)
+    
+    @staticmethod
+    def approve_command(command_id, admin_id, approved, reason=None):
+        """
+        Admin approves or rejects a pending command. BEGIN IMMEDIATE serializes
+        concurrent votes, approval_count is kept incrementally, and every status
+        change is conditional on the command still being PENDING_APPROVAL, so
+        quorum is reached - and credits charged - exactly once. A second vote
+        from the same admin is refused by the unique (command_id, admin_id) index.
+        """
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT * FROM commands WHERE id = ? AND status = ?',
+                           (command_id, 'PENDING_APPROVAL'))
             command = cursor.fetchone()
-            
             if not command:
                 conn.rollback()
-                conn.close()
                 return {'error': 'Command not found or not pending approval'}
             
-            # Record the approval/rejection
-            cursor.execute('''
-                INSERT INTO command_approvals (command_id, admin_id, approved, reason)
-                VALUES (?, ?, ?, ?)
-            ''', (command_id, admin_id, approved, reason))
+            outcome = Command._apply_vote(cursor, command, admin_id, approved, reason)
+            if outcome['status'] == 'SKIPPED':
+                conn.rollback()
+                return {'error': outcome['error']}
+            cursor.execute('SELECT credits FROM users WHERE id = ?', (command['user_id'],))
+            credits_remaining = cursor.fetchone()['credits']
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+        
+        if 'error' in outcome:
+            return {'error': outcome['error']}
+        if outcome['status'] == 'REJECTED':
+            return {
+                'status': 'REJECTED',
+                'message': 'Command rejected by admin',
+                'reason': reason
+            }
+        if outcome['status'] == 'PENDING_APPROVAL':
+            return {
+                'status': 'PENDING_APPROVAL',
+                'message': f"Command approved ({outcome['approval_count']}/"
+                           f"{outcome['approval_count'] + outcome['approvals_needed']} approvals needed)",
+                'approvals_needed': outcome['approvals_needed']
+            }
+        
+        # Commands that made it through approval jump ahead of routine work
+        execution = Command.start_execution(command_id, command['user_id'], command['command_text'], APPROVED_CLASS)
+        verb = 'executed' if execution['status'] == 'EXECUTED' else 'queued for execution'
+        message = f"Command approved by {outcome['approval_count']} admins and {verb}"
+        return dict(execution, message=message, credits_remaining=credits_remaining)
+    
+    @staticmethod
+    def bulk_approve(admin_id, approved, reason=None, command_ids=None, user_id=None, fingerprint=None,
+                     min_risk=None, max_risk=None):
+        """
+        Apply one admin's vote to every pending command selected by ids and/or
+        filters, in a single transaction, each through the same _apply_vote step
+        as approve_command. Commands reaching quorum are started after commit.
+        Returns per-command results plus counts by outcome.
+        """
+        conditions = ['status = ?']
+        params = ['PENDING_APPROVAL']
+        if command_ids is not None:
+            conditions.append(f"id IN ({', '.join('?' for _ in command_ids)})")
+            params.extend(command_ids)
+        for clause, value in (('user_id = ?', user_id), ('fingerprint = ?', fingerprint),
+                              ('ai_risk_score >= ?', min_risk), ('ai_risk_score <= ?', max_risk)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        params.append(Config.BULK_APPROVAL_MAX_COMMANDS)
+        
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        results = []
+        to_start = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f"SELECT * FROM commands WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?", params)
+            for command in cursor.fetchall():
+                outcome = Command._apply_vote(cursor, command, admin_id, approved, reason)
+                if outcome.pop('start', False):
+                    to_start.append(command)
+                outcome.pop('approval_count', None)
+                results.append(outcome)
             
-            # Count current approvals
-            cursor.execute('''
-                SELECT COUNT(*) as approval_count
-                FROM command_approvals 
-                WHERE command_id = ? AND approved = 1
-            ''', (command_id,))
-            approval_count = cursor.fetchone()['approval_count']
-            
-            # Update command approval count
-            cursor.execute('UPDATE commands SET approval_count = ? WHERE id = ?', 
-                         (approval_count, command_id))
-            
-            if not approved:
-                # Command rejected
-                cursor.execute('UPDATE commands SET status = ? WHERE id = ?', 
-                             ('REJECTED', command_id))
-                conn.commit()
-                
-                AuditLog.log(admin_id, 'COMMAND_REJECTED_BY_ADMIN', 
-                           f'Admin rejected command {command_id}: {reason or "No reason provided"}')
-                
-                conn.close()
-                return {
-                    'status': 'REJECTED',
-                    'message': 'Command rejected by admin',
-                    'reason': reason
-                }
+            counts = {}
+            for result in results:
+                counts[result['status']] = counts.get(result['status'], 0) + 1
+            AuditLog.log(admin_id, 'COMMANDS_BULK_APPROVED' if approved else 'COMMANDS_BULK_REJECTED',
+                         f'Bulk decision on {len(results)} pending commands: {counts}', cursor=cursor)
             
-            elif approval_count >= command['required_approvals']:
-                # Sufficient approvals - execute command
-                cursor.execute('SELECT credits FROM users WHERE id = ?', (command['user_id'],))
-                user = cursor.fetchone()
-                
-                if user['credits'] <= 0:
-                    cursor.execute('UPDATE commands SET status = ? WHERE id = ?', 
-                                 ('REJECTED', command_id))
-                    conn.commit()
-                    conn.close()
-                    return {'error': 'User has insufficient credits'}
-                
-                # Deduct credits and execute
-                new_credits = user['credits'] - 1
-                cursor.execute('UPDATE users SET credits = ? WHERE id = ?', 
-                             (new_credits, command['user_id']))
-                cursor.execute('UPDATE commands SET status = ?, credits_deducted = ? WHERE id = ?', 
-                             ('EXECUTED', 1, command_id))
-                
-                conn.commit()
-                
-                AuditLog.log(admin_id, 'COMMAND_APPROVED_EXECUTED', 
-                           f'Command {command_id} approved and executed after {approval_count} approvals')
-                
-                conn.close()
-                return {
-                    'status': 'EXECUTED',
-                    'message': f'Command approved by {approval_count} admins and executed',
-                    'execution_result': f"Mock execution of: {command['command_text']}",
-                    'credits_remaining': new_credits
-                }
-            else:
-                # Need more approvals
-                conn.commit()
-                
-                AuditLog.log(admin_id, 'COMMAND_PARTIALLY_APPROVED', 
-                           f'Command {command_id} approved by admin ({approval_count}/{command["required_approvals"]} approvals)')
-                
-                conn.close()
-                return {
-                    'status': 'PENDING_APPROVAL',
-                    'message': f'Command approved ({approval_count}/{command["required_approvals"]} approvals needed)',
-                    'approvals_needed': command['required_approvals'] - approval_count
-                }
-                
+            credits_remaining = {}
+            charged_users = {command['user_id'] for command in to_start}
+            for charged_user in charged_users:
+                cursor.execute('SELECT credits FROM users WHERE id = ?', (charged_user,))
+                credits_remaining[charged_user] = cursor.fetchone()['credits']
+            conn.commit()
         except Exception as e:
             conn.rollback()
-            conn.close()
             raise e
+        finally:
+            conn.close()
+        
+        # Commands that made it through approval jump ahead of routine work
+        by_id = {result['command_id']: result for result in results}
+        for command in to_start:
+            by_id[command['id']].update(Command.start_execution(command['id'], command['user_id'],
+                                                                command['command_text'], APPROVED_CLASS))
+        
+        return {
+            'approved': approved,
+            'total': len(results),
+            'counts': counts,
+            'results': results,
+            'credits_remaining': credits_remaining
+        }
+    
+    @staticmethod
+    def get_analytics(day=None):
+        """
+        Dashboard totals for one UTC day ('YYYY-MM-DD', default today), read
+        from the daily rollups. executed_commands counts every charged command
+        (CHARGED_STATUSES), queued and failed runs included, so it matches
+        total_credits_used whether or not execution is asynchronous.
+        """
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        if day is None:
+            cursor.execute("SELECT DATE('now')")
+            day = cursor.fetchone()[0]
+        
+        cursor.execute(f'''
+            SELECT 
+                COALESCE(SUM(commands), 0) as total_commands,
+                SUM(CASE WHEN status IN ({', '.join('?' * len(CHARGED_STATUSES))}) THEN commands ELSE 0 END)
+                    as executed_commands,
+                SUM(CASE WHEN status = 'REJECTED' THEN commands ELSE 0 END) as rejected_commands,
+                SUM(credits) as total_credits_used
+            FROM command_rollup_status
+            WHERE day = ?
+        ''', (*CHARGED_STATUSES, day))
+        daily_stats = cursor.fetchone()
+        
+        # Grouped by template (rows from before fingerprinting by exact text)
+        cursor.execute('''
+            SELECT command_template, command_text, fingerprint, commands as count, status
+            FROM command_rollup_fingerprints
+            WHERE day = ?
+            ORDER BY count DESC
+            LIMIT 10
+        ''', (day,))
+        top_commands = cursor.fetchall()
+        
+        cursor.execute('''
+            SELECT u.name, COALESCE(r.commands, 0) as command_count
+            FROM users u
+            LEFT JOIN command_rollup_users r ON r.day = ? AND r.user_id = u.id
+            ORDER BY command_count DESC
+        ''', (day,))
+        user_activity = cursor.fetchall()
+        conn.close()
+        
+        return {
+            'daily_stats': dict(daily_stats),
+            'top_commands': [dict(command) for command in top_commands],
+            'user_activity': [dict(user) for user in user_activity]
+        }
+    
+    @staticmethod
+    def analytics_version(start, end):
+        """
+        Version of the rollups over [start, end): the sum of the per-day
+        counters bumped by every change to a day's rows, so it only moves when
+        a day the range covers changes
+        """
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COALESCE(SUM(version), 0) FROM command_rollup_versions WHERE day >= ? AND day <= ?',
+                       (start[:10], end[:10]))
+        version = cursor.fetchone()[0]
+        conn.close()
+        return version
+    
+    @staticmethod
+    def get_timeseries(start, end, bucket, resolution, group_by=()):
+        """
+        Command counts and credits per `bucket` over [start, end), split by the
+        `group_by` dimensions (see rollups.DIMENSIONS), read from the `resolution`
+        series chosen by rollups.series_range. Only non-empty buckets appear.
+        Labels name the users, rules and fingerprints the points refer to.
+        """
+        table = RESOLUTIONS[resolution][1]
+        columns = [DIMENSIONS[dimension] for dimension in group_by]
+        grouped = ', '.join(['bucket'] + columns)
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {bucket_expression(resolution, bucket)} as bucket, {''.join(f'{column}, ' for column in columns)}
+                   SUM(commands) as commands, SUM(credits) as credits
+            FROM {table}
+            WHERE {resolution} >= ? AND {resolution} < ?
+            GROUP BY {grouped}
+            ORDER BY {grouped}
+        ''', (bucket_bound(resolution, start), bucket_bound(resolution, end)))
+        points = []
+        for row in cursor.fetchall():
+            point = {'bucket': row['bucket']}
+            for dimension, column in zip(group_by, columns):
+                # Rule 0 stands for "no rule matched"
+                point[dimension] = (row[column] or None) if dimension == 'rule' else row[column]
+            point['commands'] = row['commands']
+            point['credits'] = row['credits']
+            points.append(point)
+        
+        labels = {}
+        if 'user' in group_by:
+            ids = sorted({point['user'] for point in points})
+            cursor.execute(f"SELECT id, name FROM users WHERE id IN ({', '.join('?' * len(ids))})", ids)
+            labels['user'] = {row['id']: row['name'] for row in cursor.fetchall()}
+        if 'rule' in group_by:
+            ids = sorted({point['rule'] for point in points if point['rule']})
+            cursor.execute(f"SELECT id, pattern FROM rules WHERE id IN ({', '.join('?' * len(ids))})", ids)
+            labels['rule'] = {row['id']: row['pattern'] for row in cursor.fetchall()}
+        if 'fingerprint' in group_by:
+            # Keys are fingerprints, or the exact text of commands stored before fingerprinting;
+            # the fingerprint rollup keeps a template for both, so one read over the range's days labels them
+            keys = sorted({point['fingerprint'] for point in points})
+            cursor.execute(f'''
+                SELECT command_key, MIN(command_template) AS command_template FROM command_rollup_fingerprints
+                WHERE day >= ? AND day <= ? AND command_key IN ({', '.join('?' * len(keys))})
+                GROUP BY command_key
+            ''', [start[:10], end[:10]] + keys)
+            templates = {row['command_key']: row['command_template'] for row in cursor.fetchall()}
+            labels['fingerprint'] = {key: templates.get(key) or key for key in keys}
+        conn.close()
+        return {'points': points, 'labels': labels}
+
+executor.status_listeners.append(Command.record_execution_status)
 
 class AuditLog:
     @staticmethod
-    def log(user_id, action, details):
+    def log(user_id, action, details, cursor=None):
+        """Record an audit entry; with `cursor`, inside that connection's open transaction"""
+        if cursor is not None:
+            cursor.execute('INSERT INTO audit_logs (user_id, action, details) VALUES (?, ?, ?)',
+                           (user_id, action, details))
+            return
         conn = Database().get_connection()
         cursor = conn.cursor()
         cursor.execute(
@@ -927,16 +2311,99 @@ class AuditLog:
         conn.close()
     
     @staticmethod
-    def get_logs(limit=100):
+    def get_logs(limit=100, before=None):
+        """Newest first; `before` is the (timestamp, id) of the last row already seen"""
         conn = Database().get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
+        seek = 'WHERE (a.timestamp, a.id) < (?, ?)' if before else ''
+        cursor.execute(f'''
             SELECT a.*, u.name as user_name 
             FROM audit_logs a 
             LEFT JOIN users u ON a.user_id = u.id 
-            ORDER BY a.timestamp DESC 
+            {seek}
+            ORDER BY a.timestamp DESC, a.id DESC 
+            LIMIT ?
+        ''', (*(before or ()), limit))
+        logs = cursor.fetchall()
+        conn.close()
+        return [dict(log) for log in logs]
+    
+    @staticmethod
+    def iter_logs(start=None, end=None, user_id=None, action=None, batch_size=None):
+        """
+        Yield audit entries in id order, filtered by [start, end) timestamp,
+        user and action. Rows are read in keyset batches of batch_size, each
+        its own short query, so an export of any size keeps memory flat and
+        never holds a read lock that would stall writers for its duration.
+        The timestamp index turns the time range into an id range up front.
+        """
+        batch_size = batch_size or Config.AUDIT_EXPORT_BATCH_SIZE
+        database = Database()
+        conn = database.get_connection()
+        try:
+            first_id = 0
+            last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM audit_logs').fetchone()[0]
+            if start is not None:
+                row = conn.execute('SELECT MIN(id) FROM audit_logs WHERE timestamp >= ?', (start,)).fetchone()
+                first_id = row[0] - 1 if row[0] is not None else last_id
+            if end is not None:
+                row = conn.execute('SELECT MAX(id) FROM audit_logs WHERE timestamp < ?', (end,)).fetchone()
+                last_id = row[0] or 0
+        finally:
+            conn.close()
+        
+        conditions = ['a.id > ?', 'a.id <= ?']
+        params = [last_id]
+        for clause, value in (('a.timestamp >= ?', start), ('a.timestamp < ?', end),
+                              ('a.user_id = ?', user_id), ('a.action = ?', action)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        query = f'''
+            SELECT a.*, u.name as user_name
+            FROM audit_logs a
+            LEFT JOIN users u ON a.user_id = u.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY a.id
+            LIMIT ?
+        '''
+        
+        while first_id < last_id:
+            conn = database.get_connection()
+            try:
+                rows = conn.execute(query, [first_id] + params + [batch_size]).fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            first_id = rows[-1]['id']
+    
+    @staticmethod
+    def search(query, user_id=None, action=None, start=None, end=None, limit=100):
+        """Full-text search over audit details, best match first; start/end bound the timestamp"""
+        conditions = ['audit_logs_fts MATCH ?']
+        params = [fts_query(query)]
+        for clause, value in (('a.user_id = ?', user_id), ('a.action = ?', action),
+                              ('a.timestamp >= ?', start), ('a.timestamp < ?', end)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        params.append(limit)
+        
+        conn = Database().get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT a.*, u.name as user_name,
+                   snippet(audit_logs_fts, 0, ?, ?, '…', 16) as details_snippet
+            FROM audit_logs_fts
+            JOIN audit_logs a ON a.id = audit_logs_fts.rowid
+            LEFT JOIN users u ON a.user_id = u.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY bm25(audit_logs_fts)
             LIMIT ?
-        ''', (limit,))
+        ''', [HIGHLIGHT_START, HIGHLIGHT_END] + params)
         logs = cursor.fetchall()
         conn.close()
-        return [dict(log) for log in logs]
\ No newline at end of file
+        return [dict(log) for log in logs]
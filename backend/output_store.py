@@ -0,0 +1,184 @@
+import threading
+import time
+import zlib
+from config import Config
+from metrics import registry as metrics
+from models import Database
+from executor import executor
+
+STREAMS = ('stdout', 'stderr')
+
+def truncation_marker(limit):
+    return f'\n[output truncated after {limit} bytes]\n'.encode()
+
+class OutputStore:
+    """
+    Execution output kept out of the commands table: each stream is split into
+    fixed-size zlib-compressed chunks in command_output_chunks, addressed by
+    byte offset, with per-command totals in command_outputs. Output past
+    OUTPUT_MAX_STORED_BYTES is dropped and a truncation marker chunk written.
+    """
+    def __init__(self, chunk_bytes=None, max_stored_bytes=None, retention_seconds=None, clock=time.time):
+        self.chunk_bytes = chunk_bytes or Config.OUTPUT_CHUNK_BYTES
+        self.max_stored_bytes = max_stored_bytes or Config.OUTPUT_MAX_STORED_BYTES
+        self.retention_seconds = retention_seconds or Config.OUTPUT_RETENTION_SECONDS
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writers = {}
+    
+    def on_output(self, job, stream_name, text):
+        with self._lock:
+            writer = self._writers.get(job.command_id)
+            if writer is None:
+                writer = self._writers[job.command_id] = OutputWriter(self, job.command_id)
+        writer.write(stream_name, text.encode('utf-8'))
+    
+    def on_status(self, job, status, details):
+        if status == 'RUNNING':
+            return
+        with self._lock:
+            writer = self._writers.pop(job.command_id, None)
+        if writer:
+            writer.close()
+    
+    def summary(self, command_id):
+        conn = Database().get_connection()
+        row = conn.execute('SELECT * FROM command_outputs WHERE command_id = ?', (command_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    def read(self, command_id, stream='stdout', offset=0, limit=None):
+        """
+        Up to `limit` bytes of one stream starting at `offset`. Only the chunks
+        overlapping the range are fetched and decompressed.
+        """
+        limit = min(limit or Config.OUTPUT_READ_LIMIT_BYTES, Config.OUTPUT_READ_LIMIT_BYTES)
+        end = offset + limit
+        conn = Database().get_connection()
+        summary = conn.execute('SELECT * FROM command_outputs WHERE command_id = ?', (command_id,)).fetchone()
+        rows = conn.execute(
+            '''SELECT byte_offset, raw_size, data FROM command_output_chunks
+               WHERE command_id = ? AND stream = ? AND byte_offset < ? AND byte_offset + raw_size > ?
+               ORDER BY byte_offset''',
+            (command_id, stream, end, offset)
+        ).fetchall()
+        conn.close()
+        
+        pieces = []
+        for row in rows:
+            raw = zlib.decompress(row['data'])
+            start = max(0, offset - row['byte_offset'])
+            pieces.append(raw[start:end - row['byte_offset']])
+        data = b''.join(pieces)
+        stored = summary[f'{stream}_bytes'] if summary else 0
+        return {
+            'command_id': command_id,
+            'stream': stream,
+            'offset': offset,
+            'next_offset': offset + len(data),
+            'data': data.decode('utf-8', errors='replace'),
+            'eof': offset + len(data) >= stored,
+            'stored_bytes': stored,
+            'total_bytes': summary['total_bytes'] if summary else 0,
+            'truncated': bool(summary['truncated']) if summary else False
+        }
+    
+    def sweep(self, batch_size=500):
+        """Delete output older than the retention window, a batch of commands at a time"""
+        cutoff = self._clock() - self.retention_seconds
+        removed = 0
+        while True:
+            conn = Database().get_connection()
+            ids = [row['command_id'] for row in conn.execute(
+                'SELECT command_id FROM command_outputs WHERE updated_at < ? LIMIT ?', (cutoff, batch_size)
+            ).fetchall()]
+            if ids:
+                placeholders = ', '.join('?' * len(ids))
+                conn.execute(f'DELETE FROM command_output_chunks WHERE command_id IN ({placeholders})', ids)
+                conn.execute(f'DELETE FROM command_outputs WHERE command_id IN ({placeholders})', ids)
+                conn.commit()
+            conn.close()
+            removed += len(ids)
+            if len(ids) < batch_size:
+                break
+        if removed:
+            metrics.counter('output_store.swept').inc(removed)
+        return removed
+    
+    def run_sweeper(self, interval_seconds=None):
+        """Background loop for the retention sweep (started by the app)"""
+        interval_seconds = interval_seconds or Config.OUTPUT_SWEEP_INTERVAL_SECONDS
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Output sweep error: {e}")
+            time.sleep(interval_seconds)
+
+class OutputWriter:
+    """Buffers one command's output and flushes it as compressed chunks"""
+    def __init__(self, store, command_id):
+        self.store = store
+        self.command_id = command_id
+        self.buffers = {stream: bytearray() for stream in STREAMS}
+        self.offsets = {stream: 0 for stream in STREAMS}
+        self.total_bytes = 0
+        self.stored_bytes = 0
+        self.truncated = False
+        self._lock = threading.Lock()
+    
+    def write(self, stream_name, data):
+        with self._lock:
+            self.total_bytes += len(data)
+            room = self.store.max_stored_bytes - self.stored_bytes
+            if len(data) > room:
+                data = data[:max(0, room)]
+                self.truncated = True
+            self.stored_bytes += len(data)
+            buffer = self.buffers[stream_name]
+            buffer.extend(data)
+            chunks = []
+            while len(buffer) >= self.store.chunk_bytes:
+                chunks.append((stream_name, bytes(buffer[:self.store.chunk_bytes])))
+                del buffer[:self.store.chunk_bytes]
+            self._flush(chunks)
+    
+    def close(self):
+        with self._lock:
+            chunks = [(stream, bytes(buffer)) for stream, buffer in self.buffers.items() if buffer]
+            for buffer in self.buffers.values():
+                buffer.clear()
+            if self.truncated:
+                chunks.append(('stdout', truncation_marker(self.store.max_stored_bytes)))
+            self._flush(chunks, final=True)
+    
+    def _flush(self, chunks, final=False):
+        # Called with self._lock held
+        if not chunks and not final:
+            return
+        conn = Database().get_connection()
+        try:
+            for stream_name, data in chunks:
+                conn.execute(
+                    '''INSERT INTO command_output_chunks (command_id, stream, byte_offset, raw_size, data)
+                       VALUES (?, ?, ?, ?, ?)''',
+                    (self.command_id, stream_name, self.offsets[stream_name], len(data),
+                     zlib.compress(data, Config.OUTPUT_COMPRESSION_LEVEL))
+                )
+                self.offsets[stream_name] += len(data)
+            conn.execute(
+                '''INSERT OR REPLACE INTO command_outputs
+                   (command_id, stdout_bytes, stderr_bytes, total_bytes, truncated, complete, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (self.command_id, self.offsets['stdout'], self.offsets['stderr'], self.total_bytes,
+                 1 if self.truncated else 0, 1 if final else 0, self.store._clock())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        metrics.counter('output_store.chunks_written').inc(len(chunks))
+
+output_store = OutputStore()
+# Flush stored output before the final status is recorded and announced
+executor.output_listeners.append(output_store.on_output)
+executor.status_listeners.insert(0, output_store.on_status)
@@ -0,0 +1,45 @@
+import base64
+import json
+from flask import request
+from config import Config
+
+def encode_cursor(*values):
+    """Opaque cursor for the sort key of the last row on a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    (timestamp, id) sort key from encode_cursor(); ValueError if the cursor
+    was not one of ours, so a crafted value never reaches the seek query
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError('Invalid cursor')
+    timestamp, row_id = values
+    if not isinstance(timestamp, str) or not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError('Invalid cursor')
+    return timestamp, row_id
+
+def page_args(args, default_limit):
+    """(limit, seek key) from ?limit=&cursor= query arguments"""
+    limit = args.get('limit', default_limit)
+    if not str(limit).isdigit() or not 1 <= int(limit) <= Config.PAGE_MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {Config.PAGE_MAX_LIMIT}')
+    cursor = args.get('cursor')
+    return int(limit), decode_cursor(cursor) if cursor else None
+
+def paged_response(response, rows, limit, key_fields):
+    """
+    Attach the next page's cursor to a list response: X-Next-Cursor plus a
+    Link rel="next" header. The body stays a plain list, so clients that
+    ignore the headers keep working. A full page always gets a cursor; the
+    page after it may turn out empty.
+    """
+    if len(rows) == limit:
+        cursor = encode_cursor(*(rows[-1][field] for field in key_fields))
+        response.headers['X-Next-Cursor'] = cursor
+        response.headers['Link'] = f'<{request.path}?limit={limit}&cursor={cursor}>; rel="next"'
+    return response
@@ -0,0 +1,202 @@
+import time
+from config import Config
+from metrics import registry as metrics
+from models import Database, Rule, Command, AIAnalyzer, AuditLog
+from executor import CommandExecutor
+from scheduler import priority_class
+from fingerprint import fingerprint_command
+
+# Most stages finish well under the default 5ms first bucket
+STAGE_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+class SubmissionContext:
+    """State handed from stage to stage while a single command is submitted"""
+    def __init__(self, user_id, command_text, stream_analysis=False, notify=None):
+        self.user_id = user_id
+        self.command_text = command_text
+        self.stream_analysis = stream_analysis
+        self.notify = notify
+        self.credits = None
+        self.role = None
+        self.fingerprint = None
+        self.matched_rule = None
+        self.status = None
+        self.ai_analysis = None
+        self.result = None
+        self.timings = []
+    
+    @property
+    def matched_rule_id(self):
+        return self.matched_rule['id'] if self.matched_rule else None
+    
+    @property
+    def fingerprint_columns(self):
+        """(command_template, fingerprint) values for the commands row"""
+        if self.fingerprint is None:
+            return None, None
+        return self.fingerprint.template, self.fingerprint.digest
+    
+    def server_timing(self):
+        """Stage timings formatted for the Server-Timing response header"""
+        entries = [f'{name};dur={duration:.2f}' for name, duration in self.timings]
+        entries.append(f'total;dur={sum(duration for _, duration in self.timings):.2f}')
+        return ', '.join(entries)
+
+# Stage name -> callable(context); Config.COMMAND_PIPELINE_STAGES picks the sequence
+STAGES = {}
+
+def register_stage(name):
+    """Decorator making a stage available to Config.COMMAND_PIPELINE_STAGES"""
+    def decorator(stage):
+        STAGES[name] = stage
+        return stage
+    return decorator
+
+@register_stage('validate')
+def validate(ctx):
+    Command.validate(ctx.command_text)
+
+@register_stage('fingerprint')
+def fingerprint(ctx):
+    ctx.fingerprint = fingerprint_command(ctx.command_text)
+
+@register_stage('authorize_credits')
+def authorize_credits(ctx):
+    conn = Database().get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT credits, role FROM users WHERE id = ?', (ctx.user_id,))
+    user = cursor.fetchone()
+    conn.close()
+    
+    if not user or user['credits'] <= 0:
+        raise ValueError("Insufficient credits")
+    ctx.credits = user['credits']
+    ctx.role = user['role']
+
+@register_stage('match_rules')
+def match_rules(ctx):
+    ctx.matched_rule = Rule.match_command(ctx.command_text)
+    if ctx.matched_rule and ctx.matched_rule['action'] == 'AUTO_REJECT':
+        ctx.status = 'REJECTED'
+
+@register_stage('analyze')
+def analyze(ctx):
+    if ctx.status:
+        return
+    if ctx.stream_analysis and AIAnalyzer.needs_model(ctx.command_text, ctx.fingerprint):
+        # Defer the model call; complete_analysis() applies the verdict when the stream ends
+        ctx.status = 'PENDING'
+        return
+    
+    ctx.ai_analysis = AIAnalyzer.analyze_command(ctx.command_text, fingerprint=ctx.fingerprint)
+    if ctx.ai_analysis['requires_approval'] and ctx.ai_analysis['risk_score'] >= 6:
+        ctx.status = 'PENDING_APPROVAL'
+    else:
+        ctx.status = 'EXECUTED'
+
+@register_stage('persist')
+def persist(ctx):
+    conn = Database().get_connection()
+    cursor = conn.cursor()
+    try:
+        # IMMEDIATE: the balance read-and-charge below is serialized with other submissions
+        cursor.execute('BEGIN IMMEDIATE')
+        
+        if ctx.status in ('REJECTED', 'PENDING'):
+            cursor.execute(
+                '''INSERT INTO commands (user_id, command_text, status, matched_rule_id, command_template, fingerprint)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                (ctx.user_id, ctx.command_text, ctx.status, ctx.matched_rule_id) + ctx.fingerprint_columns
+            )
+        elif ctx.status == 'PENDING_APPROVAL':
+            cursor.execute(
+                '''INSERT INTO commands (user_id, command_text, status, matched_rule_id,
+                   ai_analysis, ai_risk_score, required_approvals, command_template, fingerprint)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (ctx.user_id, ctx.command_text, 'PENDING_APPROVAL', ctx.matched_rule_id,
+                 ctx.ai_analysis['analysis'], ctx.ai_analysis['risk_score'], 2) + ctx.fingerprint_columns
+            )
+        else:
+            # ctx.credits was read before the model call; charge the current balance instead
+            cursor.execute('UPDATE users SET credits = credits - 1 WHERE id = ? AND credits > 0', (ctx.user_id,))
+            if not cursor.rowcount:
+                raise ValueError("Insufficient credits")
+            cursor.execute(
+                '''INSERT INTO commands (user_id, command_text, status, matched_rule_id,
+                   credits_deducted, ai_analysis, ai_risk_score, command_template, fingerprint)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (ctx.user_id, ctx.command_text, CommandExecutor.accepted_status(), ctx.matched_rule_id, 1,
+                 ctx.ai_analysis['analysis'], ctx.ai_analysis['risk_score']) + ctx.fingerprint_columns
+            )
+        command_id = cursor.lastrowid
+        cursor.execute('SELECT credits FROM users WHERE id = ?', (ctx.user_id,))
+        credits_remaining = cursor.fetchone()['credits']
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    if ctx.status == 'REJECTED':
+        AuditLog.log(ctx.user_id, 'COMMAND_REJECTED', f'Command rejected by rule {ctx.matched_rule_id}: {ctx.command_text}')
+        ctx.result = {'id': command_id, 'status': 'REJECTED', 'matched_rule': ctx.matched_rule}
+        return
+    
+    ctx.result = {
+        'id': command_id,
+        'status': ctx.status,
+        'matched_rule': ctx.matched_rule,
+        'credits_remaining': credits_remaining
+    }
+    if ctx.status == 'PENDING':
+        AuditLog.log(ctx.user_id, 'COMMAND_ANALYSIS_STARTED', f'AI analysis started: {ctx.command_text}')
+        ctx.result['message'] = 'AI security analysis in progress'
+    elif ctx.status == 'PENDING_APPROVAL':
+        AuditLog.log(ctx.user_id, 'COMMAND_PENDING_APPROVAL',
+                   f'Command requires approval (AI risk score: {ctx.ai_analysis["risk_score"]}): {ctx.command_text}')
+        ctx.result['ai_analysis'] = ctx.ai_analysis
+        ctx.result['message'] = 'Command flagged by AI security analysis. Awaiting admin approval.'
+    else:
+        ctx.result['ai_analysis'] = ctx.ai_analysis
+
+@register_stage('execute')
+def execute(ctx):
+    if ctx.status != 'EXECUTED':
+        return
+    ctx.result.update(Command.start_execution(ctx.result['id'], ctx.user_id, ctx.command_text,
+                                              priority_class(ctx.role, ctx.ai_analysis['risk_score'])))
+    status = ctx.result['status']
+    AuditLog.log(ctx.user_id, f'COMMAND_{status}',
+               f'Command {status.lower()} (AI approved, risk score: {ctx.ai_analysis["risk_score"]}): {ctx.command_text}')
+
+@register_stage('notify')
+def notify(ctx):
+    # Streamed analyses notify once their verdict is in
+    if ctx.notify and ctx.status != 'PENDING':
+        ctx.notify(ctx.result)
+
+class CommandPipeline:
+    """Runs the configured submission stages in order, timing each one"""
+    def __init__(self, stages=None):
+        names = stages or Config.COMMAND_PIPELINE_STAGES
+        unknown = [name for name in names if name not in STAGES]
+        if unknown:
+            raise RuntimeError(f"Unknown pipeline stages: {', '.join(unknown)}")
+        self.stages = [(name, STAGES[name]) for name in names]
+    
+    def run(self, ctx):
+        for name, stage in self.stages:
+            start = time.perf_counter()
+            try:
+                stage(ctx)
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                ctx.timings.append((name, elapsed_ms))
+                metrics.histogram(f'pipeline.stage.{name}_ms', STAGE_BUCKETS_MS).observe(elapsed_ms)
+        return ctx
+
+def run_submission(user_id, command_text, stream_analysis=False, notify=None):
+    """Submit one command through the configured pipeline; returns the finished context"""
+    ctx = SubmissionContext(user_id, command_text, stream_analysis, notify)
+    return CommandPipeline().run(ctx)
@@ -0,0 +1,112 @@
+import math
+import sqlite3
+import threading
+import time
+from config import Config
+from metrics import registry as metrics
+
+class RateLimitExceeded(Exception):
+    status_code = 429
+    reason = 'rate_limit'
+    
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _refill(tokens, updated, now, rate, burst):
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+class MemoryBucketStore:
+    """Token buckets held in this process"""
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def take(self, key, rate, burst, now, cost=1):
+        """Returns (allowed, tokens_left)"""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = _refill(tokens, updated, now, rate, burst)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            return allowed, tokens
+
+class SQLiteBucketStore:
+    """Token buckets in a small SQLite file, shared by every worker process on the host"""
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Config.RATE_LIMIT_DB_PATH
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                bucket_key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+    
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+    
+    def take(self, key, rate, burst, now, cost=1):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, updated_at FROM rate_limit_buckets WHERE bucket_key = ?',
+                               (key,)).fetchone()
+            tokens = _refill(row[0], row[1], now, rate, burst) if row else burst
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute('INSERT OR REPLACE INTO rate_limit_buckets (bucket_key, tokens, updated_at) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            conn.execute('COMMIT')
+            return allowed, tokens
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+class RateLimiter:
+    """Per-user token buckets with per-role rate/burst limits from Config.RATE_LIMITS"""
+    def __init__(self, store=None, limits=None, clock=time.time):
+        self.store = store
+        self.limits = limits
+        self._clock = clock
+    
+    def _get_store(self):
+        if self.store is None:
+            self.store = SQLiteBucketStore() if Config.RATE_LIMIT_BACKEND == 'sqlite' else MemoryBucketStore()
+        return self.store
+    
+    def max_cost(self, role):
+        """Largest cost a single request from `role` can ever be granted (its burst), or None if unlimited"""
+        if not Config.RATE_LIMIT_ENABLED:
+            return None
+        limits = (self.limits or Config.RATE_LIMITS).get(role)
+        return limits['burst'] if limits else None
+    
+    def check(self, user_id, role, cost=1):
+        """Take `cost` tokens from the user's bucket or raise RateLimitExceeded"""
+        if not Config.RATE_LIMIT_ENABLED:
+            return
+        limits = (self.limits or Config.RATE_LIMITS).get(role)
+        if not limits:
+            return
+        rate, burst = limits['rate'], limits['burst']
+        if cost > burst:
+            metrics.counter(f'rate_limit.limited.{role}').inc()
+            raise RateLimitExceeded(f'Request cost {cost} exceeds the {role} burst limit of {burst}',
+                                    math.ceil(burst / rate))
+        
+        allowed, tokens = self._get_store().take(f'{role}:{user_id}', rate, burst, self._clock(), cost)
+        if not allowed:
+            metrics.counter(f'rate_limit.limited.{role}').inc()
+            retry_after = max(1, math.ceil((cost - tokens) / rate))
+            raise RateLimitExceeded('Rate limit exceeded, please slow down', retry_after)
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,63 @@
+"""
+Literal runs a regex requires, for prefiltering rows with instr() before the
+regex itself runs. This walks the parse tree of the re module's own parser,
+which is an internal module: re._parser since Python 3.11, sre_parse before.
+Without a usable parser nothing is prefiltered and every row reaches the regex.
+"""
+
+import re
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+    PARSER_AVAILABLE = True
+except ImportError:
+    try:
+        import sre_parse
+        import sre_constants
+        PARSER_AVAILABLE = True
+    except ImportError:
+        PARSER_AVAILABLE = False
+
+def required_literals(pattern):
+    """
+    Literal runs every match of `pattern` must contain, e.g. ['git pu',
+    ' --force'] for ^git (push|pull) --force. Alternations, classes,
+    optional parts and case-insensitive sections end a run; an empty list
+    means nothing is required.
+    """
+    if not PARSER_AVAILABLE:
+        return []
+    runs, current = [], []
+    
+    def flush():
+        if current:
+            runs.append(''.join(current))
+            current.clear()
+    
+    def walk(items):
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                current.append(chr(av))
+            elif op is sre_constants.AT:
+                # Zero-width anchors do not separate the characters around them
+                continue
+            elif op is sre_constants.SUBPATTERN and not av[1] & re.IGNORECASE:
+                walk(av[3])
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+                # At least one copy is required, but not next to its neighbours
+                flush()
+                walk(av[2])
+                flush()
+            else:
+                flush()
+    
+    try:
+        parsed = sre_parse.parse(pattern)
+        if parsed.state.flags & re.IGNORECASE:
+            return []
+        walk(parsed)
+    except (AttributeError, IndexError, TypeError, ValueError):
+        # A parse tree shaped differently than expected only costs the prefilter
+        return []
+    flush()
+    return runs
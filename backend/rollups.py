@@ -0,0 +1,269 @@
+"""
+Rollups of the commands table behind /api/analytics and its timeseries.
+
+Each rollup table holds one row per (time bucket, dimensions) with running
+totals. Triggers on `commands` add a row's contribution when it is inserted,
+move it when a rolled-up column changes and take it back when it is deleted,
+so dashboards read a handful of rows however long the history is. Buckets
+are UTC, the same clock CURRENT_TIMESTAMP and DATE('now') use. The minute
+series only keeps TIMESERIES_MINUTE_RETENTION_MINUTES of history; older
+ranges are read from the hour and day series.
+"""
+
+from datetime import datetime, timedelta
+from config import Config
+
+# Rollup table -> (key columns, label columns); key and label values are read from a commands row.
+# The first key is the time bucket.
+ROLLUPS = {
+    'command_rollup_status': (('day', 'status'), ()),
+    'command_rollup_users': (('day', 'user_id'), ()),
+    'command_rollup_fingerprints': (('day', 'command_key', 'status'), ('command_template', 'command_text', 'fingerprint')),
+    'command_series_minute': (('minute', 'status', 'user_id', 'rule_id', 'command_key'), ()),
+    'command_series_hour': (('hour', 'status', 'user_id', 'rule_id', 'command_key'), ()),
+    'command_series_day': (('day', 'status', 'user_id', 'rule_id', 'command_key'), ()),
+}
+# Rows from before fingerprinting are grouped by their exact text; rule 0 is "no rule matched"
+EXPRESSIONS = {
+    'minute': "strftime('%Y-%m-%d %H:%M:00', {row}.created_at)",
+    'hour': "strftime('%Y-%m-%d %H:00:00', {row}.created_at)",
+    'day': 'DATE({row}.created_at)',
+    'status': '{row}.status',
+    'user_id': '{row}.user_id',
+    'rule_id': 'COALESCE({row}.matched_rule_id, 0)',
+    'command_key': 'COALESCE({row}.fingerprint, {row}.command_text)',
+    'command_template': 'COALESCE({row}.command_template, {row}.command_text)',
+    'command_text': '{row}.command_text',
+    'fingerprint': '{row}.fingerprint',
+    'credits': 'COALESCE({row}.credits_deducted, 0)',
+}
+INTEGER_COLUMNS = ('user_id', 'rule_id')
+# An update touching any of these moves the row between rollup rows
+ROLLED_UP_COLUMNS = ('user_id', 'status', 'matched_rule_id', 'credits_deducted', 'created_at',
+                     'command_template', 'fingerprint')
+
+# Timeseries resolutions, finest first: bucket length and series table
+RESOLUTIONS = {
+    'minute': (timedelta(minutes=1), 'command_series_minute'),
+    'hour': (timedelta(hours=1), 'command_series_hour'),
+    'day': (timedelta(days=1), 'command_series_day'),
+}
+# ?group_by= dimension -> series column
+DIMENSIONS = {
+    'status': 'status',
+    'user': 'user_id',
+    'rule': 'rule_id',
+    'fingerprint': 'command_key',
+}
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def expression(column, row):
+    return EXPRESSIONS[column].format(row=row)
+
+def add_statements(row):
+    """Statements adding one commands row (NEW or OLD) to every rollup"""
+    statements = []
+    for table, (keys, labels) in ROLLUPS.items():
+        columns = ', '.join(keys + labels)
+        values = ', '.join(expression(column, row) for column in keys + labels)
+        statements.append(f'''
+            INSERT INTO {table} ({columns}, commands, credits) VALUES ({values}, 1, {expression('credits', row)})
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+                commands = commands + excluded.commands, credits = credits + excluded.credits;
+        ''')
+    return statements
+
+def remove_statements(row):
+    """Statements taking one commands row back out of every rollup; emptied rows are dropped"""
+    statements = []
+    for table, (keys, _) in ROLLUPS.items():
+        match = ' AND '.join(f'{key} = {expression(key, row)}' for key in keys)
+        statements.append(f'''
+            UPDATE {table} SET commands = commands - 1, credits = credits - {expression('credits', row)}
+            WHERE {match};
+        ''')
+        statements.append(f'DELETE FROM {table} WHERE {match} AND commands <= 0;')
+    return statements
+
+def replace_trigger(cursor, name, sql):
+    """
+    Create a trigger, replacing an older definition of it. init_db runs for
+    every Database(), so the trigger is only dropped when its SQL changed.
+    """
+    sql = sql.strip()
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))
+    existing = cursor.fetchone()
+    if existing and existing[0] == sql:
+        return
+    cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    cursor.execute(sql)
+
+def create_rollups(cursor):
+    """
+    Create the rollup tables and the triggers maintaining them. Newly created
+    tables are filled from the existing rows. Triggers are (re)created here
+    because a table rebuild drops them.
+    """
+    created = False
+    for table, (keys, labels) in ROLLUPS.items():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        created = created or not cursor.fetchone()
+        columns = ''.join(f"{column} {'INTEGER' if column in INTEGER_COLUMNS else 'TEXT'}, " for column in keys + labels)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {columns}
+                commands INTEGER NOT NULL DEFAULT 0,
+                credits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({', '.join(keys)})
+            ) WITHOUT ROWID
+        ''')
+    # Bumped per day by every change to that day's rollups; timeseries ETags are derived
+    # from the days a range covers, so writes to today leave cached history valid
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS command_rollup_versions (
+            day TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    
+    def bump(row):
+        return f'''
+            INSERT INTO command_rollup_versions (day, version) VALUES (DATE({row}.created_at), 1)
+            ON CONFLICT (day) DO UPDATE SET version = version + 1;
+        '''
+    replace_trigger(cursor, 'trg_command_rollups_insert', f'''
+        CREATE TRIGGER trg_command_rollups_insert AFTER INSERT ON commands
+        BEGIN
+            {''.join(add_statements('NEW'))}
+            {bump('NEW')}
+        END
+    ''')
+    replace_trigger(cursor, 'trg_command_rollups_delete', f'''
+        CREATE TRIGGER trg_command_rollups_delete AFTER DELETE ON commands
+        BEGIN
+            {''.join(remove_statements('OLD'))}
+            {bump('OLD')}
+        END
+    ''')
+    replace_trigger(cursor, 'trg_command_rollups_update', f'''
+        CREATE TRIGGER trg_command_rollups_update AFTER UPDATE OF {', '.join(ROLLED_UP_COLUMNS)} ON commands
+        BEGIN
+            {''.join(remove_statements('OLD'))}
+            {''.join(add_statements('NEW'))}
+            {bump('OLD')}
+            {bump('NEW')}
+        END
+    ''')
+    # Superseded by the per-day versions
+    cursor.execute('DROP TABLE IF EXISTS command_rollup_version')
+    if created:
+        rebuild_rollups(cursor)
+
+def rebuild_rollups(cursor, since=None):
+    """
+    Recompute the rollups from the commands table, for every day or only for
+    days on or after `since` ('YYYY-MM-DD'). Runs inside the caller's
+    transaction; returns the number of commands rolled up.
+    """
+    created_filter = 'WHERE created_at >= ?' if since else ''
+    params = (since,) if since else ()
+    for table, (keys, labels) in ROLLUPS.items():
+        # Every bucket value starts with its date, so it compares against `since` as text
+        bucket_filter = f'WHERE {keys[0]} >= ?' if since else ''
+        cursor.execute(f'DELETE FROM {table} {bucket_filter}', params)
+        grouped = ', '.join(expression(key, 'c') for key in keys)
+        labelled = ''.join(f'MIN({expression(label, "c")}), ' for label in labels)
+        cursor.execute(f'''
+            INSERT INTO {table} ({', '.join(keys + labels)}, commands, credits)
+            SELECT {grouped}, {labelled}COUNT(*), SUM({expression('credits', 'c')})
+            FROM commands c {created_filter}
+            GROUP BY {grouped}
+        ''', params)
+    prune_minute_series(cursor)
+    cursor.execute(f"UPDATE command_rollup_versions SET version = version + 1 {'WHERE day >= ?' if since else ''}",
+                   params)
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO command_rollup_versions (day, version)
+        SELECT DISTINCT DATE(created_at), 1 FROM commands {created_filter}
+    ''', params)
+    cursor.execute(f"SELECT SUM(commands) FROM command_rollup_status {'WHERE day >= ?' if since else ''}", params)
+    return cursor.fetchone()[0] or 0
+
+def minute_series_cutoff(now=None):
+    """Start of the oldest minute bucket the minute series keeps"""
+    minute = RESOLUTIONS['minute'][0]
+    return floor_time(now or datetime.utcnow(), minute) - minute * Config.TIMESERIES_MINUTE_RETENTION_MINUTES
+
+def prune_minute_series(cursor, now=None):
+    """
+    Drop minute buckets older than the retention window; the hour and day
+    series keep their totals. Reads never reach past the cutoff (see
+    series_range), so no answer changes. Returns the number of rows deleted.
+    """
+    cutoff = minute_series_cutoff(now).strftime(TIMESTAMP_FORMAT)
+    cursor.execute('DELETE FROM command_series_minute WHERE minute < ?', (cutoff,))
+    return cursor.rowcount
+
+def floor_time(moment, step):
+    """Start of the `step`-long bucket holding `moment`"""
+    return datetime.min + (moment - datetime.min) // step * step
+
+def series_range(start, end, bucket, now=None):
+    """
+    Resolve a timeseries request to (start, end, resolution): the [start, end)
+    range as 'YYYY-MM-DD HH:MM:SS' and the series to read it from. A missing
+    end is the end of the current bucket and a missing start is
+    TIMESERIES_DEFAULT_BUCKETS buckets earlier. Bounds are widened to whole
+    minutes, the finest resolution kept, and the coarsest resolution no longer
+    than `bucket` that both bounds fall on is chosen: a month of day buckets
+    reads the day series, the same month from noon reads the hour series.
+    Ranges reaching past the minute series' retention are widened to whole
+    hours. Raises ValueError on a bad bucket, an empty or oversized range,
+    or minute buckets older than the retention.
+    """
+    if bucket not in RESOLUTIONS:
+        raise ValueError(f"bucket must be one of: {', '.join(RESOLUTIONS)}")
+    now = now or datetime.utcnow()
+    step = RESOLUTIONS[bucket][0]
+    minute = RESOLUTIONS['minute'][0]
+    if end:
+        end = datetime.strptime(end, TIMESTAMP_FORMAT)
+    else:
+        end = floor_time(now, step) + step
+    if start:
+        start = datetime.strptime(start, TIMESTAMP_FORMAT)
+    else:
+        start = end - step * Config.TIMESERIES_DEFAULT_BUCKETS
+    start = floor_time(start, minute)
+    if floor_time(end, minute) != end:
+        end = floor_time(end, minute) + minute
+    if start < minute_series_cutoff(now):
+        if bucket == 'minute':
+            raise ValueError(f'minute buckets are only kept for the last '
+                             f'{Config.TIMESERIES_MINUTE_RETENTION_MINUTES} minutes')
+        hour = RESOLUTIONS['hour'][0]
+        start = floor_time(start, hour)
+        if floor_time(end, hour) != end:
+            end = floor_time(end, hour) + hour
+    if start >= end:
+        raise ValueError('from must be earlier than to')
+    if (end - start) / step > Config.TIMESERIES_MAX_BUCKETS:
+        raise ValueError(f'Range spans more than {Config.TIMESERIES_MAX_BUCKETS} {bucket} buckets')
+    
+    resolution = 'minute'
+    for name, (length, _) in RESOLUTIONS.items():
+        if length <= step and floor_time(start, length) == start and floor_time(end, length) == end:
+            resolution = name
+    return start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT), resolution
+
+def bucket_expression(resolution, bucket):
+    """SQL truncating the `resolution` series' time column to the start of its `bucket`"""
+    return {
+        'minute': f"substr({resolution}, 1, 16) || ':00'",
+        'hour': f"substr({resolution}, 1, 13) || ':00:00'",
+        'day': f"substr({resolution}, 1, 10) || ' 00:00:00'",
+    }[bucket]
+
+def bucket_bound(resolution, timestamp):
+    """A 'YYYY-MM-DD HH:MM:SS' bound in the text form of the `resolution` series' time column"""
+    return timestamp[:10] if resolution == 'day' else timestamp
@@ -0,0 +1,80 @@
+import heapq
+import itertools
+import time
+from config import Config
+from metrics import registry as metrics
+
+# Priority classes, most urgent first; weights come from Config.SCHEDULER_CLASS_WEIGHTS
+APPROVED_CLASS = 'approved'
+ADMIN_CLASS = 'admin'
+STANDARD_CLASS = 'standard'
+LOW_CLASS = 'low'
+PRIORITY_CLASSES = (APPROVED_CLASS, ADMIN_CLASS, STANDARD_CLASS, LOW_CLASS)
+
+def priority_class(role, risk_score=0, approved=False):
+    """Scheduling class for a command from who submitted it and how risky the model thought it was"""
+    if approved:
+        return APPROVED_CLASS
+    if role == 'admin':
+        return ADMIN_CLASS
+    if (risk_score or 0) >= Config.SCHEDULER_LOW_PRIORITY_RISK_SCORE:
+        return LOW_CLASS
+    return STANDARD_CLASS
+
+class FairScheduler:
+    """
+    Weighted fair queuing across users. Each job gets a virtual finish tag
+    max(virtual_time, user's last tag) + 1 / class weight, so a user flooding
+    the queue only pushes their own jobs back and heavier classes are served
+    proportionally more often. Aging subtracts waited_seconds / aging_seconds
+    from the tag, which orders jobs exactly like tag + enqueued_at /
+    aging_seconds, so the heap key is fixed at push time.
+    
+    Not thread-safe on its own; the executor calls it under its lock.
+    """
+    def __init__(self, weights=None, aging_seconds=None, clock=time.monotonic):
+        self.weights = weights or Config.SCHEDULER_CLASS_WEIGHTS
+        self.aging_seconds = aging_seconds or Config.SCHEDULER_AGING_SECONDS
+        self._clock = clock
+        self._heap = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_tag = {}
+        self._queued = {name: 0 for name in PRIORITY_CLASSES}
+    
+    def __len__(self):
+        return len(self._heap)
+    
+    def push(self, job):
+        now = self._clock()
+        job.enqueued_at = now
+        job_class = job.priority_class if job.priority_class in self.weights else STANDARD_CLASS
+        tag = max(self._virtual_time, self._last_tag.get(job.user_id, 0.0)) + 1.0 / self.weights[job_class]
+        self._last_tag[job.user_id] = tag
+        job.virtual_tag = tag
+        heapq.heappush(self._heap, (tag + now / self.aging_seconds, next(self._sequence), job))
+        self._queued[job_class] = self._queued.get(job_class, 0) + 1
+    
+    def pop(self, eligible=lambda job: True):
+        """Lowest-tag job that `eligible` accepts, or None"""
+        skipped = []
+        job = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if eligible(entry[2]):
+                job = entry[2]
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        if job is None:
+            return None
+        
+        self._virtual_time = max(self._virtual_time, job.virtual_tag)
+        job_class = job.priority_class if job.priority_class in self.weights else STANDARD_CLASS
+        self._queued[job_class] -= 1
+        metrics.histogram(f'scheduler.queue_wait_ms.{job_class}').observe((self._clock() - job.enqueued_at) * 1000)
+        return job
+    
+    def snapshot(self):
+        return {'queued': len(self._heap), 'queued_by_class': dict(self._queued)}
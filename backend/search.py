@@ -0,0 +1,73 @@
+import re
+
+# Full-text indexes: FTS5 table -> (content table, indexed columns)
+SEARCH_INDEXES = {
+    'commands_fts': ('commands', ('command_text', 'ai_analysis')),
+    'audit_logs_fts': ('audit_logs', ('details',)),
+}
+# snippet() markers around matched tokens; clients escape the text, then swap these for highlighting
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+QUERY_TERM = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+
+def fts_query(text):
+    """
+    Search box text -> FTS5 MATCH expression. Words must all match (AND),
+    "double quoted" text is a phrase, and a trailing * makes a prefix query.
+    Every term is passed to FTS5 as a quoted string, so operators and
+    punctuation in the input (rm -rf, a|b, NEAR) are searched for, never
+    parsed as query syntax. Raises ValueError if nothing is left to search.
+    """
+    terms = []
+    for match in QUERY_TERM.finditer(text):
+        phrase, phrase_prefix, word = match.groups()
+        if word is not None:
+            prefix = word.endswith('*')
+            phrase, phrase_prefix = word.rstrip('*'), '*' if prefix else ''
+        if not re.search(r'\w', phrase):
+            continue
+        terms.append('"' + phrase.replace('"', '""') + '"' + phrase_prefix)
+    if not terms:
+        raise ValueError('Search query must contain at least one word')
+    return ' '.join(terms)
+
+def create_search_indexes(cursor):
+    """
+    Create the FTS5 tables as external-content indexes over their tables
+    (only tokens are stored; rows are read from the content table), plus the
+    triggers that keep them in step with every insert, update and delete.
+    A newly created index is filled from the existing rows. Triggers are
+    (re)created on every start because a table rebuild drops them.
+    """
+    for fts_table, (table, columns) in SEARCH_INDEXES.items():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,))
+        exists = cursor.fetchone()
+        names = ', '.join(columns)
+        new_values = ', '.join(f'NEW.{column}' for column in columns)
+        old_values = ', '.join(f'OLD.{column}' for column in columns)
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table}
+            USING fts5({names}, content='{table}', content_rowid='id')
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {fts_table} (rowid, {names}) VALUES (NEW.id, {new_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {names}) VALUES ('delete', OLD.id, {old_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE OF {names} ON {table}
+            BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {names}) VALUES ('delete', OLD.id, {old_values});
+                INSERT INTO {fts_table} (rowid, {names}) VALUES (NEW.id, {new_values});
+            END
+        ''')
+        if not exists:
+            cursor.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
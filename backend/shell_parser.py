@@ -0,0 +1,246 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+from config import Config
+
+LEXER = re.compile(r'''
+    (?P<space>[ \t\r]+)
+  | (?P<newline>\n)
+  | (?P<dquote>"(?:\\.|[^"\\])*"?)
+  | (?P<squote>'[^']*'?)
+  | (?P<subst>\$\(|<\(|>\()
+  | (?P<backtick>`)
+  | (?P<redir>\d*(?:&>>|&>|>>|>&|>\||<<<|<<-|<<|<&|<>|>|<))
+  | (?P<op>\|\||&&|;;|\|&|[|;&()])
+  | (?P<comment>\#[^\n]*)
+  | (?P<word>(?:\\.|\$(?!\()|[^\s|;&<>()'"`\\$])+)
+  | (?P<other>.)
+''', re.VERBOSE | re.DOTALL)
+
+ESCAPE = re.compile(r'\\(.)', re.DOTALL)
+CLOSED_QUOTE = {
+    'squote': re.compile(r"'[^']*'"),
+    'dquote': re.compile(r'"(?:\\.|[^"\\])*"', re.DOTALL)
+}
+ASSIGNMENT = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=')
+
+LIST_OPERATORS = frozenset([';', ';;', '&&', '||', '&'])
+PIPE_OPERATORS = frozenset(['|', '|&'])
+
+def normalize_redirection(op):
+    """Collapse fd numbers and variants to '>', '>>' or '<' (the classifier's vocabulary)"""
+    op = op.lstrip('0123456789')
+    if op.endswith('>>'):
+        return '>>'
+    if op.startswith('<'):
+        return '<'
+    return '>'
+
+class Segment(namedtuple('Segment', ['argv', 'redirects', 'text'])):
+    """One simple command: argv words, (operator, target) redirections and its source text"""
+    __slots__ = ()
+    
+    @property
+    def argv0(self):
+        """Program name (basename, leading VAR=value assignments skipped), or None"""
+        for word in self.argv:
+            if not ASSIGNMENT.match(word):
+                return word.rsplit('/', 1)[-1]
+        return None
+
+# operator joins the pipeline to the one before it (None for the first)
+Pipeline = namedtuple('Pipeline', ['segments', 'operator', 'text'])
+
+class ParsedCommand(namedtuple('ParsedCommand', ['text', 'pipelines', 'substitutions', 'tokens', 'complete'])):
+    """
+    Compact AST of a command line: the top-level list of pipelines plus the
+    nested commands found in $(...), `...`, <(...) and (...) subshells.
+    `tokens` is the flat token stream (quotes stripped, operators kept) used
+    by the risk classifier; `complete` is False when quotes or brackets are
+    left open.
+    """
+    __slots__ = ()
+    
+    @property
+    def segments(self):
+        """Every simple command, including those inside substitutions"""
+        segments = [segment for pipeline in self.pipelines for segment in pipeline.segments]
+        for nested in self.substitutions:
+            segments.extend(nested.segments)
+        return tuple(segments)
+    
+    @property
+    def programs(self):
+        return tuple(segment.argv0 for segment in self.segments if segment.argv0)
+    
+    @property
+    def units(self):
+        """Source texts rules are evaluated against: the whole line, then each pipeline and segment"""
+        units = [self.text]
+        pipelines = [pipeline for pipeline in self.pipelines if pipeline.text]
+        if len(pipelines) > 1:
+            units.extend(pipeline.text for pipeline in pipelines)
+        for pipeline in self.pipelines:
+            if len(pipeline.segments) > 1 or len(pipelines) > 1:
+                units.extend(segment.text for segment in pipeline.segments if segment.text)
+        for nested in self.substitutions:
+            units.extend(nested.units)
+        return tuple(dict.fromkeys(units))
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.lexemes = [(match.lastgroup, match.group(), match.start(), match.end())
+                        for match in LEXER.finditer(text)]
+        self.position = 0
+        self.tokens = []
+        self.complete = True
+    
+    def parse(self, closer=None, start=0):
+        """Parse a command list up to `closer` (')' or '`'), returning a ParsedCommand"""
+        pipelines = []
+        substitutions = []
+        segments = []
+        argv, redirects = [], []
+        span = [None, None]
+        pipeline_span = [None, None]
+        operator = None
+        
+        def extend(span_, lexeme_start, lexeme_end):
+            if span_[0] is None:
+                span_[0] = lexeme_start
+            span_[1] = lexeme_end
+        
+        def finish_segment():
+            nonlocal argv, redirects, span
+            if argv or redirects:
+                segments.append(Segment(tuple(argv), tuple(redirects), self.text[span[0]:span[1]]))
+            argv, redirects, span = [], [], [None, None]
+        
+        def finish_pipeline(next_operator):
+            nonlocal segments, operator, pipeline_span
+            finish_segment()
+            if segments:
+                pipelines.append(Pipeline(tuple(segments), operator,
+                                          self.text[pipeline_span[0]:pipeline_span[1]]))
+            segments, pipeline_span = [], [None, None]
+            operator = next_operator
+        
+        end = len(self.text)
+        while self.position < len(self.lexemes):
+            kind, value, lexeme_start, lexeme_end = self.lexemes[self.position]
+            self.position += 1
+            
+            if kind in ('space', 'comment'):
+                continue
+            if closer and ((kind == 'op' and value == ')' and closer == ')') or (kind == 'backtick' and closer == '`')):
+                end = lexeme_start
+                break
+            if kind == 'newline' or (kind == 'op' and value in LIST_OPERATORS):
+                value = ';' if kind == 'newline' or value == ';;' else value
+                self.tokens.append(value)
+                finish_pipeline(value)
+                continue
+            if kind == 'op' and value in PIPE_OPERATORS:
+                self.tokens.append('|')
+                finish_segment()
+                continue
+            
+            extend(span, lexeme_start, lexeme_end)
+            extend(pipeline_span, lexeme_start, lexeme_end)
+            if kind == 'op' and value == '(':
+                self.tokens.append('(')
+                substitutions.append(self.parse(')', lexeme_end))
+                self.tokens.append(')')
+                extend(span, lexeme_start, self._consumed_end())
+                extend(pipeline_span, lexeme_start, self._consumed_end())
+            elif kind == 'op':
+                # Stray ')' - keep it visible to the classifier
+                self.tokens.append(value)
+            elif kind in ('subst', 'backtick'):
+                self.tokens.append('`' if kind == 'backtick' else '$(')
+                nested = self.parse('`' if kind == 'backtick' else ')', lexeme_end)
+                substitutions.append(nested)
+                self.tokens.append('`' if kind == 'backtick' else ')')
+                argv.append(f'{value}{nested.text}{"`" if kind == "backtick" else ")"}')
+                extend(span, lexeme_start, self._consumed_end())
+                extend(pipeline_span, lexeme_start, self._consumed_end())
+            elif kind == 'redir':
+                normalized = normalize_redirection(value)
+                self.tokens.append(normalized)
+                target = self._redirection_target(substitutions)
+                redirects.append((value, target))
+                extend(span, lexeme_start, self._consumed_end())
+                extend(pipeline_span, lexeme_start, self._consumed_end())
+            else:
+                argv.append(self._word(kind, value, substitutions))
+        else:
+            if closer:
+                self.complete = False
+        
+        finish_pipeline(None)
+        return ParsedCommand(self.text[start:end].strip(), tuple(pipelines), tuple(substitutions),
+                             (), self.complete)
+    
+    def _consumed_end(self):
+        return self.lexemes[self.position - 1][3] if self.position else 0
+    
+    def _redirection_target(self, substitutions):
+        while self.position < len(self.lexemes) and self.lexemes[self.position][0] == 'space':
+            self.position += 1
+        if self.position >= len(self.lexemes):
+            return ''
+        kind, value, _, _ = self.lexemes[self.position]
+        if kind not in ('word', 'dquote', 'squote'):
+            return ''
+        self.position += 1
+        return self._word(kind, value, substitutions)
+    
+    def _word(self, kind, value, substitutions):
+        if kind in ('squote', 'dquote'):
+            closed = CLOSED_QUOTE[kind].fullmatch(value) is not None
+            self.complete = self.complete and closed
+            word = value[1:-1] if closed else value[1:]
+        if kind == 'dquote':
+            if '$(' in word or '`' in word:
+                # Substitutions still run inside double quotes
+                self.tokens.append(word)
+                for nested in _quoted_substitutions(word):
+                    substitutions.append(nested)
+                    self.tokens.append('$(')
+                    self.tokens.extend(nested.tokens)
+                    self.tokens.append(')')
+                return word
+            word = ESCAPE.sub(r'\1', word)
+        elif kind != 'squote':
+            word = ESCAPE.sub(r'\1', value) if '\\' in value else value
+        self.tokens.append(word)
+        return word
+
+def _quoted_substitutions(word):
+    """Parse each $(...) / `...` found inside a double-quoted string"""
+    found = []
+    index = 0
+    while index < len(word):
+        if word.startswith('$(', index):
+            depth, cursor = 1, index + 2
+            while cursor < len(word) and depth:
+                depth += {'(': 1, ')': -1}.get(word[cursor], 0)
+                cursor += 1
+            found.append(parse_command(word[index + 2:cursor - 1] if not depth else word[index + 2:]))
+            index = cursor
+        elif word[index] == '`':
+            cursor = word.find('`', index + 1)
+            cursor = len(word) if cursor == -1 else cursor
+            found.append(parse_command(word[index + 1:cursor]))
+            index = cursor + 1
+        else:
+            index += 1
+    return found
+
+@lru_cache(maxsize=Config.SHELL_PARSE_CACHE_SIZE)
+def parse_command(command_text):
+    """Parse a command line into a ParsedCommand (cached per command text)"""
+    parser = _Parser(command_text)
+    parsed = parser.parse()
+    return parsed._replace(tokens=tuple(parser.tokens), complete=parser.complete)
@@ -0,0 +1,180 @@
+import json
+import random
+import threading
+import time
+import zlib
+from array import array
+from config import Config
+from metrics import registry as metrics
+from models import Database, AIAnalyzer
+from shell_parser import parse_command
+from fingerprint import fingerprint_command
+
+# Mersenne prime for the universal hash family h(x) = (a * x + b) mod P
+MERSENNE_PRIME = (1 << 61) - 1
+
+def shingles(command_text):
+    """
+    Features compared between commands: the raw tokens plus 2- and 3-grams of
+    the fingerprint template, so commands that differ only in a path or host
+    share all their structural shingles.
+    """
+    features = {f'w:{token}' for token in parse_command(command_text).tokens}
+    words = fingerprint_command(command_text).template.split(' ')
+    for size in (2, 3):
+        for start in range(len(words) - size + 1):
+            features.add('t:' + ' '.join(words[start:start + size]))
+    if len(words) < 2:
+        features.add('t:' + words[0])
+    return features
+
+class SimilarityIndex:
+    """
+    Near-duplicate lookup over commands the model has already judged.
+    Each command becomes a MinHash signature of its shingles; signatures are
+    split into bands and bucketed (LSH), so a lookup only compares against
+    commands sharing at least one band. Signatures are kept in the
+    similarity_signatures table and loaded, without re-hashing, the first
+    time a database is used.
+    """
+    def __init__(self, num_perm=None, bands=None, threshold=None, max_entries=None, seed=None):
+        self.num_perm = num_perm or Config.SIMILARITY_NUM_PERM
+        self.bands = bands or Config.SIMILARITY_BANDS
+        if self.num_perm % self.bands:
+            raise ValueError('SIMILARITY_NUM_PERM must be a multiple of SIMILARITY_BANDS')
+        self.rows = self.num_perm // self.bands
+        self.threshold = threshold or Config.SIMILARITY_THRESHOLD
+        self.max_entries = max_entries or Config.SIMILARITY_MAX_ENTRIES
+        # A fixed seed keeps stored signatures valid across restarts
+        rng = random.Random(Config.SIMILARITY_SEED if seed is None else seed)
+        self._permutations = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+                              for _ in range(self.num_perm)]
+        self._lock = threading.Lock()
+        self._states = {}
+    
+    def signature(self, command_text):
+        hashed = [zlib.crc32(feature.encode('utf-8')) for feature in shingles(command_text)]
+        return array('Q', [min((a * value + b) % MERSENNE_PRIME for value in hashed)
+                           for a, b in self._permutations])
+    
+    def add(self, command_text, verdict):
+        """Index a model verdict (AIAnalyzer verdict listener)"""
+        signature = self.signature(command_text)
+        stored_verdict = {key: verdict[key] for key in
+                          ('is_dangerous', 'risk_score', 'analysis', 'requires_approval', 'confidence')}
+        database = Database()
+        conn = database.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM similarity_signatures WHERE command_text = ?', (command_text,))
+            cursor.execute(
+                'INSERT INTO similarity_signatures (command_text, signature, verdict, created_at) VALUES (?, ?, ?, ?)',
+                (command_text, signature.tobytes(), json.dumps(stored_verdict), time.time())
+            )
+            entry_id = cursor.lastrowid
+            conn.commit()
+        finally:
+            conn.close()
+        
+        with self._lock:
+            state = self._state(database)
+            previous = state['by_text'].pop(command_text, None)
+            if previous is not None:
+                self._remove(state, previous)
+            self._insert(state, entry_id, command_text, signature, stored_verdict)
+            evicted = []
+            while len(state['entries']) > self.max_entries:
+                # Ids only grow, so insertion order is age order
+                oldest = next(iter(state['entries']))
+                evicted.append(oldest)
+                del state['by_text'][state['entries'][oldest][0]]
+                self._remove(state, oldest)
+        if evicted:
+            conn = database.get_connection()
+            conn.executemany('DELETE FROM similarity_signatures WHERE id = ?', [(entry,) for entry in evicted])
+            conn.commit()
+            conn.close()
+        metrics.counter('similarity.indexed').inc()
+    
+    def neighbors(self, command_text, limit=5, min_similarity=0.0):
+        """Indexed commands sharing an LSH bucket, most similar first (estimated Jaccard)"""
+        signature = self.signature(command_text)
+        database = Database()
+        with self._lock:
+            state = self._state(database)
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates.update(state['buckets'][band].get(key, ()))
+            scored = []
+            for entry_id in candidates:
+                text, other, verdict = state['entries'][entry_id]
+                if text == command_text:
+                    continue
+                similarity = sum(1 for mine, theirs in zip(signature, other) if mine == theirs) / self.num_perm
+                if similarity >= min_similarity:
+                    scored.append({'command_text': text, 'similarity': round(similarity, 3), 'verdict': verdict})
+        scored.sort(key=lambda neighbor: neighbor['similarity'], reverse=True)
+        return scored[:limit]
+    
+    def lookup(self, command_text):
+        """
+        Verdict of the closest indexed command above the threshold (AIAnalyzer
+        verdict provider). Only verdicts requiring approval are reused unless
+        SIMILARITY_REUSE_SAFE_VERDICTS is set: a near-duplicate of a risky
+        command is held for an admin, but a near-duplicate of a harmless one
+        still goes to the model.
+        """
+        for neighbor in self.neighbors(command_text, limit=5, min_similarity=self.threshold):
+            verdict = neighbor['verdict']
+            if verdict['requires_approval'] or Config.SIMILARITY_REUSE_SAFE_VERDICTS:
+                metrics.counter('similarity.reused').inc()
+                return dict(
+                    verdict,
+                    analysis=f"Similar to previously analyzed command `{neighbor['command_text']}` "
+                             f"({neighbor['similarity']:.0%} match): {verdict['analysis']}",
+                    source='similar',
+                    similar_to=neighbor['command_text'],
+                    similarity=neighbor['similarity']
+                )
+        return None
+    
+    def _band_keys(self, signature):
+        return [hash(tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+    
+    def _state(self, database):
+        # Called with self._lock held
+        state = self._states.get(database.db_path)
+        if state is None:
+            state = {'entries': {}, 'by_text': {}, 'buckets': [{} for _ in range(self.bands)]}
+            conn = database.get_connection()
+            rows = conn.execute('SELECT id, command_text, signature, verdict FROM similarity_signatures ORDER BY id').fetchall()
+            conn.close()
+            for row in rows:
+                signature = array('Q')
+                signature.frombytes(row['signature'])
+                if len(signature) != self.num_perm:
+                    # Written with different settings; re-indexed when the command is analyzed again
+                    continue
+                self._insert(state, row['id'], row['command_text'], signature, json.loads(row['verdict']))
+            self._states[database.db_path] = state
+        return state
+    
+    def _insert(self, state, entry_id, command_text, signature, verdict):
+        state['entries'][entry_id] = (command_text, signature, verdict)
+        state['by_text'][command_text] = entry_id
+        for band, key in enumerate(self._band_keys(signature)):
+            state['buckets'][band].setdefault(key, set()).add(entry_id)
+    
+    def _remove(self, state, entry_id):
+        _, signature, _ = state['entries'].pop(entry_id)
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = state['buckets'][band].get(key)
+            if bucket:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del state['buckets'][band][key]
+
+similarity_index = SimilarityIndex()
+if Config.SIMILARITY_ENABLED:
+    AIAnalyzer.verdict_providers.append(similarity_index.lookup)
+    AIAnalyzer.verdict_listeners.append(similarity_index.add)
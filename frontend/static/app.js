@@ -3,6 +3,9 @@ class CommandGateway {
         this.apiKey = localStorage.getItem('apiKey') || '';
         this.currentUser = null;
         this.socket = null;
+        // Pending approvals by command id, patched in place from server deltas
+        this.pendingApprovals = new Map();
+        this.pendingVersion = 0;
         this.stats = {
             commandsToday: 0,
             activeUsers: 0,
@@ -29,7 +32,13 @@ class CommandGateway {
         // Admin actions
         document.getElementById('create-user').addEventListener('click', () => this.createUser());
         document.getElementById('create-rule').addEventListener('click', () => this.createRule());
+        document.getElementById('bulk-approve').addEventListener('click', () => this.handleBulkApproval(true));
+        document.getElementById('bulk-reject').addEventListener('click', () => this.handleBulkApproval(false));
         document.getElementById('check-conflicts').addEventListener('click', () => this.checkRuleConflicts());
+        document.getElementById('test-history').addEventListener('click', () => this.testPatternAgainstHistory());
+        document.getElementById('audit-export').addEventListener('click', () => this.exportAuditLogs());
+        document.getElementById('audit-more').addEventListener('click', () => this.loadAuditLogs(true));
+        document.getElementById('history-more').addEventListener('click', () => this.loadCommandHistory(true));
         
         // Real-time regex validation
         document.getElementById('new-rule-pattern').addEventListener('input', (e) => {
@@ -46,6 +55,7 @@ class CommandGateway {
         
         // History search and export
         document.getElementById('history-search').addEventListener('input', (e) => this.filterHistory(e.target.value));
+        document.getElementById('audit-search').addEventListener('input', (e) => this.searchAuditLogs(e.target.value));
         document.getElementById('export-history').addEventListener('click', () => this.exportHistory());
         
         // Tabs
@@ -125,6 +135,8 @@ class CommandGateway {
     logout() {
         this.apiKey = '';
         this.currentUser = null;
+        this.pendingApprovals.clear();
+        this.pendingVersion = 0;
         localStorage.removeItem('apiKey');
         document.getElementById('auth-section').style.display = 'block';
         document.getElementById('member-dashboard').style.display = 'none';
@@ -179,6 +191,88 @@ class CommandGateway {
         this.socket.on('approval_update', (data) => {
             this.handleApprovalUpdate(data);
         });
+
+        this.socket.on('approval_bulk_update', (data) => {
+            this.handleBulkApprovalUpdate(data);
+        });
+
+        this.socket.on('approvals_expired', (data) => {
+            this.showMessage(`⌛ ${data.command_ids.length} pending commands expired without approval`, 'info');
+            this.handlePendingDelta(data.delta);
+        });
+
+        this.socket.on('command_expired', (data) => {
+            this.showMessage(`⌛ Command expired without approval: ${data.command}`, 'info');
+            if (this.currentUser.role !== 'admin') {
+                this.loadCommandHistory();
+            }
+        });
+
+        this.socket.on('ai_analysis_chunk', (data) => {
+            this.appendAnalysisChunk(data);
+        });
+
+        this.socket.on('ai_analysis_complete', (data) => {
+            this.handleAnalysisComplete(data);
+        });
+
+        this.socket.on('command_output', (data) => {
+            this.appendCommandOutput(data);
+        });
+
+        this.socket.on('command_status', (data) => {
+            this.handleCommandStatus(data);
+        });
+    }
+
+    watchCommandOutput(commandId) {
+        this.runningCommandId = commandId;
+        document.getElementById('command-output-text').textContent = '';
+        document.getElementById('command-output-status').textContent = 'queued';
+        document.getElementById('command-output').style.display = 'block';
+    }
+
+    appendCommandOutput(data) {
+        if (data.command_id !== this.runningCommandId) return;
+        const textEl = document.getElementById('command-output-text');
+        textEl.textContent += data.chunk;
+        textEl.scrollTop = textEl.scrollHeight;
+    }
+
+    handleCommandStatus(data) {
+        if (data.command_id !== this.runningCommandId) return;
+        let statusText = data.status.toLowerCase().replace('_', ' ');
+        if (data.exit_code !== undefined && data.exit_code !== null) {
+            statusText += ` (exit code ${data.exit_code})`;
+        }
+        if (data.error) {
+            statusText += ` - ${data.error}`;
+        }
+        document.getElementById('command-output-status').textContent = statusText;
+        if (data.status !== 'RUNNING') {
+            this.runningCommandId = null;
+            this.loadCommandHistory();
+        }
+    }
+
+    appendAnalysisChunk(data) {
+        if (data.command_id !== this.streamingCommandId) return;
+        const textEl = document.getElementById('ai-stream-text');
+        textEl.textContent += data.chunk;
+        textEl.scrollTop = textEl.scrollHeight;
+    }
+
+    handleAnalysisComplete(data) {
+        if (data.command_id !== this.streamingCommandId) return;
+        this.streamingCommandId = null;
+        document.getElementById('ai-stream').style.display = 'none';
+
+        if (data.error) {
+            this.showMessage(`AI analysis failed: ${data.error}`, 'error');
+        } else {
+            this.showSubmissionResult(data);
+        }
+        this.loadCommandHistory();
     }
 
     handleRealtimeCommand(data) {
@@ -193,6 +287,7 @@ class CommandGateway {
         // Update display
         this.updateRealtimeStats();
         this.addLiveActivity(data);
+        this.handlePendingDelta(data.delta);
     }
 
     updateRealtimeStats() {
@@ -253,6 +348,7 @@ class CommandGateway {
                 
                 this.updateRealtimeStats();
                 this.renderAnalytics(analytics);
+                this.loadTrend();
             }
         } catch (error) {
             console.error('Failed to load analytics:', error);
@@ -260,6 +356,30 @@ class CommandGateway {
             this.stats.activeUsers = 1;
             this.updateRealtimeStats();
         }
+
+        this.loadAIHealth();
+    }
+
+    async loadAIHealth() {
+        try {
+            const response = await fetch('/api/ai/health', {
+                headers: { 'X-API-Key': this.apiKey }
+            });
+
+            if (response.ok) {
+                const health = await response.json();
+                const counters = health.counters || {};
+                const stateIcons = { CLOSED: '🟢', HALF_OPEN: '🟡', OPEN: '🔴' };
+
+                document.getElementById('ai-health').textContent =
+                    `${stateIcons[health.breaker.state] || ''} ${health.breaker.state}`;
+                document.getElementById('ai-health-details').textContent =
+                    `p95 ${health.latency_ms.p95}ms · ${counters['ai.model.timeouts'] || 0} timeouts · ` +
+                    `${counters['ai.model.errors'] || 0} errors`;
+            }
+        } catch (error) {
+            console.error('Failed to load AI health:', error);
+        }
     }
 
     renderAnalytics(analytics) {
@@ -282,11 +402,12 @@ class CommandGateway {
                     </div>
                 </div>
             </div>
+            <div id="analytics-trend" class="analytics-trend"></div>
             <div class="top-commands">
                 <h4>🔥 Most Used Commands</h4>
                 ${analytics.top_commands.slice(0, 5).map(cmd => `
                     <div class="command-stat">
-                        <code>${this.escapeHtml(cmd.command_text)}</code>
+                        <code>${this.escapeHtml(cmd.command_template || cmd.command_text)}</code>
                         <span class="command-count">${cmd.count}x</span>
                         <span class="command-status ${cmd.status.toLowerCase()}">${cmd.status}</span>
                     </div>
@@ -297,6 +418,38 @@ class CommandGateway {
         container.innerHTML = analyticsHtml;
     }
 
+    async loadTrend() {
+        // Commands per hour; an unchanged series is revalidated by ETag (304) rather than resent
+        try {
+            const response = await fetch('/api/analytics/timeseries?bucket=hour', {
+                headers: { 'X-API-Key': this.apiKey }
+            });
+            const container = document.getElementById('analytics-trend');
+            if (!response.ok || !container) return;
+
+            const series = await response.json();
+            const counts = new Map(series.points.map(point => [point.bucket, point.commands]));
+            const buckets = [];
+            for (let time = Date.parse(series.from.replace(' ', 'T') + 'Z');
+                 time < Date.parse(series.to.replace(' ', 'T') + 'Z'); time += 3600 * 1000) {
+                const bucket = new Date(time).toISOString().slice(0, 19).replace('T', ' ');
+                buckets.push([bucket, counts.get(bucket) || 0]);
+            }
+            const peak = Math.max(1, ...buckets.map(([, count]) => count));
+            container.innerHTML = `
+                <h4>📈 Commands per Hour</h4>
+                <div class="trend-bars">
+                    ${buckets.map(([bucket, count]) => `
+                        <span class="trend-bar" style="height: ${Math.round(100 * count / peak)}%"
+                              title="${bucket} UTC: ${count}"></span>
+                    `).join('')}
+                </div>
+            `;
+        } catch (error) {
+            console.error('Failed to load analytics trend:', error);
+        }
+    }
+
     calculateSuccessRate(stats) {
         const total = stats.total_commands || 0;
         const executed = stats.executed_commands || 0;
@@ -304,14 +457,57 @@ class CommandGateway {
     }
 
     filterHistory(searchTerm) {
-        const historyItems = document.querySelectorAll('.history-item');
-        const term = searchTerm.toLowerCase();
+        // Server-side full-text search (debounced); an empty box shows the loaded history again
+        clearTimeout(this.historySearchTimer);
+        const term = searchTerm.trim();
+        if (!term) {
+            this.renderCommandHistory(this.allCommands || []);
+            document.getElementById('history-more').style.display = this.historyCursor ? 'block' : 'none';
+            return;
+        }
 
-        historyItems.forEach(item => {
-            const commandText = item.querySelector('.command-text').textContent.toLowerCase();
-            const isVisible = commandText.includes(term) || term === '';
-            item.style.display = isVisible ? 'block' : 'none';
-        });
+        this.historySearchTimer = setTimeout(async () => {
+            try {
+                const response = await fetch(`/api/search/commands?q=${encodeURIComponent(term)}`, {
+                    headers: { 'X-API-Key': this.apiKey }
+                });
+                if (response.ok) {
+                    document.getElementById('history-more').style.display = 'none';
+                    this.renderCommandHistory(await response.json());
+                }
+            } catch (error) {
+                console.error('Failed to search command history:', error);
+            }
+        }, 250);
+    }
+
+    searchAuditLogs(searchTerm) {
+        clearTimeout(this.auditSearchTimer);
+        const term = searchTerm.trim();
+        if (!term) {
+            this.renderAuditLogs(this.auditLogs || []);
+            document.getElementById('audit-more').style.display = this.auditCursor ? 'block' : 'none';
+            return;
+        }
+
+        this.auditSearchTimer = setTimeout(async () => {
+            try {
+                const response = await fetch(`/api/search/audit-logs?q=${encodeURIComponent(term)}`, {
+                    headers: { 'X-API-Key': this.apiKey }
+                });
+                if (response.ok) {
+                    document.getElementById('audit-more').style.display = 'none';
+                    this.renderAuditLogs(await response.json());
+                }
+            } catch (error) {
+                console.error('Failed to search audit logs:', error);
+            }
+        }, 250);
+    }
+
+    highlight(snippet) {
+        // Search snippets mark matches with \x02 ... \x03; escape first, then mark up
+        return this.escapeHtml(snippet).replace(/\x02/g, '<mark>').replace(/\x03/g, '</mark>');
     }
 
     exportHistory() {
@@ -409,6 +605,52 @@ class CommandGateway {
         }
     }
 
+    async testPatternAgainstHistory() {
+        const pattern = document.getElementById('new-rule-pattern').value.trim();
+        const resultDiv = document.getElementById('history-matches');
+        if (!pattern) {
+            this.showMessage('Please enter a pattern first', 'error');
+            return;
+        }
+
+        resultDiv.innerHTML = '<div class="conflict-result"><h4>🧪 Searching command history...</h4></div>';
+        resultDiv.style.display = 'block';
+
+        try {
+            const response = await fetch('/api/commands/search-regex', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-API-Key': this.apiKey
+                },
+                body: JSON.stringify({ pattern, limit: 50 })
+            });
+
+            if (!response.ok) {
+                const error = await response.json();
+                resultDiv.innerHTML = `<div class="conflict-result"><h4>❌ ${this.escapeHtml(error.error)}</h4></div>`;
+                return;
+            }
+
+            // NDJSON: one line per matching command, summary last
+            const lines = (await response.text()).trim().split('\n').map(line => JSON.parse(line));
+            const summary = lines.pop();
+            resultDiv.innerHTML = `
+                <div class="conflict-result">
+                    <h4>🧪 ${summary.matched} past command${summary.matched === 1 ? '' : 's'} would match${summary.complete ? '' : ' (search stopped early)'}</h4>
+                    ${lines.map(cmd => `
+                        <div class="similar-command">
+                            <code>${this.escapeHtml(cmd.command_text)}</code>
+                            <span>${cmd.user_name || ''} · ${cmd.status}</span>
+                        </div>
+                    `).join('')}
+                </div>
+            `;
+        } catch (error) {
+            resultDiv.innerHTML = '<div class="conflict-result"><h4>❌ Failed to search command history</h4></div>';
+        }
+    }
+
     async checkRuleConflicts() {
         console.log('🔍 Check conflicts button clicked!'); // Debug log
         
@@ -542,21 +784,46 @@ class CommandGateway {
 
     async loadPendingApprovals() {
         try {
-            const response = await fetch('/api/pending-approvals', {
+            const response = await fetch(`/api/pending-approvals?since=${this.pendingVersion}`, {
                 headers: { 'X-API-Key': this.apiKey }
             });
 
             if (response.ok) {
-                const approvals = await response.json();
-                this.renderPendingApprovals(approvals);
+                this.applyPendingDelta(await response.json());
             }
         } catch (error) {
             console.error('Failed to load pending approvals:', error);
         }
     }
 
+    applyPendingDelta(delta) {
+        if (delta.reset) {
+            this.pendingApprovals.clear();
+        }
+        delta.upserts.forEach(cmd => this.pendingApprovals.set(cmd.id, cmd));
+        delta.removed.forEach(id => this.pendingApprovals.delete(id));
+        this.pendingVersion = delta.version;
+        this.renderPendingApprovals(Array.from(this.pendingApprovals.values()).sort((a, b) => a.id - b.id));
+    }
+
+    handlePendingDelta(delta) {
+        if (!delta) return;
+        if (delta.since === this.pendingVersion) {
+            this.applyPendingDelta(delta);
+            return;
+        }
+
+        // Missed an event; catch up from our own version if the list is on screen
+        const activeTab = document.querySelector('.tab-content.active');
+        if (activeTab && activeTab.id === 'approvals-tab') {
+            this.loadPendingApprovals();
+        }
+    }
+
     renderPendingApprovals(approvals) {
         const container = document.getElementById('pending-approvals');
+        const selected = new Set(Array.from(container.querySelectorAll('.approval-select:checked'))
+            .map(box => parseInt(box.value)));
         
         if (approvals.length === 0) {
             container.innerHTML = '<p>✅ No commands pending approval.</p>';
@@ -566,13 +833,27 @@ class CommandGateway {
         container.innerHTML = approvals.map(cmd => `
             <div class="approval-item" data-command-id="${cmd.id}">
                 <div class="approval-header">
-                    <div class="approval-user">👤 ${cmd.user_name}</div>
+                    <label class="approval-user">
+                        <input type="checkbox" class="approval-select" value="${cmd.id}" ${selected.has(cmd.id) ? 'checked' : ''}>
+                        👤 ${cmd.user_name}
+                    </label>
                     <div class="approval-time">${new Date(cmd.created_at).toLocaleString()}</div>
                 </div>
                 <div class="approval-command">${this.escapeHtml(cmd.command_text)}</div>
                 <div class="ai-analysis-full">
                     <strong>🤖 AI Analysis:</strong> ${cmd.ai_analysis}
                 </div>
+                ${(cmd.similar_commands || []).length ? `
+                    <div class="similar-commands">
+                        <strong>🔁 Similar past commands:</strong>
+                        ${cmd.similar_commands.map(similar => `
+                            <div class="similar-command">
+                                <code>${this.escapeHtml(similar.command_text)}</code>
+                                <span>${Math.round(similar.similarity * 100)}% match, risk ${similar.verdict.risk_score}/10</span>
+                            </div>
+                        `).join('')}
+                    </div>
+                ` : ''}
                 <div class="risk-indicator">
                     <span class="risk-score-badge risk-${this.getRiskLevel(cmd.ai_risk_score)}">
                         Risk Score: ${cmd.ai_risk_score}/10
@@ -651,15 +932,60 @@ class CommandGateway {
         }
     }
 
+    async handleBulkApproval(approved) {
+        const commandIds = Array.from(document.querySelectorAll('.approval-select:checked'))
+            .map(box => parseInt(box.value));
+        if (commandIds.length === 0) {
+            this.showMessage('Select at least one command', 'error');
+            return;
+        }
+
+        const reason = approved ?
+            prompt(`Optional reason for approving ${commandIds.length} commands:`) :
+            prompt(`Reason for rejecting ${commandIds.length} commands (required):`);
+
+        if (!approved && !reason) {
+            this.showMessage('Rejection reason is required', 'error');
+            return;
+        }
+
+        try {
+            const response = await fetch('/api/pending-approvals/bulk', {
+                method: 'POST',
+                headers: {
+                    'X-API-Key': this.apiKey,
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    approved: approved,
+                    command_ids: commandIds,
+                    reason: reason || ''
+                })
+            });
+
+            const result = await response.json();
+
+            if (response.ok) {
+                const action = approved ? 'approved' : 'rejected';
+                this.showMessage(`✅ ${result.total} commands ${action}`, 'success');
+                this.loadPendingApprovals();
+            } else {
+                this.showMessage(result.error || 'Failed to process approvals', 'error');
+            }
+        } catch (error) {
+            this.showMessage('Failed to process approvals', 'error');
+        }
+    }
+
+    handleBulkApprovalUpdate(data) {
+        this.showMessage(`🔐 Admin ${data.admin_name} ${data.approved ? 'approved' : 'rejected'} ${data.total} commands`, 'info');
+        this.handlePendingDelta(data.delta);
+    }
+
     handleApprovalUpdate(data) {
         // Handle real-time approval updates
         this.showMessage(`🔐 Admin ${data.admin_name} ${data.approved ? 'approved' : 'rejected'} a command`, 'info');
-        
-        // Refresh approvals if we're on that tab
-        const activeTab = document.querySelector('.tab-content.active');
-        if (activeTab && activeTab.id === 'approvals-tab') {
-            this.loadPendingApprovals();
-        }
+        this.handlePendingDelta(data.delta);
     }
 
     async submitCommand() {
@@ -676,43 +1002,22 @@ class CommandGateway {
                     'Content-Type': 'application/json',
                     'X-API-Key': this.apiKey
                 },
-                body: JSON.stringify({ command: commandText })
+                body: JSON.stringify({ command: commandText, stream: true })
             });
 
             const data = await response.json();
 
             if (response.ok) {
                 document.getElementById('command-input').value = '';
-                
-                // Show user-friendly messages based on command status
-                let message = '';
-                let messageType = '';
-                
-                if (data.status === 'EXECUTED') {
-                    message = '✅ Command accepted and executed successfully!';
-                    messageType = 'success';
-                } else if (data.status === 'REJECTED') {
-                    message = '❌ You don\'t have access to execute this command';
-                    messageType = 'error';
-                } else if (data.status === 'ACCEPTED') {
-                    message = '✅ Command accepted';
-                    messageType = 'success';
-                } else if (data.status === 'PENDING_APPROVAL') {
-                    message = '🤖 Command flagged by AI - awaiting admin approval';
-                    messageType = 'info';
+
+                if (data.status === 'PENDING') {
+                    // Verdict will stream in over the socket
+                    this.streamingCommandId = data.id;
+                    document.getElementById('ai-stream-text').textContent = '';
+                    document.getElementById('ai-stream').style.display = 'block';
                 } else {
-                    message = `Command ${data.status.toLowerCase()}`;
-                    messageType = 'info';
+                    this.showSubmissionResult(data);
                 }
-                
-                this.showMessage(message, messageType);
-                
-                // Update credits display
-                if (data.credits_remaining !== undefined) {
-                    this.currentUser.credits = data.credits_remaining;
-                    document.getElementById('user-credits').textContent = `Credits: ${this.currentUser.credits}`;
-                }
-                
                 this.loadCommandHistory();
             } else {
                 // Handle different error types with user-friendly messages
@@ -731,16 +1036,55 @@ class CommandGateway {
         }
     }
 
-    async loadCommandHistory() {
+    showSubmissionResult(data) {
+        // Show user-friendly messages based on command status
+        let message = '';
+        let messageType = '';
+
+        if (data.status === 'EXECUTED') {
+            message = '✅ Command accepted and executed successfully!';
+            messageType = 'success';
+        } else if (data.status === 'REJECTED') {
+            message = '❌ You don\'t have access to execute this command';
+            messageType = 'error';
+        } else if (data.status === 'ACCEPTED') {
+            message = '✅ Command accepted';
+            messageType = 'success';
+        } else if (data.status === 'PENDING_APPROVAL') {
+            message = '🤖 Command flagged by AI - awaiting admin approval';
+            messageType = 'info';
+        } else if (data.status === 'QUEUED') {
+            message = '⏳ Command accepted and queued for execution';
+            messageType = 'success';
+            this.watchCommandOutput(data.id);
+        } else {
+            message = `Command ${data.status.toLowerCase()}`;
+            messageType = 'info';
+        }
+
+        this.showMessage(message, messageType);
+
+        // Update credits display
+        if (data.credits_remaining !== undefined) {
+            this.currentUser.credits = data.credits_remaining;
+            document.getElementById('user-credits').textContent = `Credits: ${this.currentUser.credits}`;
+        }
+    }
+
+    async loadCommandHistory(older = false) {
+        // Keyset pages: the server hands back an opaque cursor for the next (older) page
+        const cursor = older ? this.historyCursor : null;
         try {
-            const response = await fetch('/api/commands', {
+            const response = await fetch(cursor ? `/api/commands?cursor=${cursor}` : '/api/commands', {
                 headers: { 'X-API-Key': this.apiKey }
             });
 
             if (response.ok) {
                 const commands = await response.json();
-                this.allCommands = commands; // Store for export
-                this.renderCommandHistory(commands);
+                this.allCommands = cursor ? this.allCommands.concat(commands) : commands; // Store for export
+                this.historyCursor = response.headers.get('X-Next-Cursor');
+                document.getElementById('history-more').style.display = this.historyCursor ? 'block' : 'none';
+                this.renderCommandHistory(this.allCommands);
             }
         } catch (error) {
             console.error('Failed to load command history:', error);
@@ -771,6 +1115,9 @@ class CommandGateway {
             } else if (cmd.status === 'PENDING_APPROVAL') {
                 statusText = 'Awaiting Approval';
                 statusIcon = '🤖';
+            } else if (cmd.status === 'EXPIRED') {
+                statusText = 'Approval Expired';
+                statusIcon = '⌛';
             } else {
                 statusText = cmd.status;
                 statusIcon = '⏳';
@@ -782,16 +1129,53 @@ class CommandGateway {
                         <span class="status ${cmd.status.toLowerCase()}">${statusIcon} ${statusText}</span>
                         <span class="timestamp">${new Date(cmd.created_at).toLocaleString()}</span>
                     </div>
-                    <div class="command-text">${this.escapeHtml(cmd.command_text)}</div>
+                    <div class="command-text">${cmd.command_snippet ? this.highlight(cmd.command_snippet) : this.escapeHtml(cmd.command_text)}</div>
                     ${cmd.status === 'REJECTED' ? '<div class="rejection-reason">⚠️ Command blocked by security rules</div>' : ''}
                     ${cmd.status === 'PENDING_APPROVAL' ? '<div class="ai-analysis">🤖 AI flagged as potentially dangerous - awaiting admin approval</div>' : ''}
                     ${cmd.ai_analysis ? `<div class="ai-info">AI Analysis: ${cmd.ai_analysis}</div>` : ''}
                     ${cmd.ai_risk_score ? `<div class="risk-score">Risk Score: ${cmd.ai_risk_score}/10</div>` : ''}
                     ${cmd.rule_pattern ? `<div class="rule-info">Security rule: ${cmd.rule_pattern}</div>` : ''}
                     ${cmd.credits_deducted ? `<div class="credits-info">Credits used: ${cmd.credits_deducted}</div>` : ''}
+                    ${['EXECUTED', 'FAILED', 'TIMED_OUT'].includes(cmd.status) && cmd.exit_code !== null ? `<button class="btn btn-secondary view-output-btn" data-command-id="${cmd.id}">View output</button>` : ''}
                 </div>
             `;
         }).join('');
+
+        container.querySelectorAll('.view-output-btn').forEach(btn => {
+            btn.addEventListener('click', (e) => {
+                const commandId = parseInt(e.target.dataset.commandId);
+                this.loadCommandOutput(commandId);
+            });
+        });
+    }
+
+    async loadCommandOutput(commandId, offset = 0) {
+        try {
+            const response = await fetch(`/api/commands/${commandId}/output?offset=${offset}`, {
+                headers: { 'X-API-Key': this.apiKey }
+            });
+            const data = await response.json();
+            if (!response.ok) {
+                this.showMessage(data.error || 'Failed to load output', 'error');
+                return;
+            }
+
+            if (offset === 0) {
+                this.runningCommandId = null;
+                document.getElementById('command-output-text').textContent = '';
+                document.getElementById('command-output').style.display = 'block';
+            }
+            document.getElementById('command-output-text').textContent += data.data;
+            document.getElementById('command-output-status').textContent =
+                data.status.toLowerCase().replace('_', ' ') + (data.truncated ? ' (output truncated)' : '');
+
+            // Output is read in pages; keep going until the stored stream is exhausted
+            if (!data.eof) {
+                this.loadCommandOutput(commandId, data.next_offset);
+            }
+        } catch (error) {
+            this.showMessage('Failed to load output', 'error');
+        }
     }
 
     async createUser() {
@@ -968,15 +1352,40 @@ class CommandGateway {
         `).join('');
     }
 
-    async loadAuditLogs() {
+    async exportAuditLogs() {
+        const format = document.getElementById('audit-export-format').value;
+        try {
+            const response = await fetch(`/api/audit-logs/export?format=${format}&gzip=1`, {
+                headers: { 'X-API-Key': this.apiKey }
+            });
+            if (!response.ok) {
+                this.showMessage('Failed to export audit logs', 'error');
+                return;
+            }
+
+            const link = document.createElement('a');
+            link.href = URL.createObjectURL(await response.blob());
+            link.download = `audit-logs.${format}.gz`;
+            link.click();
+            URL.revokeObjectURL(link.href);
+        } catch (error) {
+            this.showMessage('Failed to export audit logs', 'error');
+        }
+    }
+
+    async loadAuditLogs(older = false) {
+        const cursor = older ? this.auditCursor : null;
         try {
-            const response = await fetch('/api/audit-logs', {
+            const response = await fetch(cursor ? `/api/audit-logs?cursor=${cursor}` : '/api/audit-logs', {
                 headers: { 'X-API-Key': this.apiKey }
             });
 
             if (response.ok) {
                 const logs = await response.json();
-                this.renderAuditLogs(logs);
+                this.auditLogs = cursor ? this.auditLogs.concat(logs) : logs;
+                this.auditCursor = response.headers.get('X-Next-Cursor');
+                document.getElementById('audit-more').style.display = this.auditCursor ? 'block' : 'none';
+                this.renderAuditLogs(this.auditLogs);
             }
         } catch (error) {
             console.error('Failed to load audit logs:', error);
@@ -998,7 +1407,7 @@ class CommandGateway {
                     <span class="timestamp">${new Date(log.timestamp).toLocaleString()}</span>
                 </div>
                 <div><strong>User:</strong> ${log.user_name || 'System'}</div>
-                <div><strong>Details:</strong> ${this.escapeHtml(log.details)}</div>
+                <div><strong>Details:</strong> ${log.details_snippet ? this.highlight(log.details_snippet) : this.escapeHtml(log.details)}</div>
             </div>
         `).join('');
     }
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for admission control and load shedding on command submission
+"""
+
+import os
+import tempfile
+import pytest
+import sys
+sys.path.append('../backend')
+from config import Config
+from admission import AdmissionController, AdmissionRejected, PRIORITY_LANE, STANDARD_LANE
+
+def test_per_user_limit_returns_429():
+    controller = AdmissionController(max_in_flight=10, priority_reserved=2, per_user_in_flight=2)
+    controller.admit(1)
+    controller.admit(1)
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.admit(1)
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after > 0
+    
+    # Other users are unaffected
+    controller.admit(2)
+
+def test_priority_lane_uses_reserved_capacity():
+    controller = AdmissionController(max_in_flight=3, priority_reserved=1, per_user_in_flight=10)
+    controller.admit(1)
+    controller.admit(2)
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.admit(3, STANDARD_LANE)
+    assert excinfo.value.status_code == 503
+    
+    ticket = controller.admit(99, PRIORITY_LANE)
+    with pytest.raises(AdmissionRejected):
+        controller.admit(98, PRIORITY_LANE)
+    
+    ticket.release()
+    ticket.release()  # idempotent
+    assert controller.snapshot()['in_flight'] == 2
+
+def test_analysis_queue_cap():
+    controller = AdmissionController(max_in_flight=10, priority_reserved=0, max_queued_analyses=1,
+                                     per_user_in_flight=10)
+    with controller.admit(1, needs_analysis=True):
+        with pytest.raises(AdmissionRejected) as excinfo:
+            controller.admit(2, needs_analysis=True)
+        assert excinfo.value.reason == 'analysis_queue'
+        # Submissions that don't need the model still get in
+        controller.admit(2, needs_analysis=False).release()
+    assert controller.snapshot()['queued_analyses'] == 0
+
+def test_submit_endpoint_sheds_with_retry_after(monkeypatch):
+    temp_db = tempfile.NamedTemporaryFile(delete=False)
+    temp_db.close()
+    monkeypatch.setattr(Config, 'DATABASE_PATH', temp_db.name)
+    
+    import app as gateway
+    from models import User
+    
+    try:
+        member = User.create("Member", "member", 10)
+        controller = AdmissionController(max_in_flight=4, priority_reserved=0, per_user_in_flight=1)
+        monkeypatch.setattr(gateway, 'admission', controller)
+        
+        held = controller.admit(member['id'])
+        client = gateway.app.test_client()
+        response = client.post('/api/commands', json={'command': 'ls'},
+                               headers={'X-API-Key': member['api_key']})
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == str(controller.retry_after)
+        
+        held.release()
+        response = client.post('/api/commands', json={'command': 'ls'},
+                               headers={'X-API-Key': member['api_key']})
+        assert response.status_code == 200
+        assert controller.snapshot()['in_flight'] == 0
+    finally:
+        os.unlink(temp_db.name)
+
+def test_submit_endpoint_rejects_non_string_commands(monkeypatch):
+    temp_db = tempfile.NamedTemporaryFile(delete=False)
+    temp_db.close()
+    monkeypatch.setattr(Config, 'DATABASE_PATH', temp_db.name)
+    
+    import app as gateway
+    from models import User
+    
+    try:
+        member = User.create("Member", "member", 10)
+        controller = AdmissionController(max_in_flight=4, priority_reserved=0, per_user_in_flight=1)
+        monkeypatch.setattr(gateway, 'admission', controller)
+        client = gateway.app.test_client()
+        for command in (123, [], None, '   '):
+            response = client.post('/api/commands', json={'command': command},
+                                   headers={'X-API-Key': member['api_key']})
+            assert response.status_code == 400
+        assert controller.snapshot()['in_flight'] == 0
+    finally:
+        os.unlink(temp_db.name)
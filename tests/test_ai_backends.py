@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the pluggable AI analyzer backends
+"""
+
+import json
+import os
+import tempfile
+import pytest
+import sys
+sys.path.append('../backend')
+from models import Database, User, Command, AIAnalyzer
+from config import Config
+from ai_backends import FakeBackend, FakeBackendError, OllamaBackend, create_backend
+
+def test_create_backend_from_config(monkeypatch):
+    monkeypatch.setattr(Config, 'AI_BACKEND', 'fake')
+    assert isinstance(create_backend(), FakeBackend)
+    assert isinstance(create_backend('ollama'), OllamaBackend)
+    with pytest.raises(ValueError):
+        create_backend('missing')
+
+def test_fake_backend_verdict_rules():
+    backend = FakeBackend(latency_ms=0, distribution='fixed', rules=[(r'deploy', 9)], default_risk_score=1)
+    
+    verdict = json.loads(backend.chat(AIAnalyzer.build_prompt('deploy --prod')))
+    assert verdict['risk_score'] == 9
+    assert verdict['requires_approval'] is True
+    
+    verdict = json.loads(backend.chat(AIAnalyzer.build_prompt('build --all')))
+    assert verdict['risk_score'] == 1
+    assert verdict['requires_approval'] is False
+
+def test_fake_backend_is_deterministic():
+    first = FakeBackend(latency_ms=100, distribution='lognormal', seed=7)
+    second = FakeBackend(latency_ms=100, distribution='lognormal', seed=7)
+    assert [first.sample_latency_ms() for _ in range(20)] == [second.sample_latency_ms() for _ in range(20)]
+
+def test_fake_backend_error_rate():
+    backend = FakeBackend(latency_ms=0, distribution='fixed', error_rate=1.0)
+    with pytest.raises(FakeBackendError):
+        backend.chat(AIAnalyzer.build_prompt('deploy'))
+
+def test_submit_with_fake_backend(monkeypatch):
+    temp_db = tempfile.NamedTemporaryFile(delete=False)
+    temp_db.close()
+    monkeypatch.setattr(Config, 'DATABASE_PATH', temp_db.name)
+    monkeypatch.setattr(Config, 'AI_BACKEND', 'fake')
+    monkeypatch.setattr(AIAnalyzer, '_backend', FakeBackend(latency_ms=0, distribution='fixed',
+                                                            rules=[(r'deploy', 8)], default_risk_score=2))
+    monkeypatch.setattr(AIAnalyzer, '_backend_setting', 'fake')
+    
+    try:
+        Database()
+        user = User.create("Load Tester", "member", 10)
+        
+        result = Command.submit(user['id'], 'build-tool --all')
+        assert result['status'] == 'EXECUTED'
+        assert result['ai_analysis']['risk_score'] == 2
+        
+        result = Command.submit(user['id'], 'deploy-tool --prod')
+        assert result['status'] == 'PENDING_APPROVAL'
+        assert AIAnalyzer.health()['backend'] == 'fake'
+    finally:
+        os.unlink(temp_db.name)
@@ -38,6 +38,23 @@ class TestDatabase:
             assert table in tables
         
         conn.close()
+    
+    def test_schema_applied_once_per_path(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(Database, 'init_db', lambda db: calls.append(db.db_path))
+        Database(self.temp_db.name)
+        assert calls == []
+        other = tempfile.NamedTemporaryFile(delete=False)
+        other.close()
+        try:
+            Database(other.name)
+            Database(other.name)
+            assert calls == [other.name]
+        finally:
+            os.unlink(other.name)
+        # A deleted file is created again with its schema
+        Database(other.name)
+        assert calls == [other.name, other.name]
 
 class TestUser:
     def setup_method(self):
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Tests for the admin approval quorum, bulk decisions and pending-queue delta sync
+"""
+
+import os
+import tempfile
+import threading
+import sys
+sys.path.append('../backend')
+from models import Database, User, Command, AIAnalyzer
+from config import Config
+from ai_backends import FakeBackend
+
+class TestApprovalQuorum:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.member = User.create("Member", "member", 10)
+        self.admins = [User.create(f"Admin {index}", "admin", 100) for index in range(12)]
+        
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO commands (user_id, command_text, status, required_approvals) VALUES (?, ?, ?, ?)',
+            (self.member['id'], 'deploy --prod', 'PENDING_APPROVAL', 2)
+        )
+        self.command_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+    
+    def teardown_method(self):
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def test_duplicate_vote_refused(self):
+        first = Command.approve_command(self.command_id, self.admins[0]['id'], True)
+        assert first['approvals_needed'] == 1
+        second = Command.approve_command(self.command_id, self.admins[0]['id'], True)
+        assert second == {'error': 'Admin has already voted on this command'}
+        assert Command.get_by_id(self.command_id)['approval_count'] == 1
+    
+    def test_concurrent_approvals_execute_once(self):
+        barrier = threading.Barrier(len(self.admins))
+        results = []
+        
+        def vote(admin):
+            barrier.wait()
+            results.append(Command.approve_command(self.command_id, admin['id'], True))
+        
+        threads = [threading.Thread(target=vote, args=(admin,)) for admin in self.admins]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(results) == len(self.admins)
+        executed = [result for result in results if result.get('status') == 'EXECUTED']
+        assert len(executed) == 1
+        assert executed[0]['credits_remaining'] == 9
+        assert sum(1 for result in results if result.get('status') == 'PENDING_APPROVAL') == 1
+        assert all(result.get('error') for result in results if result.get('status') is None)
+        
+        command = Command.get_by_id(self.command_id)
+        assert command['status'] == 'EXECUTED'
+        assert command['approval_count'] == 2
+        assert User.get_by_api_key(self.member['api_key'])['credits'] == 9
+    
+    def queue_pending(self, count, risk_score=8, user=None):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        ids = []
+        for index in range(count):
+            cursor.execute(
+                '''INSERT INTO commands (user_id, command_text, status, ai_risk_score, required_approvals)
+                   VALUES (?, ?, ?, ?, ?)''',
+                ((user or self.member)['id'], f'restart service-{index}', 'PENDING_APPROVAL', risk_score, 1)
+            )
+            ids.append(cursor.lastrowid)
+        conn.commit()
+        conn.close()
+        return ids
+    
+    def test_bulk_approve_by_ids(self):
+        ids = self.queue_pending(3)
+        result = Command.bulk_approve(self.admins[0]['id'], True, command_ids=ids + [self.command_id])
+        assert result['counts'] == {'EXECUTED': 3, 'PENDING_APPROVAL': 1}
+        assert result['credits_remaining'] == {self.member['id']: 7}
+        assert all(Command.get_by_id(command_id)['status'] == 'EXECUTED' for command_id in ids)
+        
+        again = Command.bulk_approve(self.admins[0]['id'], True, command_ids=[self.command_id])
+        assert again['counts'] == {'SKIPPED': 1}
+    
+    def test_bulk_reject_by_filter(self):
+        low = self.queue_pending(2, risk_score=3)
+        high = self.queue_pending(2, risk_score=9)
+        result = Command.bulk_approve(self.admins[0]['id'], False, 'outage backlog', min_risk=8, max_risk=10)
+        assert result['counts'] == {'REJECTED': 2}
+        assert {entry['command_id'] for entry in result['results']} == set(high)
+        assert all(Command.get_by_id(command_id)['status'] == 'PENDING_APPROVAL' for command_id in low)
+    
+    def test_bulk_approve_stops_at_credits(self):
+        poor = User.create("Poor", "member", 1)
+        self.queue_pending(2, user=poor)
+        result = Command.bulk_approve(self.admins[0]['id'], True, user_id=poor['id'])
+        assert [entry['status'] for entry in result['results']] == ['EXECUTED', 'REJECTED']
+        assert result['results'][1]['error'] == 'User has insufficient credits'
+    
+    def test_bulk_endpoint_validates_filters(self):
+        import app as gateway
+        client = gateway.app.test_client()
+        headers = {'X-API-Key': self.admins[0]['api_key']}
+        for filters in ({'user_id': [self.member['id']]}, {'user_id': True}, {'min_risk': '8'},
+                        {'fingerprint': 42}):
+            response = client.post('/api/pending-approvals/bulk', json=dict(filters, approved=False), headers=headers)
+            assert response.status_code == 400
+        assert Command.get_by_id(self.command_id)['status'] == 'PENDING_APPROVAL'
+    
+    def test_pending_delta_sync(self):
+        initial = Command.get_pending_changes()
+        assert initial['reset']
+        assert [command['id'] for command in initial['upserts']] == [self.command_id]
+        
+        added = self.queue_pending(2)
+        Command.approve_command(self.command_id, self.admins[0]['id'], True)
+        Command.approve_command(added[0], self.admins[0]['id'], False, 'no')
+        delta = Command.get_pending_changes(initial['version'])
+        assert not delta['reset']
+        assert sorted(command['id'] for command in delta['upserts']) == [self.command_id, added[1]]
+        assert delta['removed'] == [added[0]]
+        assert Command.get_pending_changes(delta['version'])['upserts'] == []
+        
+        # Versions from the future (another database, a reset) get the whole queue again
+        assert Command.get_pending_changes(delta['version'] + 100)['reset']
+    
+    def test_only_pending_submissions_carry_a_delta(self, monkeypatch):
+        import app as gateway
+        deltas = []
+        monkeypatch.setattr(gateway, 'pending_delta', lambda: deltas.append(1) or {})
+        AIAnalyzer.set_backend(FakeBackend(latency_ms=0, distribution='fixed', rules=[(r'deploy', 9)],
+                                           default_risk_score=2))
+        try:
+            client = gateway.app.test_client()
+            headers = {'X-API-Key': self.member['api_key']}
+            assert client.post('/api/commands', json={'command': 'ls -la'}, headers=headers).get_json()['status'] == 'EXECUTED'
+            assert deltas == []
+            response = client.post('/api/commands', json={'command': 'deploy-tool --prod'}, headers=headers)
+            assert response.get_json()['status'] == 'PENDING_APPROVAL'
+            assert deltas == [1]
+        finally:
+            AIAnalyzer.set_backend(None)
+    
+    def test_pruned_version_resets(self):
+        original_retention = Config.PENDING_CHANGES_RETENTION
+        Config.PENDING_CHANGES_RETENTION = 2
+        try:
+            version = Command.get_pending_changes()['version']
+            self.queue_pending(5)
+            Command.get_pending_changes(version)
+            assert Command.get_pending_changes(version)['reset']
+        finally:
+            Config.PENDING_CHANGES_RETENTION = original_retention
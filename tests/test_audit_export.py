@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming audit log export
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import sys
+sys.path.append('../backend')
+from models import Database, User, AuditLog
+from config import Config
+from audit_export import parse_timestamp, stream_export
+
+def test_parse_timestamp_normalizes_to_utc():
+    assert parse_timestamp('2026-03-01') == '2026-03-01 00:00:00'
+    assert parse_timestamp('2026-03-01T12:30:00+02:00') == '2026-03-01 10:30:00'
+
+class TestAuditExport:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.admin = User.create("Admin", "admin", 100)
+        self.member = User.create("Member", "member", 10)
+        
+        conn = self.db.get_connection()
+        conn.executemany(
+            'INSERT INTO audit_logs (user_id, action, details, timestamp) VALUES (?, ?, ?, ?)',
+            [(self.member['id'] if index % 2 else self.admin['id'],
+              'COMMAND_EXECUTED' if index % 3 else 'COMMAND_REJECTED',
+              f'entry {index}', f'2026-01-{index % 28 + 1:02d} 12:00:00')
+             for index in range(60)]
+        )
+        conn.commit()
+        conn.close()
+    
+    def teardown_method(self):
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def exported(self, **filters):
+        return [row for row in AuditLog.iter_logs(batch_size=7, **filters) if row['details'].startswith('entry')]
+    
+    def test_filters_and_batches(self):
+        assert len(self.exported()) == 60
+        rows = self.exported(user_id=self.member['id'], action='COMMAND_REJECTED')
+        assert [row['details'] for row in rows] == [f'entry {index}' for index in range(60)
+                                                    if index % 2 and not index % 3]
+        assert rows[0]['user_name'] == 'Member'
+    
+    def test_time_range_uses_inclusive_start_exclusive_end(self):
+        rows = self.exported(start='2026-01-02 00:00:00', end='2026-01-03 12:00:00')
+        assert {row['timestamp'] for row in rows} == {'2026-01-02 12:00:00'}
+        assert self.exported(start='2027-01-01 00:00:00') == []
+        assert self.exported(end='2025-01-01 00:00:00') == []
+    
+    def test_gzip_csv_round_trip(self):
+        rows = self.exported(action='COMMAND_REJECTED')
+        data = b''.join(stream_export(iter(rows), 'csv', compress=True))
+        parsed = list(csv.DictReader(io.StringIO(gzip.decompress(data).decode('utf-8'))))
+        assert len(parsed) == 20
+        assert parsed[0]['details'] == rows[0]['details']
+    
+    def test_export_endpoint(self):
+        import app as gateway
+        client = gateway.app.test_client()
+        response = client.get('/api/audit-logs/export?action=COMMAND_REJECTED&start=2026-01-01',
+                              headers={'X-API-Key': self.admin['api_key']})
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert 'audit-logs.ndjson' in response.headers['Content-Disposition']
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert len(lines) == 20
+        
+        response = client.get('/api/audit-logs/export?format=xml', headers={'X-API-Key': self.admin['api_key']})
+        assert response.status_code == 400
+        response = client.get('/api/audit-logs/export', headers={'X-API-Key': self.member['api_key']})
+        assert response.status_code == 403
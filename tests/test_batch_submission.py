@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for batch command submission
+"""
+
+import os
+import json
+import tempfile
+import sys
+sys.path.append('../backend')
+from models import Database, User, Rule, Command, AIAnalyzer, executor
+from config import Config
+from ai_backends import FakeBackend
+
+class TestBatchSubmission:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.admin = User.create("Admin", "admin", 100)
+        self.user = User.create("Batcher", "member", 2)
+        AIAnalyzer.set_backend(FakeBackend(latency_ms=0, distribution='fixed',
+                                           rules=[(r'deploy', 8)], default_risk_score=2))
+    
+    def teardown_method(self):
+        AIAnalyzer.set_backend(None)
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def test_compiled_rules_follow_new_rules(self):
+        assert Rule.match_command('forbidden-tool') is None
+        Rule.create(r'^forbidden', 'AUTO_REJECT', self.admin['id'])
+        assert Rule.match_command('forbidden-tool')['action'] == 'AUTO_REJECT'
+        assert Rule.get_compiled_rules() is Rule.get_compiled_rules()
+    
+    def test_batch_results_and_single_commit(self):
+        Rule.create(r'^forbidden', 'AUTO_REJECT', self.admin['id'])
+        commands = ['ls', 'forbidden-tool', 'deploy-tool --prod', 'build-tool', 'pwd', 'x' * 2000]
+        lines = list(Command.submit_batch(self.user['id'], commands))
+        
+        summary = lines[-1]
+        results = {line['index']: line for line in lines[:-1]}
+        assert sorted(results) == list(range(len(commands)))
+        assert results[1]['status'] == 'REJECTED'
+        assert results[2]['status'] == 'PENDING_APPROVAL'
+        assert results[5]['status'] == 'INVALID'
+        
+        # Two credits: two of the three safe commands execute, the third is rejected
+        safe = [results[i]['status'] for i in (0, 3, 4)]
+        assert safe.count('EXECUTED') == 2
+        assert safe.count('REJECTED') == 1
+        
+        assert summary['committed'] is True
+        assert summary['credits_remaining'] == 0
+        assert summary['credits_used'] == 2
+        assert summary['command_ids'][5] is None
+        assert len([i for i in summary['command_ids'] if i]) == 5
+        assert len(Command.get_user_commands(self.user['id'])) == 5
+    
+    def test_queued_commands_count_as_credits_used(self, monkeypatch):
+        submitted = []
+        monkeypatch.setattr(Config, 'EXECUTION_MODE', 'subprocess')
+        monkeypatch.setattr(executor, 'submit', lambda *job: submitted.append(job))
+        summary = list(Command.submit_batch(self.user['id'], ['ls', 'pwd']))[-1]
+        assert summary['counts'] == {'QUEUED': 2}
+        assert summary['credits_used'] == 2
+        assert summary['credits_remaining'] == 0
+        assert len(submitted) == 2
+    
+    def test_credits_spent_elsewhere_roll_back_batch(self):
+        lines = Command.submit_batch(self.user['id'], ['ls', 'pwd'])
+        next(lines)
+        User.update_credits(self.user['id'], 1)
+        summary = list(lines)[-1]
+        assert summary['committed'] is False
+        assert 'error' in summary
+        assert Command.get_user_commands(self.user['id']) == []
+    
+    def test_batch_endpoint_streams_ndjson(self):
+        import app as gateway
+        client = gateway.app.test_client()
+        response = client.post('/api/commands/batch', json={'commands': ['ls', 'whoami']},
+                               headers={'X-API-Key': self.admin['api_key']})
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert len(lines) == 3
+        assert lines[-1]['committed'] is True
+        assert lines[-1]['counts'] == {'EXECUTED': 2}
+        
+        response = client.post('/api/commands/batch', json={'commands': 'ls'},
+                               headers={'X-API-Key': self.admin['api_key']})
+        assert response.status_code == 400
+    
+    def test_batch_larger_than_burst_is_refused_up_front(self):
+        import app as gateway
+        client = gateway.app.test_client()
+        original_enabled = Config.RATE_LIMIT_ENABLED
+        Config.RATE_LIMIT_ENABLED = True
+        try:
+            burst = Config.RATE_LIMITS['member']['burst']
+            response = client.post('/api/commands/batch', json={'commands': ['ls'] * (burst + 1)},
+                                   headers={'X-API-Key': self.user['api_key']})
+            # 400, not a 429 whose Retry-After could never be honoured
+            assert response.status_code == 400
+            assert response.get_json()['error'] == f'At most {burst} commands per batch'
+        finally:
+            Config.RATE_LIMIT_ENABLED = original_enabled
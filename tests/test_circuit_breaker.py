@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for AI analyzer deadlines, the circuit breaker and latency telemetry
+"""
+
+import time
+import sys
+sys.path.append('../backend')
+from models import AIAnalyzer
+from ai_backends import AnalyzerBackend, FakeBackend
+from config import Config
+from circuit_breaker import CircuitBreaker
+from metrics import Histogram
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+def test_breaker_opens_after_consecutive_failures():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+    
+    for _ in range(2):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()['short_circuited'] == 1
+
+def test_breaker_half_open_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # only one probe at a time
+    
+    # Failed probe re-opens immediately
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    
+    clock.now = 20
+    assert breaker.allow_request()
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_seconds=1.0)
+    breaker.record_success(5.0)
+    breaker.record_success(5.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_histogram_percentiles():
+    histogram = Histogram(buckets=(10, 100, 1000))
+    for value in [1, 2, 3, 50, 500]:
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 5
+    assert snapshot['buckets'] == {'10': 3, '100': 1, '1000': 1, '+Inf': 0}
+    assert snapshot['p50'] == 10
+    assert snapshot['p99'] == 1000
+
+def test_analyze_command_deadline(monkeypatch):
+    monkeypatch.setattr(Config, 'AI_TIMEOUT_SECONDS', 0.2)
+    monkeypatch.setattr(AIAnalyzer, 'breaker', CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    monkeypatch.setattr(AIAnalyzer, '_backend', FakeBackend(latency_ms=2000, distribution='fixed'))
+    monkeypatch.setattr(AIAnalyzer, '_backend_setting', Config.AI_BACKEND)
+    
+    start = time.perf_counter()
+    result = AIAnalyzer.analyze_command('some-unknown-tool --flag')
+    assert time.perf_counter() - start < 1.5
+    assert result['risk_score'] == 8
+    assert result['requires_approval'] is True
+    assert 'timed out' in result['analysis']
+    
+    AIAnalyzer.analyze_command('some-unknown-tool --flag')
+    assert AIAnalyzer.breaker.state == CircuitBreaker.OPEN
+    
+    # Breaker open: fail safe without waiting on the model
+    start = time.perf_counter()
+    result = AIAnalyzer.analyze_command('some-unknown-tool --flag')
+    assert time.perf_counter() - start < 0.1
+    assert 'circuit breaker is open' in result['analysis']
+    assert AIAnalyzer.health()['breaker']['state'] == CircuitBreaker.OPEN
+
+class ReplyBackend(AnalyzerBackend):
+    def __init__(self, reply):
+        self.reply = reply
+    
+    def chat(self, prompt):
+        return self.reply
+
+def test_malformed_model_reply_fails_safe(monkeypatch):
+    monkeypatch.setattr(AIAnalyzer, 'breaker', CircuitBreaker(failure_threshold=10, reset_timeout=60))
+    monkeypatch.setattr(AIAnalyzer, '_backend_setting', Config.AI_BACKEND)
+    monkeypatch.setattr(Config, 'AI_VERDICT_CACHE_ENABLED', False)
+    for reply in ('[1]', '"x"', '{"risk_score": "8"}', '{"requires_approval": 1}'):
+        monkeypatch.setattr(AIAnalyzer, '_backend', ReplyBackend(reply))
+        result = AIAnalyzer.analyze_command('some-unknown-tool --flag')
+        assert result['requires_approval'] is True
+        assert result['confidence'] == 0
+    assert AIAnalyzer.breaker.snapshot()['consecutive_failures'] == 4
+
+class UnavailableBackend(AnalyzerBackend):
+    def is_available(self):
+        return False
+
+def test_unavailable_backend_fails_safe(monkeypatch):
+    monkeypatch.setattr(AIAnalyzer, '_backend_setting', Config.AI_BACKEND)
+    monkeypatch.setattr(AIAnalyzer, '_backend', UnavailableBackend())
+    monkeypatch.setattr(Config, 'AI_VERDICT_CACHE_ENABLED', False)
+    result = AIAnalyzer.analyze_command('some-unknown-tool --flag')
+    assert result['requires_approval'] is True
+    assert result['confidence'] == 0
+    assert 'unavailable' in result['analysis']
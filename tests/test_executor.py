@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Tests for the subprocess execution engine
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import sys
+sys.path.append('../backend')
+from models import Database, User, Command, AIAnalyzer, executor
+from config import Config
+from ai_backends import FakeBackend
+from executor import CommandExecutor, ExecutionJob
+
+def run_job(command_executor, command_text, user_id=1):
+    """Run one job to completion and return (status, details, output)"""
+    done = threading.Event()
+    outcome = {}
+    output = []
+    command_executor.output_listeners.append(lambda job, stream, text: output.append((stream, text)))
+    
+    def on_status(job, status, details):
+        if status != 'RUNNING':
+            outcome.update(status=status, details=details)
+            done.set()
+    command_executor.status_listeners.append(on_status)
+    command_executor.submit(1, user_id, command_text)
+    assert done.wait(10)
+    return outcome['status'], outcome['details'], output
+
+def test_successful_command_streams_output():
+    status, details, output = run_job(CommandExecutor(workers=1), 'echo hello; echo oops >&2')
+    assert status == 'EXECUTED'
+    assert details['exit_code'] == 0
+    assert ('stdout', 'hello\n') in output
+    assert ('stderr', 'oops\n') in output
+
+def test_failure_timeout_and_output_limit():
+    assert run_job(CommandExecutor(workers=1), 'exit 3')[0] == 'FAILED'
+    
+    status, details, _ = run_job(CommandExecutor(workers=1, timeout_seconds=0.5), 'sleep 5')
+    assert status == 'TIMED_OUT'
+    assert 'Wall-clock' in details['error']
+    
+    status, details, _ = run_job(CommandExecutor(workers=1, max_output_bytes=1000), 'yes')
+    assert status == 'FAILED'
+    assert 'Output limit' in details['error']
+
+def test_per_user_cap_lets_other_users_through():
+    command_executor = CommandExecutor(workers=2, per_user=1)
+    with command_executor._cond:
+        command_executor._running = {1: 1}
+        command_executor._scheduler.push(ExecutionJob(1, 1, 'first'))
+        command_executor._scheduler.push(ExecutionJob(2, 2, 'second'))
+        assert command_executor._next_job().user_id == 2
+        assert command_executor._next_job() is None
+
+class TestSubprocessMode:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        self.original_mode = Config.EXECUTION_MODE
+        Config.DATABASE_PATH = self.temp_db.name
+        Config.EXECUTION_MODE = 'subprocess'
+        self.db = Database(self.temp_db.name)
+        self.user = User.create("Runner", "member", 5)
+        AIAnalyzer.set_backend(FakeBackend(latency_ms=0, distribution='fixed', default_risk_score=2))
+    
+    def teardown_method(self):
+        AIAnalyzer.set_backend(None)
+        Config.DATABASE_PATH = self.original_db_path
+        Config.EXECUTION_MODE = self.original_mode
+        os.unlink(self.temp_db.name)
+    
+    def test_submission_is_queued_then_finalised(self):
+        finished = threading.Event()
+        listener = lambda job, status, details: status != 'RUNNING' and finished.set()
+        executor.status_listeners.append(listener)
+        try:
+            result = Command.submit(self.user['id'], 'echo done')
+            assert result['status'] == 'QUEUED'
+            assert 'execution_result' not in result
+            assert result['credits_remaining'] == 4
+            assert finished.wait(10)
+        finally:
+            executor.status_listeners.remove(listener)
+        
+        command = Command.get_user_commands(self.user['id'])[0]
+        assert command['status'] == 'EXECUTED'
+        assert command['exit_code'] == 0
+
+    def test_restart_requeues_queued_and_fails_running(self):
+        conn = self.db.get_connection()
+        conn.execute("INSERT INTO commands (user_id, command_text, status) VALUES (?, 'echo resumed', 'QUEUED')",
+                     (self.user['id'],))
+        conn.execute("INSERT INTO commands (user_id, command_text, status) VALUES (?, 'sleep 60', 'RUNNING')",
+                     (self.user['id'],))
+        conn.commit()
+        conn.close()
+        
+        finished = threading.Event()
+        listener = lambda job, status, details: status != 'RUNNING' and finished.set()
+        executor.status_listeners.append(listener)
+        try:
+            assert Command.recover_executions() == {'requeued': 1, 'failed': 1}
+            assert finished.wait(10)
+        finally:
+            executor.status_listeners.remove(listener)
+        
+        statuses = {command['command_text']: command['status'] for command in Command.get_user_commands(self.user['id'])}
+        assert statuses == {'echo resumed': 'EXECUTED', 'sleep 60': 'FAILED'}
+        assert Command.recover_executions() == {'requeued': 0, 'failed': 0}
+
+def test_old_commands_table_is_migrated():
+    temp_db = tempfile.NamedTemporaryFile(delete=False)
+    temp_db.close()
+    try:
+        conn = sqlite3.connect(temp_db.name)
+        conn.execute('''
+            CREATE TABLE commands (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                command_text TEXT NOT NULL,
+                status TEXT NOT NULL CHECK (status IN ('ACCEPTED', 'REJECTED', 'EXECUTED', 'PENDING_APPROVAL')),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute("INSERT INTO commands (user_id, command_text, status) VALUES (1, 'ls', 'EXECUTED')")
+        conn.commit()
+        conn.close()
+        
+        conn = Database(temp_db.name).get_connection()
+        conn.execute("INSERT INTO commands (user_id, command_text, status) VALUES (1, 'sleep 9', 'TIMED_OUT')")
+        rows = conn.execute('SELECT command_text, status, exit_code FROM commands ORDER BY id').fetchall()
+        conn.close()
+        assert [tuple(row) for row in rows] == [('ls', 'EXECUTED', None), ('sleep 9', 'TIMED_OUT', None)]
+    finally:
+        os.unlink(temp_db.name)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the timer wheel and pending-approval expiry
+"""
+
+import os
+import random
+import tempfile
+import time
+import sys
+sys.path.append('../backend')
+from models import Database, User, Command, AuditLog
+from config import Config
+from expiry import TimerWheel, ApprovalExpiry
+
+def test_wheel_fires_each_timer_on_its_tick():
+    wheel = TimerWheel(tick_seconds=1, slots=4, levels=3, now=0)
+    deadlines = {key: random.Random(key).randrange(1, 200) for key in range(300)}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+    assert len(wheel) == 300
+    
+    fired = {}
+    for now in range(1, 201):
+        for key in wheel.advance(now):
+            fired[key] = now
+    # 4 ** 3 = 64 ticks of span: later deadlines were parked and re-placed
+    assert fired == deadlines
+    assert len(wheel) == 0
+
+def test_wheel_cancel_and_reschedule():
+    wheel = TimerWheel(tick_seconds=1, slots=8, levels=2, now=100)
+    wheel.schedule('a', 105)
+    wheel.schedule('b', 150)
+    assert wheel.cancel('a')
+    assert not wheel.cancel('a')
+    wheel.schedule('b', 110)
+    assert wheel.advance(109) == []
+    assert wheel.advance(120) == ['b']
+    # Past deadlines fire on the next tick
+    wheel.schedule('c', 50)
+    assert wheel.advance(121) == ['c']
+
+class TestApprovalExpiry:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.member = User.create("Member", "member", 10)
+        self.admin = User.create("Admin", "admin", 100)
+        self.now = time.time()
+        self.expiry = ApprovalExpiry(ttl_seconds=60, tick_seconds=1, clock=lambda: self.now)
+        self.expired = []
+        self.expiry.listeners.append(self.expired.extend)
+    
+    def teardown_method(self):
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def queue_pending(self, command_text, required_approvals=2):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO commands (user_id, command_text, status, required_approvals) VALUES (?, ?, ?, ?)',
+            (self.member['id'], command_text, 'PENDING_APPROVAL', required_approvals)
+        )
+        command_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return command_id
+    
+    def test_stale_approval_expires_once(self):
+        loaded = self.queue_pending('deploy --prod')
+        self.expiry.load()
+        later = self.queue_pending('drop database staging')
+        assert self.expiry.tick() == []
+        assert self.expiry.outstanding() == 2
+        
+        self.now += 120
+        assert [command['id'] for command in self.expiry.tick()] == [loaded, later]
+        assert Command.get_by_id(loaded)['status'] == 'EXPIRED'
+        assert [command['id'] for command in self.expired] == [loaded, later]
+        assert sum(1 for log in AuditLog.get_logs() if log['action'] == 'COMMAND_EXPIRED') == 2
+        assert self.expiry.outstanding() == 0
+        
+        version = Command.get_pending_changes()['version']
+        self.now += 120
+        assert self.expiry.tick() == []
+        assert Command.get_pending_changes(version)['removed'] == []
+    
+    def test_decided_commands_are_cancelled(self):
+        rejected = self.queue_pending('rm -rf /srv')
+        kept = self.queue_pending('shutdown -h now')
+        self.expiry.load()
+        Command.approve_command(rejected, self.admin['id'], False, 'no')
+        self.expiry.tick()
+        assert self.expiry.outstanding() == 1
+        
+        self.now += 120
+        assert [command['id'] for command in self.expiry.tick()] == [kept]
+        assert Command.get_by_id(rejected)['status'] == 'REJECTED'
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for command fingerprints, the verdict cache, rule suggestions and the backfill
+"""
+
+import os
+import tempfile
+import sys
+sys.path.append('../backend')
+from models import Database, User, Rule, Command, AIAnalyzer, RiskClassifier
+from config import Config
+from ai_backends import FakeBackend
+from fingerprint import fingerprint_command, suggested_pattern
+from maintenance import backfill_fingerprints
+
+def test_same_shape_same_fingerprint():
+    assert fingerprint_command('cat a.txt') == fingerprint_command('cat b.txt')
+    assert fingerprint_command('cat a.txt').template == 'cat <file>'
+    assert fingerprint_command('git push origin main').template == 'git push <word> <word>'
+    assert fingerprint_command('git push origin').digest != fingerprint_command('git pull origin').digest
+    assert fingerprint_command('sudo rm -rf /tmp/x').template == 'sudo rm -rf <path>'
+
+def test_values_that_matter_are_not_cacheable():
+    assert fingerprint_command('tail -n 20 app.log').cacheable
+    for command in ['rm -rf /', 'cat /etc/shadow', 'echo $(whoami)', 'python3 -c "print(1)"',
+                    'echo "hello world"']:
+        assert not fingerprint_command(command).cacheable, command
+
+def test_risky_values_keep_their_own_verdicts():
+    assert fingerprint_command('chmod 644 a.txt').digest != fingerprint_command('chmod 777 a.txt').digest
+    assert fingerprint_command('kill -9 4242').template == 'kill -9 4242'
+    assert fingerprint_command('kill -9 4242').digest != fingerprint_command('kill -9 1').digest
+    for command in ['curl -sO https://example.com/a.tgz', 'cat ../../etc/shadow', 'cat ~/.ssh/id_rsa']:
+        assert not fingerprint_command(command).cacheable, command
+
+def test_suggested_pattern_matches_template():
+    pattern = suggested_pattern('tail -n 20 app.log')
+    assert pattern == r'^tail\s+\-n\s+\d+\s+[\w-]+(?:\.[\w-]+)*\.[A-Za-z0-9]{1,8}\s*$'
+    assert suggested_pattern('ls | grep x') is None
+
+class TestFingerprintStorage:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.user = User.create("Member", "member", 100)
+        self.backend = FakeBackend(latency_ms=0, distribution='fixed', default_risk_score=1)
+        AIAnalyzer.set_backend(self.backend)
+    
+    def teardown_method(self):
+        AIAnalyzer.set_backend(None)
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def test_submit_stores_fingerprint_and_reuses_verdict(self):
+        first = Command.submit(self.user['id'], 'build-tool a.txt')
+        second = Command.submit(self.user['id'], 'build-tool b.txt')
+        assert self.backend.calls == 1
+        assert second['ai_analysis']['source'] == 'cache'
+        
+        rows = [Command.get_by_id(result['id']) for result in (first, second)]
+        assert rows[0]['fingerprint'] == rows[1]['fingerprint'] == fingerprint_command('build-tool a.txt').digest
+        assert rows[0]['command_template'] == 'build-tool <file>'
+    
+    def test_verdict_cache_keyed_by_local_risk(self, monkeypatch):
+        Command.submit(self.user['id'], 'build-tool a.txt')
+        fingerprint = fingerprint_command('build-tool b.txt')
+        assert AIAnalyzer.cached_verdict('build-tool b.txt', fingerprint)['source'] == 'cache'
+        # Same template, but scored differently by the local classifier
+        classify = RiskClassifier.classify
+        monkeypatch.setattr(RiskClassifier, 'classify',
+                            staticmethod(lambda command_text: dict(classify(command_text), risk_score=6)))
+        assert AIAnalyzer.cached_verdict('build-tool b.txt', fingerprint) is None
+    
+    def test_rule_suggestions(self):
+        for index in range(5):
+            Command.submit(self.user['id'], f'build-tool part{index}.txt')
+        suggestions = Rule.suggest(min_count=5)
+        assert len(suggestions) == 1
+        assert suggestions[0]['action'] == 'AUTO_ACCEPT'
+        assert suggestions[0]['template'] == 'build-tool <file>'
+        assert suggestions[0]['occurrences'] == 5
+    
+    def test_backfill_in_chunks(self):
+        conn = self.db.get_connection()
+        conn.executemany('INSERT INTO commands (user_id, command_text, status) VALUES (?, ?, ?)',
+                         [(self.user['id'], f'cat file{index}.txt', 'EXECUTED') for index in range(7)])
+        conn.commit()
+        conn.close()
+        
+        progress = []
+        assert backfill_fingerprints(chunk_size=3, on_progress=lambda updated, _: progress.append(updated)) == 7
+        assert progress == [3, 6, 7]
+        assert backfill_fingerprints(chunk_size=3) == 0
+        conn = self.db.get_connection()
+        templates = {row[0] for row in conn.execute('SELECT command_template FROM commands')}
+        conn.close()
+        assert templates == {'cat <file>'}
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for Idempotency-Key handling on command submission
+"""
+
+import os
+import tempfile
+import threading
+import pytest
+import sys
+sys.path.append('../backend')
+from models import Database, User, Command, AIAnalyzer
+from config import Config
+from ai_backends import FakeBackend
+from idempotency import IdempotencyStore, IdempotencyConflict
+
+class TestIdempotency:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.user = User.create("Retrier", "member", 10)
+        AIAnalyzer.set_backend(FakeBackend(latency_ms=0, distribution='fixed', default_risk_score=2))
+    
+    def teardown_method(self):
+        AIAnalyzer.set_backend(None)
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def test_completed_response_is_replayed(self):
+        store = IdempotencyStore()
+        assert store.begin(self.user['id'], 'k1', 'fp') is None
+        store.complete(self.user['id'], 'k1', 200, {'id': 7})
+        assert store.begin(self.user['id'], 'k1', 'fp') == {'status_code': 200, 'body': {'id': 7}}
+        
+        # A fresh store (restart, other worker) finds it in the table
+        assert IdempotencyStore().begin(self.user['id'], 'k1', 'fp')['body'] == {'id': 7}
+        
+        with pytest.raises(IdempotencyConflict) as excinfo:
+            store.begin(self.user['id'], 'k1', 'other-request')
+        assert excinfo.value.status_code == 422
+    
+    def test_abandoned_key_runs_again(self):
+        store = IdempotencyStore()
+        assert store.begin(self.user['id'], 'k2', 'fp') is None
+        store.abandon(self.user['id'], 'k2')
+        assert store.begin(self.user['id'], 'k2', 'fp') is None
+    
+    def test_in_flight_duplicate_waits_for_original(self):
+        store = IdempotencyStore(wait_seconds=5)
+        assert store.begin(self.user['id'], 'k3', 'fp') is None
+        
+        replays = []
+        waiter = threading.Thread(target=lambda: replays.append(store.begin(self.user['id'], 'k3', 'fp')))
+        waiter.start()
+        waiter.join(0.2)
+        assert waiter.is_alive()
+        
+        store.complete(self.user['id'], 'k3', 200, {'id': 9})
+        waiter.join(5)
+        assert replays == [{'status_code': 200, 'body': {'id': 9}}]
+    
+    def test_expired_response_is_not_replayed(self):
+        now = [1000.0]
+        store = IdempotencyStore(ttl_seconds=30, clock=lambda: now[0])
+        assert store.begin(self.user['id'], 'k4', 'fp') is None
+        store.complete(self.user['id'], 'k4', 200, {'id': 11})
+        
+        # Past the TTL but before the next purge, the stored row must not be replayed
+        now[0] += 31
+        assert store.begin(self.user['id'], 'k4', 'other-request') is None
+        store.complete(self.user['id'], 'k4', 200, {'id': 12})
+        assert store.begin(self.user['id'], 'k4', 'other-request')['body'] == {'id': 12}
+    
+    def test_cache_is_bounded(self):
+        store = IdempotencyStore(cache_size=2)
+        for key in ('a', 'b', 'c'):
+            store.begin(self.user['id'], key, 'fp')
+            store.complete(self.user['id'], key, 200, {'key': key})
+        assert len(store._cache) == 2
+        assert store.begin(self.user['id'], 'a', 'fp')['body'] == {'key': 'a'}
+    
+    def test_retried_submission_runs_once(self):
+        import app as gateway
+        client = gateway.app.test_client()
+        headers = {'X-API-Key': self.user['api_key'], 'Idempotency-Key': 'retry-1'}
+        
+        first = client.post('/api/commands', json={'command': 'build-tool'}, headers=headers)
+        second = client.post('/api/commands', json={'command': 'build-tool'}, headers=headers)
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert second.headers['Idempotent-Replayed'] == 'true'
+        assert second.get_json()['id'] == first.get_json()['id']
+        
+        assert len(Command.get_user_commands(self.user['id'])) == 1
+        assert User.get_by_api_key(self.user['api_key'])['credits'] == 9
+        
+        conflict = client.post('/api/commands', json={'command': 'pwd'}, headers=headers)
+        assert conflict.status_code == 422
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for chunked execution output storage
+"""
+
+import os
+import tempfile
+import sys
+sys.path.append('../backend')
+from models import Database, User, Command
+from config import Config
+from executor import ExecutionJob
+from output_store import OutputStore
+
+class TestOutputStore:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.now = 1000.0
+        self.store = OutputStore(chunk_bytes=10, max_stored_bytes=45, retention_seconds=60,
+                                 clock=lambda: self.now)
+        self.job = ExecutionJob(1, 1, 'seq 100')
+    
+    def teardown_method(self):
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def test_range_reads_span_chunks(self):
+        self.store.on_output(self.job, 'stdout', 'abcdefghijklmnopqrstuvwxy')
+        self.store.on_output(self.job, 'stderr', 'warning')
+        self.store.on_status(self.job, 'EXECUTED', {})
+        
+        conn = self.db.get_connection()
+        chunk_count = conn.execute('SELECT COUNT(*) FROM command_output_chunks').fetchone()[0]
+        conn.close()
+        assert chunk_count == 4  # 10 + 10 + 5 stdout bytes, 7 stderr bytes
+        
+        page = self.store.read(1, 'stdout', offset=8, limit=5)
+        assert page['data'] == 'ijklm'
+        assert page['next_offset'] == 13
+        assert page['eof'] is False
+        
+        rest = self.store.read(1, 'stdout', offset=13)
+        assert rest['data'] == 'nopqrstuvwxy'
+        assert rest['eof'] is True
+        assert self.store.read(1, 'stderr')['data'] == 'warning'
+    
+    def test_output_over_cap_is_truncated_with_marker(self):
+        self.store.on_output(self.job, 'stdout', 'x' * 100)
+        self.store.on_status(self.job, 'FAILED', {})
+        
+        page = self.store.read(1, 'stdout')
+        assert page['data'].startswith('x' * 45)
+        assert page['data'].endswith('[output truncated after 45 bytes]\n')
+        assert page['truncated'] is True
+        assert page['total_bytes'] == 100
+    
+    def test_sweep_removes_expired_output(self):
+        self.store.on_output(self.job, 'stdout', 'old output')
+        self.store.on_status(self.job, 'EXECUTED', {})
+        assert self.store.sweep() == 0
+        
+        self.now += 61
+        assert self.store.sweep() == 1
+        assert self.store.read(1)['data'] == ''
+        assert self.store.summary(1) is None
+    
+    def test_output_endpoint_is_owner_only(self):
+        owner = User.create("Owner", "member", 5)
+        other = User.create("Other", "member", 5)
+        command = Command.submit(owner['id'], 'ls')
+        
+        import app as gateway
+        client = gateway.app.test_client()
+        response = client.get(f"/api/commands/{command['id']}/output",
+                              headers={'X-API-Key': owner['api_key']})
+        assert response.status_code == 200
+        assert response.get_json()['data'] == ''
+        
+        response = client.get(f"/api/commands/{command['id']}/output",
+                              headers={'X-API-Key': other['api_key']})
+        assert response.status_code == 404
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for keyset pagination of command history and audit logs
+"""
+
+import os
+import tempfile
+import sys
+import pytest
+sys.path.append('../backend')
+from models import Database, User, Command, AuditLog
+from config import Config
+from pagination import encode_cursor, decode_cursor
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('2026-01-01 00:00:00', 42)
+    assert decode_cursor(cursor) == ('2026-01-01 00:00:00', 42)
+    for bad in ('not-a-cursor', encode_cursor(1, 2, 3), encode_cursor({'a': 1}, [2]),
+                encode_cursor('2026-01-01 00:00:00', True), encode_cursor(7, 42)):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+class TestKeysetPagination:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.admin = User.create("Admin", "admin", 100)
+        self.member = User.create("Member", "member", 10)
+        
+        # Several rows share each timestamp, so the id tiebreak matters
+        conn = self.db.get_connection()
+        conn.executemany(
+            'INSERT INTO commands (user_id, command_text, status, created_at) VALUES (?, ?, ?, ?)',
+            [(self.member['id'], f'echo {index}', 'EXECUTED', f'2026-01-01 00:00:{index // 3:02d}')
+             for index in range(25)]
+        )
+        conn.commit()
+        conn.close()
+    
+    def teardown_method(self):
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def test_pages_cover_history_once_in_order(self):
+        seen = []
+        before = None
+        while True:
+            page = Command.get_user_commands(self.member['id'], limit=4, before=before)
+            if not page:
+                break
+            seen.extend(command['command_text'] for command in page)
+            before = (page[-1]['created_at'], page[-1]['id'])
+        assert seen == [f'echo {index}' for index in reversed(range(25))]
+    
+    def test_endpoints_return_cursor_headers(self):
+        import app as gateway
+        client = gateway.app.test_client()
+        headers = {'X-API-Key': self.member['api_key']}
+        
+        first = client.get('/api/commands?limit=10', headers=headers)
+        assert len(first.get_json()) == 10
+        assert first.headers['Link'].startswith('</api/commands?limit=10&cursor=')
+        second = client.get(f"/api/commands?limit=10&cursor={first.headers['X-Next-Cursor']}", headers=headers)
+        third = client.get(f"/api/commands?limit=10&cursor={second.headers['X-Next-Cursor']}", headers=headers)
+        assert len(third.get_json()) == 5
+        assert 'X-Next-Cursor' not in third.headers
+        ids = [command['id'] for response in (first, second, third) for command in response.get_json()]
+        assert len(set(ids)) == 25
+        
+        assert client.get('/api/commands?cursor=garbage', headers=headers).status_code == 400
+        assert client.get(f"/api/commands?cursor={encode_cursor({'a': 1}, [2])}", headers=headers).status_code == 400
+        assert client.get('/api/commands?limit=0', headers=headers).status_code == 400
+        
+        logs = client.get('/api/audit-logs?limit=1', headers={'X-API-Key': self.admin['api_key']})
+        older = client.get(f"/api/audit-logs?limit=1&cursor={logs.headers['X-Next-Cursor']}",
+                           headers={'X-API-Key': self.admin['api_key']})
+        assert older.get_json()[0]['id'] < logs.get_json()[0]['id']
+        assert len(AuditLog.get_logs()) == 2
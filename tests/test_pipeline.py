@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the staged command submission pipeline
+"""
+
+import os
+import tempfile
+import pytest
+import sys
+sys.path.append('../backend')
+from models import Database, User, Rule, AIAnalyzer
+from config import Config
+from ai_backends import FakeBackend
+from metrics import registry as metrics
+from pipeline import CommandPipeline, SubmissionContext, register_stage, run_submission, STAGES
+
+class TestCommandPipeline:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        self.original_stages = Config.COMMAND_PIPELINE_STAGES
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.admin = User.create("Admin", "admin", 10)
+        self.user = User.create("Member", "member", 3)
+        AIAnalyzer.set_backend(FakeBackend(latency_ms=0, distribution='fixed',
+                                           rules=[(r'deploy', 8)], default_risk_score=2))
+    
+    def teardown_method(self):
+        AIAnalyzer.set_backend(None)
+        Config.DATABASE_PATH = self.original_db_path
+        Config.COMMAND_PIPELINE_STAGES = self.original_stages
+        STAGES.pop('tag_result', None)
+        os.unlink(self.temp_db.name)
+    
+    def test_every_stage_is_timed(self):
+        before = metrics.histogram('pipeline.stage.analyze_ms').snapshot()['count']
+        ctx = run_submission(self.user['id'], 'build-tool --all')
+        assert ctx.result['status'] == 'EXECUTED'
+        assert ctx.result['credits_remaining'] == 2
+        assert [name for name, _ in ctx.timings] == Config.COMMAND_PIPELINE_STAGES
+        assert metrics.histogram('pipeline.stage.analyze_ms').snapshot()['count'] == before + 1
+        
+        header = ctx.server_timing()
+        assert header.startswith('validate;dur=')
+        assert 'total;dur=' in header
+    
+    def test_rejection_and_approval_paths(self):
+        Rule.create(r'^forbidden', 'AUTO_REJECT', self.admin['id'])
+        assert run_submission(self.user['id'], 'forbidden-tool').result['status'] == 'REJECTED'
+        
+        ctx = run_submission(self.user['id'], 'deploy-tool --prod')
+        assert ctx.result['status'] == 'PENDING_APPROVAL'
+        assert ctx.result['credits_remaining'] == 3
+        assert 'execution_result' not in ctx.result
+    
+    def test_failed_stage_stops_pipeline(self):
+        with pytest.raises(ValueError):
+            run_submission(self.user['id'], 'x' * 2000)
+    
+    def test_stages_are_configurable(self):
+        @register_stage('tag_result')
+        def tag_result(ctx):
+            ctx.result['tagged'] = True
+        
+        Config.COMMAND_PIPELINE_STAGES = Config.COMMAND_PIPELINE_STAGES + ['tag_result']
+        ctx = run_submission(self.user['id'], 'ls')
+        assert ctx.result['tagged'] is True
+        
+        with pytest.raises(RuntimeError):
+            CommandPipeline(['validate', 'no_such_stage'])
+    
+    def test_persist_charges_current_balance(self):
+        # Both submissions pass the credit check before either is persisted
+        last = User.create("Last", "member", 1)
+        first, second = (SubmissionContext(last['id'], 'build-tool --all') for _ in range(2))
+        for ctx in (first, second):
+            CommandPipeline(['validate', 'fingerprint', 'authorize_credits', 'match_rules', 'analyze']).run(ctx)
+        CommandPipeline(['persist']).run(first)
+        assert first.result['credits_remaining'] == 0
+        with pytest.raises(ValueError):
+            CommandPipeline(['persist']).run(second)
+        assert User.get_by_api_key(last['api_key'])['credits'] == 0
+    
+    def test_notify_stage_skips_streamed_analysis(self):
+        notified = []
+        ctx = SubmissionContext(self.user['id'], 'build-tool', stream_analysis=True, notify=notified.append)
+        CommandPipeline().run(ctx)
+        assert ctx.result['status'] == 'PENDING'
+        assert notified == []
+    
+    def test_submit_endpoint_sends_server_timing(self):
+        import app as gateway
+        client = gateway.app.test_client()
+        response = client.post('/api/commands', json={'command': 'ls'},
+                               headers={'X-API-Key': self.user['api_key']})
+        assert response.status_code == 200
+        assert 'persist;dur=' in response.headers['Server-Timing']
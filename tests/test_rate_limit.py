@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for per-user token-bucket rate limiting
+"""
+
+import os
+import tempfile
+import pytest
+import sys
+sys.path.append('../backend')
+from config import Config
+from rate_limit import RateLimiter, RateLimitExceeded, MemoryBucketStore, SQLiteBucketStore
+
+LIMITS = {
+    'admin': {'rate': 10, 'burst': 5},
+    'member': {'rate': 1, 'burst': 2}
+}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+def exercise_limiter(store):
+    clock = FakeClock()
+    limiter = RateLimiter(store=store, limits=LIMITS, clock=clock)
+    
+    limiter.check(1, 'member')
+    limiter.check(1, 'member')
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        limiter.check(1, 'member')
+    assert excinfo.value.retry_after == 1
+    assert excinfo.value.status_code == 429
+    
+    # Buckets are per user and per role
+    limiter.check(2, 'member')
+    for _ in range(5):
+        limiter.check(1, 'admin')
+    
+    # Refill at `rate` tokens per second
+    clock.now += 1
+    limiter.check(1, 'member')
+    with pytest.raises(RateLimitExceeded):
+        limiter.check(1, 'member')
+
+def test_memory_store():
+    exercise_limiter(MemoryBucketStore())
+
+def test_sqlite_store_is_shared():
+    temp_db = tempfile.NamedTemporaryFile(delete=False)
+    temp_db.close()
+    try:
+        exercise_limiter(SQLiteBucketStore(temp_db.name))
+        
+        # A second store on the same file (another worker) sees the same buckets
+        clock = FakeClock()
+        first = RateLimiter(store=SQLiteBucketStore(temp_db.name), limits=LIMITS, clock=clock)
+        second = RateLimiter(store=SQLiteBucketStore(temp_db.name), limits=LIMITS, clock=clock)
+        first.check(42, 'member')
+        second.check(42, 'member')
+        with pytest.raises(RateLimitExceeded):
+            first.check(42, 'member')
+    finally:
+        os.unlink(temp_db.name)
+
+def test_cost_above_burst_is_rejected():
+    limiter = RateLimiter(store=MemoryBucketStore(), limits=LIMITS, clock=FakeClock())
+    with pytest.raises(RateLimitExceeded):
+        limiter.check(1, 'member', cost=3)
+    limiter.check(1, 'member', cost=2)
+
+def test_submit_endpoint_returns_429_with_retry_after(monkeypatch):
+    temp_db = tempfile.NamedTemporaryFile(delete=False)
+    temp_db.close()
+    monkeypatch.setattr(Config, 'DATABASE_PATH', temp_db.name)
+    
+    import app as gateway
+    from models import User
+    
+    try:
+        member = User.create("Member", "member", 10)
+        clock = FakeClock()
+        monkeypatch.setattr(gateway, 'rate_limiter',
+                            RateLimiter(store=MemoryBucketStore(), limits=LIMITS, clock=clock))
+        
+        client = gateway.app.test_client()
+        headers = {'X-API-Key': member['api_key']}
+        for _ in range(2):
+            response = client.post('/api/commands', json={'command': 'ls'}, headers=headers)
+            assert response.status_code == 200
+        
+        response = client.post('/api/commands', json={'command': 'ls'}, headers=headers)
+        assert response.status_code == 429
+        assert response.get_json()['reason'] == 'rate_limit'
+        assert response.headers['Retry-After'] == '1'
+        
+        clock.now += 1
+        response = client.post('/api/commands', json={'command': 'ls'}, headers=headers)
+        assert response.status_code == 200
+    finally:
+        os.unlink(temp_db.name)
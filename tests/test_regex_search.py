@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for regex search over command history
+"""
+
+import json
+import os
+import tempfile
+import sys
+sys.path.append('../backend')
+from models import Database, User, Command
+from config import Config
+import regex_literals
+from regex_literals import required_literals
+
+def test_required_literals():
+    assert required_literals(r'^git (push|pull) --force') == ['git pu', ' --force']
+    assert required_literals(r'rm\s+-rf\s+/') == ['rm', '-rf', '/']
+    assert required_literals(r'(ab)+c?d') == ['ab', 'd']
+    assert required_literals(r'^(ls|cat)\b') == []
+    assert required_literals(r'(?i)sudo') == []
+
+def test_required_literals_without_parser(monkeypatch):
+    # No usable re parser: nothing is prefiltered, the regex still decides
+    monkeypatch.setattr(regex_literals, 'PARSER_AVAILABLE', False)
+    assert required_literals(r'rm\s+-rf\s+/') == []
+
+class TestRegexSearch:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        self.original_window = Config.REGEX_SEARCH_WINDOW
+        Config.DATABASE_PATH = self.temp_db.name
+        Config.REGEX_SEARCH_WINDOW = 10
+        self.db = Database(self.temp_db.name)
+        self.admin = User.create("Admin", "admin", 100)
+        self.member = User.create("Member", "member", 10)
+        
+        commands = [f'ls /srv/app{index}' for index in range(40)]
+        commands[5] = 'rm -rf /srv/app5'
+        commands[22] = 'sudo rm  -rf /var/log'
+        commands[31] = 'echo rm -rf is dangerous'
+        conn = self.db.get_connection()
+        conn.executemany('INSERT INTO commands (user_id, command_text, status) VALUES (?, ?, ?)',
+                         [(self.member['id'], command, 'EXECUTED') for command in commands])
+        conn.commit()
+        conn.close()
+    
+    def teardown_method(self):
+        Config.DATABASE_PATH = self.original_db_path
+        Config.REGEX_SEARCH_WINDOW = self.original_window
+        os.unlink(self.temp_db.name)
+    
+    def test_matches_newest_first_across_windows(self):
+        *matches, summary = Command.search_regex(r'rm\s+-rf\s+/')
+        assert [match['command_text'] for match in matches] == ['sudo rm  -rf /var/log', 'rm -rf /srv/app5']
+        assert summary['complete'] and summary['matched'] == 2
+        assert summary['literals'] == ['rm', '-rf', '/']
+    
+    def test_limit_and_resume(self):
+        *matches, summary = Command.search_regex(r'rm\s+-rf', limit=2)
+        assert [match['command_text'] for match in matches] == ['echo rm -rf is dangerous', 'sudo rm  -rf /var/log']
+        assert not summary['complete']
+        *rest, summary = Command.search_regex(r'rm\s+-rf', before_id=summary['resume_before_id'])
+        assert [match['command_text'] for match in rest] == ['rm -rf /srv/app5']
+        assert summary['complete']
+    
+    def test_time_budget_stops_between_windows(self):
+        results = list(Command.search_regex(r'^ls', time_budget_ms=0.001))
+        summary = results[-1]
+        assert not summary['complete']
+        assert len(results) - 1 == summary['matched'] < 38
+    
+    def test_time_budget_cuts_a_window_short(self):
+        # One window holds every row; the regex function stops it at the deadline and resuming makes progress
+        Config.REGEX_SEARCH_WINDOW = 100
+        texts, before_id, runs = [], None, 0
+        while True:
+            *matches, summary = Command.search_regex(r'^ls', before_id=before_id, time_budget_ms=0.001)
+            texts += [match['command_text'] for match in matches]
+            runs += 1
+            if summary['complete']:
+                break
+            before_id = summary['resume_before_id']
+        assert runs > 1
+        assert sorted(texts) == sorted(f'ls /srv/app{index}' for index in range(40) if index not in (5, 22, 31))
+    
+    def test_regexp_function_available_on_connections(self):
+        conn = self.db.get_connection()
+        count = conn.execute("SELECT COUNT(*) FROM commands WHERE command_text REGEXP '^ls /srv/app1'").fetchone()[0]
+        conn.close()
+        assert count == 11
+    
+    def test_endpoint_streams_and_validates(self):
+        import app as gateway
+        client = gateway.app.test_client()
+        headers = {'X-API-Key': self.admin['api_key']}
+        response = client.post('/api/commands/search-regex', json={'pattern': r'^sudo\s'}, headers=headers)
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [line.get('command_text') for line in lines[:-1]] == ['sudo rm  -rf /var/log']
+        assert lines[-1]['summary']
+        
+        response = client.post('/api/commands/search-regex', json={'pattern': 'rm (-rf'}, headers=headers)
+        assert response.status_code == 400
+        assert not response.get_json()['valid']
+        response = client.post('/api/commands/search-regex', json={'pattern': '^ls'},
+                               headers={'X-API-Key': self.member['api_key']})
+        assert response.status_code == 403
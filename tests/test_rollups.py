@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for the daily analytics rollups
+"""
+
+import os
+import tempfile
+import sys
+sys.path.append('../backend')
+from models import Database, User, Command
+from config import Config
+from rollups import ROLLUPS
+from maintenance import rebuild_analytics_rollups, compact_timeseries
+
+class TestRollups:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.admin = User.create("Admin", "admin", 100)
+        self.member = User.create("Member", "member", 10)
+        
+        conn = self.db.get_connection()
+        conn.executemany(
+            'INSERT INTO commands (user_id, command_text, status, credits_deducted, fingerprint, command_template, created_at) '
+            "VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+            [(self.member['id'], 'ls /tmp', 'EXECUTED', 1, 'fp-ls', 'ls <path>', None),
+             (self.member['id'], 'ls /var', 'EXECUTED', 1, 'fp-ls', 'ls <path>', None),
+             (self.member['id'], 'rm -rf /', 'REJECTED', 0, 'fp-rm', 'rm -rf <path>', None),
+             (self.admin['id'], 'make deploy', 'PENDING_APPROVAL', 0, None, None, None),
+             (self.member['id'], 'ls /old', 'EXECUTED', 1, 'fp-ls', 'ls <path>', '2026-01-01 09:00:00')]
+        )
+        conn.commit()
+        conn.close()
+    
+    def teardown_method(self):
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def snapshot(self):
+        conn = self.db.get_connection()
+        tables = {table: sorted(tuple(row) for row in conn.execute(f'SELECT * FROM {table}')) for table in ROLLUPS}
+        conn.close()
+        return tables
+    
+    def test_dashboard_reads_today_from_rollups(self):
+        analytics = Command.get_analytics()
+        assert analytics['daily_stats'] == {'total_commands': 4, 'executed_commands': 2,
+                                            'rejected_commands': 1, 'total_credits_used': 2}
+        top = analytics['top_commands'][0]
+        assert (top['command_template'], top['count'], top['status']) == ('ls <path>', 2, 'EXECUTED')
+        assert [(user['name'], user['command_count']) for user in analytics['user_activity']] == [('Member', 3), ('Admin', 1)]
+        assert Command.get_analytics('2026-01-01')['daily_stats']['total_commands'] == 1
+        assert Command.get_analytics('2025-01-01')['daily_stats']['total_commands'] == 0
+    
+    def test_charged_commands_count_as_executed(self):
+        # With the subprocess executor, charged commands sit in QUEUED/RUNNING or end FAILED
+        conn = self.db.get_connection()
+        conn.executemany(
+            'INSERT INTO commands (user_id, command_text, status, credits_deducted) VALUES (?, ?, ?, 1)',
+            [(self.member['id'], 'make build', 'QUEUED'), (self.member['id'], 'make test', 'FAILED')]
+        )
+        conn.commit()
+        conn.close()
+        assert Command.get_analytics()['daily_stats'] == {'total_commands': 6, 'executed_commands': 4,
+                                                          'rejected_commands': 1, 'total_credits_used': 4}
+    
+    def test_triggers_match_a_rebuild(self):
+        conn = self.db.get_connection()
+        conn.execute("UPDATE commands SET status = 'EXECUTED', credits_deducted = 1 WHERE command_text = 'make deploy'")
+        conn.execute("UPDATE commands SET fingerprint = 'fp-make', command_template = 'make <target>' WHERE command_text = 'make deploy'")
+        conn.execute("UPDATE commands SET approval_count = 1")
+        conn.execute("DELETE FROM commands WHERE command_text = 'rm -rf /'")
+        conn.commit()
+        conn.close()
+        
+        # A rebuild only keeps the minute buckets inside their retention
+        compact_timeseries()
+        maintained = self.snapshot()
+        assert rebuild_analytics_rollups() == 4
+        assert self.snapshot() == maintained
+        assert Command.get_analytics()['daily_stats']['rejected_commands'] == 0
+    
+    def test_rebuild_backfills_missing_days(self):
+        conn = self.db.get_connection()
+        conn.execute('DELETE FROM command_rollup_status')
+        conn.commit()
+        conn.close()
+        assert rebuild_analytics_rollups(since='2026-01-02') == 4
+        assert Command.get_analytics('2026-01-01')['daily_stats']['total_commands'] == 0
+        rebuild_analytics_rollups()
+        assert Command.get_analytics('2026-01-01')['daily_stats']['total_commands'] == 1
+    
+    def test_rollups_filled_when_created(self):
+        conn = self.db.get_connection()
+        for table in ROLLUPS:
+            conn.execute(f'DROP TABLE {table}')
+        conn.commit()
+        conn.close()
+        Database(self.temp_db.name).init_db()
+        assert Command.get_analytics()['daily_stats']['total_commands'] == 4
+    
+    def test_endpoint(self):
+        import app as gateway
+        client = gateway.app.test_client()
+        response = client.get('/api/analytics', headers={'X-API-Key': self.admin['api_key']})
+        assert response.get_json()['daily_stats']['total_commands'] == 4
+        response = client.get('/api/analytics', headers={'X-API-Key': self.member['api_key']})
+        assert response.status_code == 403
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for the execution queue scheduler
+"""
+
+import sys
+sys.path.append('../backend')
+from executor import ExecutionJob
+from scheduler import FairScheduler, priority_class
+
+WEIGHTS = {'approved': 8, 'admin': 4, 'standard': 2, 'low': 1}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+def drain(scheduler, eligible=lambda job: True):
+    order = []
+    while True:
+        job = scheduler.pop(eligible)
+        if job is None:
+            return order
+        order.append(job.command_id)
+
+def test_priority_classes():
+    assert priority_class('member', 2) == 'standard'
+    assert priority_class('member', 6) == 'low'
+    assert priority_class('admin', 9) == 'admin'
+    assert priority_class('member', 9, approved=True) == 'approved'
+
+def test_admin_jumps_member_backlog():
+    scheduler = FairScheduler(weights=WEIGHTS, aging_seconds=1000, clock=FakeClock())
+    for command_id in range(1, 6):
+        scheduler.push(ExecutionJob(command_id, 1, 'long job', 'standard'))
+    scheduler.push(ExecutionJob(99, 2, 'urgent', 'admin'))
+    assert drain(scheduler)[0] == 99
+
+def test_users_share_fairly():
+    scheduler = FairScheduler(weights=WEIGHTS, aging_seconds=1000, clock=FakeClock())
+    for command_id in range(1, 5):
+        scheduler.push(ExecutionJob(command_id, 1, 'flood', 'standard'))
+    scheduler.push(ExecutionJob(10, 2, 'one', 'standard'))
+    scheduler.push(ExecutionJob(11, 2, 'two', 'standard'))
+    
+    # User 2 arrived last but is interleaved instead of waiting behind user 1's backlog
+    assert drain(scheduler)[:4] == [1, 10, 2, 11]
+
+def test_aging_prevents_starvation():
+    clock = FakeClock()
+    scheduler = FairScheduler(weights=WEIGHTS, aging_seconds=10, clock=clock)
+    scheduler.push(ExecutionJob(1, 1, 'risky', 'low'))
+    clock.now += 60
+    for command_id in range(2, 6):
+        scheduler.push(ExecutionJob(command_id, command_id, 'admin work', 'admin'))
+    assert drain(scheduler)[0] == 1
+
+def test_ineligible_jobs_keep_their_place():
+    scheduler = FairScheduler(weights=WEIGHTS, aging_seconds=1000, clock=FakeClock())
+    scheduler.push(ExecutionJob(1, 1, 'a', 'admin'))
+    scheduler.push(ExecutionJob(2, 2, 'b', 'standard'))
+    assert scheduler.pop(lambda job: job.user_id != 1).command_id == 2
+    assert scheduler.snapshot()['queued_by_class']['admin'] == 1
+    assert scheduler.pop().command_id == 1
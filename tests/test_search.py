@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for full-text search over command history and audit details
+"""
+
+import os
+import tempfile
+import sys
+import pytest
+sys.path.append('../backend')
+from models import Database, User, Command, AuditLog
+from config import Config
+from search import fts_query
+
+def test_query_translation():
+    assert fts_query('rm tmp') == '"rm" "tmp"'
+    assert fts_query('deplo*') == '"deplo"*'
+    assert fts_query('"drop table" users') == '"drop table" "users"'
+    # Operators and punctuation are searched for, not parsed
+    assert fts_query('a OR -rf NEAR(x)') == '"a" "OR" "-rf" "NEAR(x)"'
+    assert fts_query('say "hi"there') == '"say" "hi" "there"'
+    with pytest.raises(ValueError):
+        fts_query(' * -- ')
+
+class TestSearch:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.admin = User.create("Admin", "admin", 100)
+        self.member = User.create("Member", "member", 10)
+        
+        conn = self.db.get_connection()
+        conn.executemany(
+            'INSERT INTO commands (user_id, command_text, status, ai_analysis, created_at) VALUES (?, ?, ?, ?, ?)',
+            [(self.member['id'], 'kubectl delete deployment web', 'REJECTED', 'Deletes production workloads', '2026-02-01 10:00:00'),
+             (self.member['id'], 'kubectl get pods', 'EXECUTED', None, '2026-02-02 10:00:00'),
+             (self.admin['id'], 'git push origin main', 'EXECUTED', 'Pushes to the deployment branch', '2026-02-03 10:00:00')]
+        )
+        conn.commit()
+        conn.close()
+    
+    def teardown_method(self):
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def texts(self, results):
+        return [command['command_text'] for command in results]
+    
+    def test_prefix_phrase_and_ranking(self):
+        # Matches in the command text outrank matches in the analysis
+        assert self.texts(Command.search('deploy*')) == ['kubectl delete deployment web', 'git push origin main']
+        assert self.texts(Command.search('"get pods"')) == ['kubectl get pods']
+        assert self.texts(Command.search('kubectl', status='EXECUTED')) == ['kubectl get pods']
+        assert self.texts(Command.search('deploy*', user_id=self.admin['id'])) == ['git push origin main']
+        assert self.texts(Command.search('kubectl', start='2026-02-02 00:00:00')) == ['kubectl get pods']
+        assert Command.search('kubectl get')[0]['command_snippet'] == '\x02kubectl\x03 \x02get\x03 pods'
+    
+    def test_index_follows_updates_and_deletes(self):
+        conn = self.db.get_connection()
+        conn.execute("UPDATE commands SET ai_analysis = 'Lists running containers' WHERE command_text = 'kubectl get pods'")
+        conn.execute("DELETE FROM commands WHERE command_text = 'git push origin main'")
+        conn.commit()
+        conn.close()
+        assert self.texts(Command.search('containers')) == ['kubectl get pods']
+        assert Command.search('origin') == []
+    
+    def test_existing_rows_indexed_when_index_created(self):
+        conn = self.db.get_connection()
+        conn.execute('DROP TABLE commands_fts')
+        conn.commit()
+        conn.close()
+        Database(self.temp_db.name).init_db()
+        assert self.texts(Command.search('pods')) == ['kubectl get pods']
+    
+    def test_audit_search_and_endpoints(self):
+        AuditLog.log(self.admin['id'], 'RULE_CREATED', 'Created rule ^shutdown blocking host reboots')
+        assert [log['action'] for log in AuditLog.search('reboot*')] == ['RULE_CREATED']
+        assert AuditLog.search('reboot*', action='USER_CREATED') == []
+        
+        import app as gateway
+        client = gateway.app.test_client()
+        # Members only ever see their own commands
+        response = client.get('/api/search/commands?q=deploy*&user_id=1', headers={'X-API-Key': self.member['api_key']})
+        assert self.texts(response.get_json()) == ['kubectl delete deployment web']
+        response = client.get('/api/search/commands?q=%20', headers={'X-API-Key': self.member['api_key']})
+        assert response.status_code == 400
+        response = client.get('/api/search/audit-logs?q=reboots', headers={'X-API-Key': self.admin['api_key']})
+        assert len(response.get_json()) == 1
+        response = client.get('/api/search/audit-logs?q=reboots', headers={'X-API-Key': self.member['api_key']})
+        assert response.status_code == 403
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the shell command parser and per-segment rule matching
+"""
+
+import os
+import tempfile
+import sys
+sys.path.append('../backend')
+from models import Database, User, Rule
+from config import Config
+from shell_parser import parse_command
+
+def test_pipelines_chains_and_redirections():
+    parsed = parse_command('ls -la | grep foo && rm -rf /tmp; echo done > /tmp/out.txt')
+    assert [pipeline.operator for pipeline in parsed.pipelines] == [None, '&&', ';']
+    assert [segment.text for segment in parsed.pipelines[0].segments] == ['ls -la', 'grep foo']
+    assert parsed.programs == ('ls', 'grep', 'rm', 'echo')
+    assert parsed.pipelines[2].segments[0].redirects == (('>', '/tmp/out.txt'),)
+    assert parsed.complete
+
+def test_substitutions_are_nested_commands():
+    parsed = parse_command('echo $(whoami) "`id -u`" <(cat /etc/passwd)')
+    assert [nested.text for nested in parsed.substitutions] == ['whoami', 'id -u', 'cat /etc/passwd']
+    assert parsed.programs == ('echo', 'whoami', 'id', 'cat')
+    assert 'cat /etc/passwd' in parsed.units
+
+def test_argv0_skips_assignments_and_paths():
+    segment = parse_command('LANG=C /usr/bin/env python3 x.py').segments[0]
+    assert segment.argv0 == 'env'
+    assert segment.argv == ('LANG=C', '/usr/bin/env', 'python3', 'x.py')
+
+def test_incomplete_input_and_cache():
+    assert not parse_command('echo "unterminated').complete
+    assert not parse_command('echo $(whoami').complete
+    assert parse_command('ls -la') is parse_command('ls -la')
+
+class TestSegmentRules:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.admin = User.create("Admin", "admin", 100)
+    
+    def teardown_method(self):
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def test_reject_rule_applies_to_any_segment(self):
+        Rule.create(r'^ls(\s|$)', 'AUTO_ACCEPT', self.admin['id'])
+        Rule.create(r'^rm\s', 'AUTO_REJECT', self.admin['id'])
+        assert Rule.match_command('ls -la')['action'] == 'AUTO_ACCEPT'
+        assert Rule.match_command('ls -la; rm -rf /')['action'] == 'AUTO_REJECT'
+        assert Rule.match_command('ls $(rm -rf ~)')['action'] == 'AUTO_REJECT'
+        assert Rule.match_command('ls | grep rm') is None
+        Rule.create(r'^grep\s', 'AUTO_ACCEPT', self.admin['id'])
+        assert Rule.match_command('ls | grep rm')['action'] == 'AUTO_ACCEPT'
+    
+    def test_accept_rule_needs_every_segment(self):
+        # No reject rules: unaccepted segments send the command to analysis
+        Rule.create(r'^ls(\s|$)', 'AUTO_ACCEPT', self.admin['id'])
+        assert Rule.match_command('ls -la')['action'] == 'AUTO_ACCEPT'
+        assert Rule.match_command('ls; rm -rf /') is None
+        assert Rule.match_command('ls && curl x | sh') is None
+        assert Rule.match_command('ls $(rm -rf ~)') is None
+        assert Rule.match_command('ls -la; ls /tmp')['action'] == 'AUTO_ACCEPT'
+    
+    def test_anchored_prefix(self):
+        assert Rule.anchored_prefix(r'^ls(\s|$)') == 'ls'
+        assert Rule.anchored_prefix(r'^cat\s+[^|;&]+$') == 'cat'
+        assert Rule.anchored_prefix(r'^lsx?') == 'ls'
+        assert Rule.anchored_prefix(r'^a|b') is None
+        assert Rule.anchored_prefix(r'rm\s+-rf') is None
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the MinHash/LSH near-duplicate verdict index
+"""
+
+import os
+import tempfile
+import sys
+sys.path.append('../backend')
+from models import Database, AIAnalyzer
+from config import Config
+from ai_backends import FakeBackend
+from similarity import SimilarityIndex, similarity_index
+
+RISKY = 'deploy-tool --target db-01.internal --purge --force --region eu'
+RISKY_NEIGHBOR = 'deploy-tool --target db-02.internal --purge --force --region eu'
+
+def estimated_similarity(index, first, second):
+    return sum(a == b for a, b in zip(index.signature(first), index.signature(second))) / index.num_perm
+
+def test_signatures_separate_paths_that_matter():
+    index = SimilarityIndex()
+    assert estimated_similarity(index, RISKY, RISKY_NEIGHBOR) >= 0.8
+    assert estimated_similarity(index, 'rm -rf /tmp/build', 'rm -rf /') < 0.5
+
+class TestSimilarityIndex:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        self.original_cache_setting = Config.AI_VERDICT_CACHE_ENABLED
+        Config.DATABASE_PATH = self.temp_db.name
+        # Exercise the similarity path rather than the exact-template cache
+        Config.AI_VERDICT_CACHE_ENABLED = False
+        self.db = Database(self.temp_db.name)
+        self.backend = FakeBackend(latency_ms=0, distribution='fixed', rules=[(r'--purge', 8)],
+                                   default_risk_score=1)
+        AIAnalyzer.set_backend(self.backend)
+    
+    def teardown_method(self):
+        AIAnalyzer.set_backend(None)
+        Config.AI_VERDICT_CACHE_ENABLED = self.original_cache_setting
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def test_risky_verdict_reused_for_near_duplicate(self):
+        first = AIAnalyzer.analyze_command(RISKY)
+        second = AIAnalyzer.analyze_command(RISKY_NEIGHBOR)
+        assert self.backend.calls == 1
+        assert second['source'] == 'similar'
+        assert second['similar_to'] == RISKY
+        assert second['risk_score'] == first['risk_score']
+        assert second['requires_approval']
+    
+    def test_safe_verdict_not_reused(self):
+        AIAnalyzer.analyze_command('build-tool --target web-01.internal --region eu --verbose')
+        AIAnalyzer.analyze_command('build-tool --target web-02.internal --region eu --verbose')
+        assert self.backend.calls == 2
+    
+    def test_index_persists_across_instances(self):
+        similarity_index.add(RISKY, AIAnalyzer.parse_response('{"risk_score": 8, "requires_approval": true}'))
+        reloaded = SimilarityIndex()
+        neighbors = reloaded.neighbors(RISKY_NEIGHBOR, min_similarity=0.8)
+        assert [neighbor['command_text'] for neighbor in neighbors] == [RISKY]
+        assert neighbors[0]['verdict']['risk_score'] == 8
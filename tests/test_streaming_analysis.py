@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for streamed AI analysis of submitted commands
+"""
+
+import os
+import tempfile
+import sys
+sys.path.append('../backend')
+from models import Database, User, Command, AIAnalyzer
+from config import Config
+from ai_backends import FakeBackend
+
+class TestStreamingAnalysis:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.user = User.create("Streamer", "member", 5)
+        AIAnalyzer.set_backend(FakeBackend(latency_ms=0, distribution='fixed',
+                                           rules=[(r'deploy', 8)], default_risk_score=2))
+    
+    def teardown_method(self):
+        AIAnalyzer.set_backend(None)
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def test_fast_path_commands_are_not_deferred(self):
+        result = Command.submit(self.user['id'], 'ls -la', stream_analysis=True)
+        assert result['status'] == 'EXECUTED'
+    
+    def test_streamed_analysis_executes_safe_command(self):
+        result = Command.submit(self.user['id'], 'build-tool --all', stream_analysis=True)
+        assert result['status'] == 'PENDING'
+        assert result['credits_remaining'] == 5
+        
+        chunks = []
+        final = Command.complete_analysis(result['id'], on_token=chunks.append)
+        assert len(chunks) > 1
+        assert '"risk_score": 2' in ''.join(chunks)
+        assert final['status'] == 'EXECUTED'
+        assert final['credits_remaining'] == 4
+        
+        commands = Command.get_user_commands(self.user['id'])
+        assert commands[0]['status'] == 'EXECUTED'
+        assert commands[0]['ai_risk_score'] == 2
+    
+    def test_streamed_analysis_flags_risky_command(self):
+        result = Command.submit(self.user['id'], 'deploy-tool --prod', stream_analysis=True)
+        final = Command.complete_analysis(result['id'], on_token=lambda chunk: None)
+        assert final['status'] == 'PENDING_APPROVAL'
+        assert final['credits_remaining'] == 5
+        
+        # Already finalised - a second completion is refused
+        assert 'error' in Command.complete_analysis(result['id'])
+    
+    def test_completion_charges_current_balance(self):
+        result = Command.submit(self.user['id'], 'build-tool --all', stream_analysis=True)
+        conn = self.db.get_connection()
+        conn.execute('UPDATE users SET credits = 0 WHERE id = ?', (self.user['id'],))
+        conn.commit()
+        conn.close()
+        final = Command.complete_analysis(result['id'])
+        assert final['status'] == 'REJECTED'
+        assert final['credits_remaining'] == 0
+    
+    def test_command_settled_during_analysis_is_left_alone(self):
+        result = Command.submit(self.user['id'], 'build-tool --all', stream_analysis=True)
+        
+        def expire(chunk):
+            conn = self.db.get_connection()
+            conn.execute("UPDATE commands SET status = 'EXPIRED' WHERE id = ?", (result['id'],))
+            conn.commit()
+            conn.close()
+        
+        assert 'error' in Command.complete_analysis(result['id'], on_token=expire)
+        assert Command.get_by_id(result['id'])['status'] == 'EXPIRED'
+        assert User.get_by_api_key(self.user['api_key'])['credits'] == 5
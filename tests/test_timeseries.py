@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests for the bucketed analytics timeseries
+"""
+
+import os
+import tempfile
+import sys
+import pytest
+from datetime import datetime
+sys.path.append('../backend')
+from models import Database, User, Rule, Command
+from config import Config
+from rollups import series_range
+from maintenance import compact_timeseries
+
+def test_series_range_picks_coarsest_resolution():
+    assert series_range('2026-03-01 00:00:00', '2026-03-31 00:00:00', 'day') == \
+        ('2026-03-01 00:00:00', '2026-03-31 00:00:00', 'day')
+    assert series_range('2026-03-01 12:00:00', '2026-03-31 00:00:00', 'day')[2] == 'hour'
+    assert series_range('2026-03-01 12:00:30', '2026-03-01 13:00:05', 'hour', now=datetime(2026, 3, 2)) == \
+        ('2026-03-01 12:00:00', '2026-03-01 13:01:00', 'minute')
+    # Defaults: the buckets up to and including the current one
+    assert series_range(None, None, 'hour', now=datetime(2026, 3, 2, 10, 15)) == \
+        ('2026-02-28 11:00:00', '2026-03-02 11:00:00', 'hour')
+    for start, end, bucket in (('2026-03-02 00:00:00', '2026-03-01 00:00:00', 'day'),
+                               ('2020-01-01 00:00:00', '2026-01-01 00:00:00', 'minute'),
+                               (None, None, 'week')):
+        with pytest.raises(ValueError):
+            series_range(start, end, bucket)
+
+def test_series_range_skips_compacted_minutes():
+    # Past the minute series' retention, ranges are widened to whole hours
+    assert series_range('2026-03-01 12:00:30', '2026-03-01 13:00:05', 'hour', now=datetime(2026, 3, 20)) == \
+        ('2026-03-01 12:00:00', '2026-03-01 14:00:00', 'hour')
+    with pytest.raises(ValueError):
+        series_range('2026-03-01 12:00:00', '2026-03-01 13:00:00', 'minute', now=datetime(2026, 3, 20))
+
+class TestTimeseries:
+    def setup_method(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.original_db_path = Config.DATABASE_PATH
+        Config.DATABASE_PATH = self.temp_db.name
+        self.db = Database(self.temp_db.name)
+        self.admin = User.create("Admin", "admin", 100)
+        self.member = User.create("Member", "member", 10)
+        self.rule = Rule.create(r'^rm\s', 'AUTO_REJECT', self.admin['id'])
+        
+        conn = self.db.get_connection()
+        conn.executemany(
+            'INSERT INTO commands (user_id, command_text, status, matched_rule_id, credits_deducted, '
+            'fingerprint, command_template, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(self.member['id'], 'ls /tmp', 'EXECUTED', None, 1, 'fp-ls', 'ls <path>', '2026-03-01 09:05:00'),
+             (self.member['id'], 'ls /var', 'EXECUTED', None, 1, 'fp-ls', 'ls <path>', '2026-03-01 09:40:10'),
+             (self.member['id'], 'rm /tmp/x', 'REJECTED', self.rule['id'], 0, 'fp-rm', 'rm <path>', '2026-03-01 10:01:00'),
+             (self.admin['id'], 'make deploy', 'EXECUTED', None, 1, None, None, '2026-03-02 08:00:00')]
+        )
+        conn.commit()
+        conn.close()
+    
+    def teardown_method(self):
+        Config.DATABASE_PATH = self.original_db_path
+        os.unlink(self.temp_db.name)
+    
+    def get(self, query, **headers):
+        import app as gateway
+        client = gateway.app.test_client()
+        return client.get(f'/api/analytics/timeseries?{query}', headers={'X-API-Key': self.admin['api_key'], **headers})
+    
+    def test_buckets_and_dimensions(self, monkeypatch):
+        # Keep the fixture's March minutes inside the minute series' retention
+        monkeypatch.setattr(Config, 'TIMESERIES_MINUTE_RETENTION_MINUTES', 10 ** 7)
+        series = self.get('from=2026-03-01&to=2026-03-03&bucket=day&group_by=user').get_json()
+        assert series['resolution'] == 'day'
+        assert [(point['bucket'], point['user'], point['commands'], point['credits']) for point in series['points']] == [
+            ('2026-03-01 00:00:00', self.member['id'], 3, 2),
+            ('2026-03-02 00:00:00', self.admin['id'], 1, 1),
+        ]
+        assert series['labels']['user'] == {str(self.member['id']): 'Member', str(self.admin['id']): 'Admin'}
+        
+        series = self.get('from=2026-03-01T09:30:00Z&to=2026-03-01T11:00:00Z&bucket=hour&group_by=rule,status').get_json()
+        assert series['resolution'] == 'minute'
+        assert [(point['bucket'], point['rule'], point['status'], point['commands']) for point in series['points']] == [
+            ('2026-03-01 09:00:00', None, 'EXECUTED', 1),
+            ('2026-03-01 10:00:00', self.rule['id'], 'REJECTED', 1),
+        ]
+        assert series['labels']['rule'] == {str(self.rule['id']): r'^rm\s'}
+        
+        series = self.get('from=2026-03-01&to=2026-03-03&bucket=day&group_by=fingerprint').get_json()
+        assert series['labels']['fingerprint'] == {'fp-ls': 'ls <path>', 'fp-rm': 'rm <path>', 'make deploy': 'make deploy'}
+    
+    def test_etag_revalidation(self):
+        query = 'from=2026-03-01&to=2026-03-03&bucket=hour'
+        first = self.get(query)
+        assert first.headers['ETag']
+        assert sum(point['commands'] for point in first.get_json()['points']) == 4
+        assert self.get(query, **{'If-None-Match': first.headers['ETag']}).status_code == 304
+        assert self.get('from=2026-03-01&to=2026-03-04&bucket=hour',
+                        **{'If-None-Match': first.headers['ETag']}).status_code == 200
+        
+        conn = self.db.get_connection()
+        conn.execute("UPDATE commands SET status = 'FAILED' WHERE command_text = 'make deploy'")
+        conn.commit()
+        conn.close()
+        changed = self.get(query, **{'If-None-Match': first.headers['ETag']})
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != first.headers['ETag']
+        
+        # Writes to days outside the range leave its ETag valid
+        conn = self.db.get_connection()
+        conn.execute("INSERT INTO commands (user_id, command_text, status) VALUES (?, 'ls', 'EXECUTED')",
+                     (self.member['id'],))
+        conn.commit()
+        conn.close()
+        assert self.get(query, **{'If-None-Match': changed.headers['ETag']}).status_code == 304
+    
+    def test_minute_series_compaction(self):
+        conn = self.db.get_connection()
+        conn.execute("INSERT INTO commands (user_id, command_text, status) VALUES (?, 'ls', 'EXECUTED')",
+                     (self.member['id'],))
+        conn.commit()
+        minutes = lambda: [row[0] for row in conn.execute('SELECT DISTINCT minute FROM command_series_minute')]
+        assert len(minutes()) == 5
+        assert compact_timeseries() == 4
+        assert len(minutes()) == 1
+        assert conn.execute('SELECT SUM(commands) FROM command_series_hour').fetchone()[0] == 5
+        conn.close()
+    
+    def test_validation(self):
+        assert self.get('bucket=week').status_code == 400
+        assert self.get('group_by=status,host').status_code == 400
+        assert self.get('from=yesterday').status_code == 400
+        import app as gateway
+        response = gateway.app.test_client().get('/api/analytics/timeseries',
+                                                 headers={'X-API-Key': self.member['api_key']})
+        assert response.status_code == 403